@@ -0,0 +1,96 @@
+# src/backend_parity.py
+# mAP / count / latency parity of an exported model (ONNX, INT8, OpenVINO) against its PyTorch weights.
+import argparse, json, os, time
+
+import numpy as np
+
+from detector import BACKENDS, class_names, load_model, make_detector
+from sources import list_image_paths
+
+def val_metrics(model_path, data, imgsz):
+    """
+    Ultralytics val on data[val]; .onnx runs through Ultralytics' own
+    onnxruntime session (same graph). batch=1 / square letterbox for both
+    models, as a static export has to, so only the weights differ.
+    """
+    from ultralytics import YOLO
+    r = YOLO(model_path, task="detect").val(data=data, imgsz=imgsz, split="val", batch=1, rect=False,
+                                            plots=False, verbose=False, device="cpu")
+    return {"map50": round(float(r.box.map50), 5), "map50_95": round(float(r.box.map), 5),
+            "precision": round(float(r.box.mp), 5), "recall": round(float(r.box.mr), 5)}
+
+def val_images(data, max_images):
+    from ultralytics.data.utils import check_det_dataset
+    d = check_det_dataset(data)
+    val = d["val"] if isinstance(d["val"], str) else d["val"][0]
+    paths = list_image_paths(val)
+    return paths[:max_images] if max_images else paths
+
+def count_run(model_path, paths, conf, imgsz, backend, threads, n_cls):
+    """Per-image class counts (len(paths) x n_cls) and per-image latency in ms."""
+    m = load_model(model_path, backend, threads)
+    detect = make_detector(m, conf=conf, imgsz=imgsz)
+    detect(paths[:1])  # warm-up
+    counts = np.zeros((len(paths), n_cls), np.int64)
+    ms = []
+    for i, p in enumerate(paths):
+        t0 = time.perf_counter()
+        _, clses, _ = detect([p])[0]
+        ms.append((time.perf_counter() - t0) * 1000.0)
+        counts[i] = np.bincount(clses, minlength=n_cls)[:n_cls]
+    return counts, np.array(ms), class_names(m)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reference", required=True, help="PyTorch weights (.pt)")
+    ap.add_argument("--candidate", required=True, help="Exported model (.onnx or *_openvino_model/)")
+    ap.add_argument("--data", default="configs/visdrone.yaml")
+    ap.add_argument("--imgsz", type=int, default=640, help="Use the size the candidate was exported at")
+    ap.add_argument("--conf", type=float, default=0.25, help="Confidence for the count comparison")
+    ap.add_argument("--max-images", type=int, default=200, help="Val images for counts/latency (0 = all)")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto",
+                    help="Candidate backend for counts/latency (see detector.py)")
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--skip-map", action="store_true", help="Only compare counts and latency")
+    ap.add_argument("--out", default="outputs/parity.json")
+    a = ap.parse_args(argv)
+
+    report = {"reference": a.reference, "candidate": a.candidate, "data": a.data, "imgsz": a.imgsz}
+    if not a.skip_map:
+        ref, cand = val_metrics(a.reference, a.data, a.imgsz), val_metrics(a.candidate, a.data, a.imgsz)
+        report["val"] = {"reference": ref, "candidate": cand,
+                         "delta": {k: round(cand[k] - ref[k], 5) for k in ref}}
+
+    paths = val_images(a.data, a.max_images)
+    n_cls = len(class_names(load_model(a.reference)))
+    rc, rms, names = count_run(a.reference, paths, a.conf, a.imgsz, "ultralytics", 0, n_cls)
+    cc, cms, _ = count_run(a.candidate, paths, a.conf, a.imgsz, a.backend, a.threads, n_cls)
+    diff = cc - rc
+    report["counts"] = {
+        "images": len(paths), "conf": a.conf,
+        "total_reference": int(rc.sum()), "total_candidate": int(cc.sum()),
+        "mean_abs_diff_per_image": round(float(np.abs(diff.sum(1)).mean()), 4) if len(paths) else 0.0,
+        "images_with_identical_counts": int((diff == 0).all(1).sum()),
+        "per_class": {names.get(k, str(k)): {"reference": int(rc[:, k].sum()), "candidate": int(cc[:, k].sum()),
+                                             "mean_abs_diff": round(float(np.abs(diff[:, k]).mean()), 4)}
+                      for k in range(n_cls)} if len(paths) else {},
+    }
+    report["latency_ms"] = {"reference_median": round(float(np.median(rms)), 3) if len(rms) else 0.0,
+                            "candidate_median": round(float(np.median(cms)), 3) if len(cms) else 0.0}
+
+    os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+    with open(a.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if "val" in report:
+        for k, d in report["val"]["delta"].items():
+            print(f"📊 {k:10s} ref {report['val']['reference'][k]:.4f}  cand {report['val']['candidate'][k]:.4f}  Δ {d:+.4f}")
+    c = report["counts"]
+    print(f"📊 counts over {c['images']} images: ref {c['total_reference']}  cand {c['total_candidate']}  "
+          f"mean |Δ|/image {c['mean_abs_diff_per_image']}  identical {c['images_with_identical_counts']}")
+    l = report["latency_ms"]
+    print(f"⏱️ median latency: ref {l['reference_median']:.1f} ms  cand {l['candidate_median']:.1f} ms")
+    print(f"✅ Wrote {a.out}")
+
+if __name__ == "__main__":
+    main()
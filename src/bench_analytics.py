@@ -0,0 +1,247 @@
+# src/bench_analytics.py
+# CPU-only benchmarks of the analytics hot paths on synthetic data (no weights, no network).
+import argparse, json, os, platform, shutil, subprocess, sys, tempfile, time
+
+import numpy as np
+
+from cli import COMMANDS, SRC
+from convert_visdrone_to_yolo import convert_split
+from heatmap import heatmap_from_points
+from image_analytics import CI_WEIGHTS, VEHICLE_SET, VISDRONE_NAMES, draw_overlay, frame_metrics
+from metrics_writer import MetricsWriter, metrics_columns
+from pipeline import run_staged
+from render import OverlayRenderer, heatmap_overlay
+from risk import split_centers, proximity_risk
+from zones import ZoneMap
+
+NAMES = {i: n for i, n in enumerate(VISDRONE_NAMES)}
+# default class mix: crowd-heavy drone footage
+DEFAULT_MIX = {"pedestrian": 0.45, "people": 0.15, "car": 0.2, "van": 0.05, "motor": 0.08,
+               "bicycle": 0.03, "truck": 0.02, "bus": 0.02}
+
+def synth_detections(rng, H, W, n, mix=None, clusters=8, spread=0.05):
+    """
+    n boxes (xyxy float32, class ids, scores) around `clusters` crowd centers;
+    spread is the cluster std as a fraction of the frame diagonal.
+    """
+    mix = mix or DEFAULT_MIX
+    ids = np.array([VISDRONE_NAMES.index(k) for k in mix])
+    p = np.array(list(mix.values()), np.float64)
+    clses = rng.choice(ids, size=n, p=p / p.sum())
+    centers = rng.uniform([0, 0], [W, H], (max(1, clusters), 2))
+    xy = centers[rng.integers(0, len(centers), n)] + rng.normal(0, spread * np.hypot(W, H), (n, 2))
+    xy = xy.clip([0, 0], [W - 1, H - 1])
+    small = np.isin(clses, [0, 1, 2, 9])  # people / two-wheelers are small from the air
+    wh = np.where(small[:, None], rng.uniform(6, 20, (n, 2)), rng.uniform(20, 70, (n, 2)))
+    boxes = np.concatenate([xy - wh / 2, xy + wh / 2], axis=1).clip(0, [W, H, W, H]).astype(np.float32)
+    scores = rng.uniform(0.25, 1.0, n).astype(np.float32)
+    return boxes, clses.astype(int), scores
+
+def synth_zones(rng, k):
+    """k random (overlapping) normalized quadrilaterals."""
+    c = rng.uniform(0.1, 0.9, (k, 1, 2))
+    return ZoneMap([{"name": f"z{i}", "polygon": (c[i] + rng.uniform(-0.1, 0.1, (4, 2))).clip(0, 1).tolist()}
+                    for i in range(k)])
+
+def synth_image(rng, H, W):
+    """Smooth-ish BGR noise (compresses like a photo rather than like white noise)."""
+    import cv2
+    small = rng.integers(0, 255, (max(1, H // 16), max(1, W // 16), 3), dtype=np.uint8)
+    return cv2.resize(small, (W, H), interpolation=cv2.INTER_LINEAR)
+
+class StubDetector:
+    """detect(list of images) -> synthetic detections; deterministic per call order."""
+
+    def __init__(self, n=300, seed=0, **kw):
+        self.rng = np.random.default_rng(seed)
+        self.n, self.kw = n, kw
+
+    def __call__(self, srcs):
+        return [synth_detections(self.rng, im.shape[0], im.shape[1], self.n, **self.kw) for im in srcs]
+
+def synth_visdrone(root, n_images, rng, H=540, W=960, boxes=150):
+    """VisDrone2019-DET-<split>/{images,annotations} folders for convert_split."""
+    import cv2
+    for split in ("train",):
+        d = os.path.join(root, f"VisDrone2019-DET-{split}")
+        os.makedirs(os.path.join(d, "images"), exist_ok=True)
+        os.makedirs(os.path.join(d, "annotations"), exist_ok=True)
+        img = synth_image(rng, H, W)
+        for i in range(n_images):
+            cv2.imwrite(os.path.join(d, "images", f"{i:07d}.jpg"), img)
+            b, c, _ = synth_detections(rng, H, W, boxes)
+            rows = [f"{int(x1)},{int(y1)},{max(1, int(x2 - x1))},{max(1, int(y2 - y1))},1,{k + 1},0,0"
+                    for (x1, y1, x2, y2), k in zip(b.tolist(), c.tolist())]
+            with open(os.path.join(d, "annotations", f"{i:07d}.txt"), "w") as f:
+                f.write("\n".join(rows) + "\n")
+
+def timeit(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    ts = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ts.append(time.perf_counter() - t0)
+    ts = np.array(ts) * 1000.0
+    return {"median_ms": round(float(np.median(ts)), 4), "min_ms": round(float(ts.min()), 4),
+            "mean_ms": round(float(ts.mean()), 4), "runs": int(repeat)}
+
+def cases(args, tmp):
+    """(name, params, fn, repeat) for every benchmark; data is generated up front with a fixed seed."""
+    import cv2
+    from PIL import Image
+    rng = np.random.default_rng(args.seed)
+    H, W = args.height, args.width
+    r = args.repeat
+    out = []
+    for n in args.densities:
+        boxes, clses, scores = synth_detections(rng, H, W, n, clusters=args.clusters)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2.0
+        ped, veh = split_centers(boxes, clses, NAMES, VEHICLE_SET)
+        thr = 0.08 * np.hypot(W, H)
+        p = {"H": H, "W": W, "n": n}
+        out.append((f"heatmap_from_points/n={n}", p,
+                    lambda c=centers: heatmap_from_points(H, W, c, sigma=max(8, int(0.015 * max(H, W)))), r))
+        out.append((f"proximity_risk/n={n}", p, lambda a=ped, b=veh: proximity_risk(a, b, thr), r))
+        out.append((f"frame_metrics/n={n}", p, lambda b=boxes, c=clses: frame_metrics(b, c, H, W, NAMES), r))
+
+        img = synth_image(rng, H, W)
+        pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        out.append((f"draw_overlay/n={n}", p, lambda b=boxes, c=clses, s=scores: draw_overlay(pil, b, c, s, NAMES),
+                    max(1, r // 4)))
+        rend = OverlayRenderer(NAMES)
+        out.append((f"overlay_renderer/n={n}", p, lambda b=boxes, c=clses, s=scores: rend.render(img, b, c, s), r))
+        out.append((f"heatmap_blend/n={n}", p, lambda b=boxes: heatmap_overlay(img, b), r))
+
+    # per-zone metrics: the masks are built in the warm-up call, the cost should barely move with zones
+    boxes, clses, _ = synth_detections(rng, H, W, args.densities[-1], clusters=args.clusters)
+    thr = 0.08 * np.hypot(W, H)
+    for k in args.zones:
+        zm = synth_zones(rng, k)
+        out.append((f"zone_metrics/zones={k}", {"H": H, "W": W, "n": args.densities[-1], "zones": k},
+                    lambda z=zm: z.frame_rows(boxes, clses, H, W, NAMES, CI_WEIGHTS, VEHICLE_SET, thr), r))
+
+    # streaming metrics.csv: ranked with sorted runs spilled every chunk rows, plus the top-K heap
+    cols = metrics_columns(NAMES)
+    rows = [{"image": f"f{i:07d}.jpg", "congestion_index": round(float(c), 3),
+             "proximity_risk_index": round(float(p_), 3), "total_detections": int(n)}
+            for i, (c, p_, n) in enumerate(zip(rng.gamma(2, 20, args.metrics_rows),
+                                                rng.exponential(2, args.metrics_rows),
+                                                rng.integers(0, 500, args.metrics_rows)))]
+    csv_path = os.path.join(tmp, "metrics.csv")
+    def write_metrics(chunk):
+        w = MetricsWriter(csv_path, cols, chunk_rows=chunk, top_k=100, tmp_dir=tmp)
+        for row in rows:
+            w.add(row)
+        w.close()
+    for chunk in sorted({args.metrics_rows, max(1, args.metrics_rows // 10)}):
+        out.append((f"metrics_writer/rows={args.metrics_rows}/chunk={chunk}", {"rows": args.metrics_rows},
+                    lambda c=chunk: write_metrics(c), max(1, r // 4)))
+
+    # PNG writing of an RGBA heatmap (PIL, as render_frame does; cv2 for comparison)
+    img = synth_image(rng, H, W)
+    blend = heatmap_overlay(img, synth_detections(rng, H, W, 300)[0])
+    png = os.path.join(tmp, "hm.png")
+    p = {"H": H, "W": W}
+    out.append(("png_write/pil", p, lambda: Image.fromarray(blend, mode="RGBA").save(png), r))
+    bgra = cv2.cvtColor(blend, cv2.COLOR_RGBA2BGRA)
+    out.append(("png_write/cv2", p, lambda: cv2.imwrite(png, bgra), r))
+
+    # metrics pipeline with the stub detector (decode skipped: frames are arrays)
+    frames = [{"index": i, "image": img} for i in range(args.pipeline_frames)]
+    stub = StubDetector(n=args.densities[-1], seed=args.seed)
+    def pipe():
+        list(run_staged(iter(frames), lambda f: dict(f, shape=f["image"].shape[:2]),
+                        lambda fs: stub([f["image"] for f in fs]),
+                        lambda f, d: frame_metrics(d[0], d[1], H, W, NAMES), batch=8))
+    out.append((f"pipeline_stub/frames={args.pipeline_frames}", {"H": H, "W": W, "n": args.densities[-1]},
+                pipe, max(1, r // 4)))
+
+    # VisDrone -> YOLO conversion on a synthetic split
+    vd = os.path.join(tmp, "visdrone")
+    if not args.filter or args.filter in "convert_split/workers=":
+        synth_visdrone(vd, args.convert_images, rng)
+    for workers in sorted({1, args.convert_workers}):
+        p = {"images": args.convert_images, "workers": workers}
+        out.append((f"convert_split/workers={workers}", p,
+                    lambda w=workers: convert_split(vd, os.path.join(tmp, f"yolo{w}"), "train", workers=w),
+                    max(1, r // 4)))
+
+    # CLI start-up: 'cli.py <command> --help' in a fresh interpreter (see cli.py check-startup)
+    for name in COMMANDS:
+        out.append((f"startup/{name}", {}, lambda n=name: subprocess.run(
+            [sys.executable, os.path.join(SRC, "cli.py"), n, "--help"], capture_output=True), max(1, r // 4)))
+    return out
+
+def environment():
+    import cv2
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "opencv": cv2.__version__, "machine": platform.machine(), "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def compare(results, baseline_path, tolerance):
+    """Print median-time ratios against a baseline JSON; returns the names that regressed."""
+    with open(baseline_path) as f:
+        base = json.load(f)["results"]
+    regressed = []
+    print(f"{'case':45s} {'base ms':>10s} {'now ms':>10s} {'ratio':>7s}")
+    for name, res in results.items():
+        if name not in base:
+            continue
+        b, n = base[name]["median_ms"], res["median_ms"]
+        ratio = n / b if b > 0 else float("inf")
+        flag = " ⚠️" if ratio > 1 + tolerance else ""
+        print(f"{name:45s} {b:10.3f} {n:10.3f} {ratio:7.2f}{flag}")
+        if flag:
+            regressed.append(name)
+    return regressed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="outputs/bench/analytics.json")
+    ap.add_argument("--compare", default=None, help="Baseline JSON from an earlier run")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown vs the baseline (0.15 = 15%%)")
+    ap.add_argument("--filter", default=None, help="Only cases whose name contains this")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--densities", type=int, nargs="+", default=[100, 1000, 3000], help="Detections per frame")
+    ap.add_argument("--clusters", type=int, default=8, help="Crowd clusters per frame")
+    ap.add_argument("--zones", type=int, nargs="+", default=[1, 8, 64], help="Zone counts for zone_metrics")
+    ap.add_argument("--pipeline-frames", type=int, default=32)
+    ap.add_argument("--metrics-rows", type=int, default=100_000, help="Rows for the metrics_writer cases")
+    ap.add_argument("--convert-images", type=int, default=200)
+    ap.add_argument("--convert-workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args(argv)
+
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        for name, params, fn, repeat in cases(args, tmp):
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = dict(timeit(fn, repeat), params=params)
+            print(f"⏱️ {name:45s} {results[name]['median_ms']:10.3f} ms (min {results[name]['min_ms']:.3f})")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"env": environment(), "args": vars(args), "results": results}, f, indent=2)
+    print(f"✅ Wrote {args.out}")
+
+    if args.compare:
+        regressed = compare(results, args.compare, args.tolerance)
+        if regressed:
+            print(f"⚠️ {len(regressed)} case(s) slower than baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
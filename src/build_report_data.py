@@ -0,0 +1,91 @@
+# src/build_report_data.py
+# Pre-aggregate metrics.csv into small JSON chunks for the dashboard (make_html_report.py).
+import argparse, json, os, shutil
+
+import numpy as np
+
+SORT_KEYS = ["proximity_risk_index", "congestion_index", "occupancy_frac", "total_detections"]
+HIST_KEYS = ["proximity_risk_index", "congestion_index", "occupancy_frac"]
+
+def _dump(path, obj):
+    with open(path, "w") as f:
+        json.dump(obj, f, separators=(",", ":"))
+
+def histogram(x, bins):
+    """{edges, counts} over [min, max]; a constant column gets one unit-wide range."""
+    lo, hi = (float(x.min()), float(x.max())) if len(x) else (0.0, 1.0)
+    if hi <= lo:
+        hi = lo + 1.0
+    counts, edges = np.histogram(x, bins=bins, range=(lo, hi))
+    return {"edges": [round(float(e), 6) for e in edges], "counts": counts.tolist()}
+
+def build(metrics_csv, out_dir, top_k=5000, page_size=24, bins=40):
+    """
+    Writes out_dir/summary.json (row count, KPIs, percentiles, histograms,
+    page counts) and out_dir/top/<sort key>/page_XXXX.json: the top_k frames
+    by each sort key (ties broken by congestion_index, as the dashboard did),
+    page_size rows per file.
+    """
+    import pandas as pd
+    cols = ["image"] + SORT_KEYS
+    df = pd.read_csv(metrics_csv, usecols=lambda c: c in cols)
+    for k in SORT_KEYS:
+        df[k] = pd.to_numeric(df[k], errors="coerce").fillna(0) if k in df else 0
+    df["image"] = df["image"].astype(str)
+
+    if os.path.isdir(os.path.join(out_dir, "top")):
+        shutil.rmtree(os.path.join(out_dir, "top"))  # stale pages from a larger run
+    os.makedirs(out_dir, exist_ok=True)
+
+    n = len(df)
+    summary = {
+        "rows": n,
+        "source": os.path.basename(metrics_csv),
+        "kpi": {
+            "images": n,
+            "meanPRI": float(df["proximity_risk_index"].mean()) if n else 0.0,
+            "meanCI": float(df["congestion_index"].mean()) if n else 0.0,
+            "meanOcc": float(df["occupancy_frac"].mean()) if n else 0.0,
+            "totalDetections": int(df["total_detections"].sum()),
+            "framesWithRisk": int((df["proximity_risk_index"] > 0).sum()),
+        },
+        "percentiles": {k: dict(zip(["p50", "p95", "p99", "max"],
+                                    [round(float(v), 6) for v in np.percentile(df[k], [50, 95, 99, 100])]))
+                        for k in SORT_KEYS} if n else {},
+        "hist": {k: histogram(df[k].to_numpy(np.float64), bins) for k in HIST_KEYS},
+        "pageSize": page_size,
+        "topK": min(top_k, n),
+        "pages": {},
+    }
+
+    ci = df["congestion_index"].to_numpy()
+    for k in SORT_KEYS:
+        order = np.lexsort((-ci, -df[k].to_numpy()))[:top_k]
+        top = df.iloc[order]
+        d = os.path.join(out_dir, "top", k)
+        os.makedirs(d, exist_ok=True)
+        n_pages = 0
+        for s in range(0, len(top), page_size):
+            _dump(os.path.join(d, f"page_{n_pages:04d}.json"), top.iloc[s:s + page_size].to_dict("records"))
+            n_pages += 1
+        summary["pages"][k] = n_pages
+
+    _dump(os.path.join(out_dir, "summary.json"), summary)
+    return summary
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--metrics", default="outputs/analytics/metrics.csv")
+    ap.add_argument("--out", default=None, help="Output folder (default: <metrics dir>/report)")
+    ap.add_argument("--top-k", type=int, default=5000, help="Frames kept per sort key")
+    ap.add_argument("--page-size", type=int, default=24, help="Frames per JSON page")
+    ap.add_argument("--bins", type=int, default=40, help="Histogram bins")
+    a = ap.parse_args(argv)
+
+    out = a.out or os.path.join(os.path.dirname(os.path.abspath(a.metrics)), "report")
+    s = build(a.metrics, out, a.top_k, a.page_size, a.bins)
+    print(f"✅ Report data for {s['rows']} frames → {out} "
+          f"({sum(s['pages'].values())} pages of {s['pageSize']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# src/cli.py
+# One entry point for the project scripts; a subcommand's module is imported only when it runs.
+import importlib, json, os, subprocess, sys, time
+
+# subcommand -> (module in src/, one-line help)
+COMMANDS = {
+    "convert": ("convert_visdrone_to_yolo", "VisDrone annotations → YOLO dataset"),
+    "pack": ("pack_shards", "Pack a YOLO dataset into memory-mapped training shards"),
+    "train": ("train_yolo", "Train / resume a YOLO detector"),
+    "export": ("export_model", "Export weights to ONNX / OpenVINO (optionally INT8)"),
+    "evaluate": ("evaluate", "mAP / precision / recall on a dataset"),
+    "eval-preds": ("eval_predictions", "mAP per class / object size / crowd density from saved predictions"),
+    "parity": ("backend_parity", "Exported model vs PyTorch weights: mAP, counts, latency"),
+    "predict": ("predict_images", "YOLO label files (+ overlays) for a folder of images"),
+    "count": ("count_per_class", "Per-class object counts per image → CSV"),
+    "analyze": ("image_analytics", "Congestion / risk metrics, overlays and heatmaps"),
+    "offline": ("offline_analytics", "Recompute metrics from a saved detections store"),
+    "report": ("build_report_data", "Pre-aggregate metrics.csv for the dashboard"),
+    "serve": ("render_server", "Serve an analytics folder, rendering images on demand"),
+    "infer-server": ("infer_server", "Keep a model loaded and batch detection requests (--server clients)"),
+    "keyframe-eval": ("keyframe_eval", "Speed / drift of keyframe mode on a video"),
+    "bench": ("bench_analytics", "Offline benchmarks of the analytics hot paths"),
+}
+# imports that must not happen before a subcommand has parsed its arguments
+HEAVY = ("torch", "ultralytics", "onnxruntime", "openvino", "tensorflow", "cv2", "PIL", "pandas")
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+def usage():
+    lines = ["usage: cli.py <command> [options]   (cli.py <command> --help for its options)", "", "commands:"]
+    lines += [f"  {name:15s} {text}" for name, (_, text) in COMMANDS.items()]
+    lines.append(f"  {'check-startup':15s} Time every '<command> --help' and flag heavy imports (regression check)")
+    return "\n".join(lines)
+
+def _probe(name):
+    """Heavy modules loaded by '<name> --help', measured in a fresh interpreter."""
+    code = ("import io, json, sys, contextlib; sys.path.insert(0, %r); import cli\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    try: cli.main([%r, '--help'])\n"
+            "    except SystemExit: pass\n"
+            "print(json.dumps([m for m in cli.HEAVY if m in sys.modules]))") % (SRC, name)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1]) if out.returncode == 0 and out.stdout.strip() else None
+
+def startup_times(names=None, repeat=3):
+    """{command: best wall time in s of 'python cli.py <command> --help'}."""
+    times = {}
+    for name in names or COMMANDS:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(SRC, "cli.py"), name, "--help"], capture_output=True)
+            best = min(best, time.perf_counter() - t0)
+        times[name] = best
+    return times
+
+def check_startup(argv):
+    import argparse
+    ap = argparse.ArgumentParser(prog="cli.py check-startup")
+    ap.add_argument("--max-seconds", type=float, default=1.0, help="Slowest allowed '<command> --help'")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("commands", nargs="*", help="Subset of commands (default: all)")
+    a = ap.parse_args(argv)
+
+    failed = []
+    for name, secs in startup_times(a.commands or None, a.repeat).items():
+        heavy = _probe(name)
+        bad = heavy is None or heavy or secs > a.max_seconds
+        note = "probe failed" if heavy is None else (f"imports {', '.join(heavy)}" if heavy else "")
+        print(f"{'⚠️' if bad else '✅'} {name:15s} {secs:6.2f}s {note}")
+        if bad:
+            failed.append(name)
+    if failed:
+        print(f"⚠️ {len(failed)} command(s) slow or importing heavy modules before parsing: {', '.join(failed)}")
+        return 1
+    return 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    name, rest = argv[0], argv[1:]
+    if name == "check-startup":
+        return check_startup(rest)
+    if name not in COMMANDS:
+        print(f"cli.py: unknown command '{name}'\n\n{usage()}", file=sys.stderr)
+        return 2
+    sys.argv = [f"cli.py {name}"] + rest  # argparse takes prog from argv[0]
+    importlib.import_module(COMMANDS[name][0]).main(rest)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
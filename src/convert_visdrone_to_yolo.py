@@ -1,6 +1,11 @@
 
 import os, argparse, glob, shutil
-import cv2
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from profiling import add_profile_args, finish_profile, open_profiler
+from utils import image_size
 
 # VisDrone categories documented for DET:
 # 0: ignored regions (skip), 1..11: actual categories (we include 11 as 'others')
@@ -10,83 +15,154 @@ ID2NAME = {
 }
 CLS_MAP = {k:i for i,k in enumerate(ID2NAME.keys())}  # 1->0, 2->1, ..., 11->10
 
-def convert_split(split_root, out_root, split_name):
-    img_dir = os.path.join(split_root, f"VisDrone2019-DET-{split_name}", "images")
-    ann_dir = os.path.join(split_root, f"VisDrone2019-DET-{split_name}", "annotations")
-    if not os.path.isdir(img_dir) or not os.path.isdir(ann_dir):
-        raise FileNotFoundError(f"Expecting {img_dir} and {ann_dir}")
-
-    out_img = os.path.join(out_root, "images", split_name)
-    out_lbl = os.path.join(out_root, "labels", split_name)
-    os.makedirs(out_img, exist_ok=True)
-    os.makedirs(out_lbl, exist_ok=True)
-
-    img_paths = glob.glob(os.path.join(img_dir, "*.jpg"))
+def _link(src, dst, mode):
+    """Place src at dst by copy, hardlink or symlink (hardlink falls back to copy across devices)."""
+    if os.path.lexists(dst):  # a link from an earlier run: copying onto it would write through to src
+        os.remove(dst)
+    if mode == "copy":
+        shutil.copy(src, dst)
+        return
+    if mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+def _parse_lines(text):
+    """VisDrone rows (x, y, w, h, score, category), line by line; malformed lines are skipped."""
+    rows = []
+    for raw in text.strip().splitlines():
+        if not raw.strip():
+            continue
+        parts = raw.split(",")
+        if len(parts) < 6:
+            continue
+        try:
+            rows.append((float(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]),
+                         float(parts[4]), int(float(parts[5]))))
+        except Exception:
+            continue
+    return rows
+
+def _parse_bulk(text):
+    """
+    Same rows as _parse_lines as a float64 array, parsed in one np.loadtxt call.
+    None when the file is not a clean numeric table (ragged or trailing commas,
+    non-finite values); the caller then falls back to the line parser.
+    """
+    lines = text.strip().splitlines()
+    if not lines:
+        return np.zeros((0, 6))
+    try:
+        arr = np.loadtxt(lines, delimiter=",", comments=None, ndmin=2, dtype=np.float64)
+    except ValueError:
+        return None
+    if arr.shape[1] < 6 or not np.isfinite(arr[:, :6]).all():
+        return None
+    arr = arr[:, :6].copy()
+    arr[:, 5] = np.trunc(arr[:, 5])
+    return arr
+
+def yolo_lines(text, w, h):
+    """VisDrone annotation text -> YOLO label lines for a w x h image."""
+    arr = _parse_bulk(text)
+    if arr is None:
+        arr = np.array(_parse_lines(text), dtype=np.float64).reshape(-1, 6)
+    x, y, bw, bh, score, cat = arr.T
+    xc = (x + bw / 2.0) / w
+    yc = (y + bh / 2.0) / h
+    nw = bw / w
+    nh = bh / h
+    keep = ((cat != 0) & (score != 0) &            # ignored regions / GT marked to ignore
+            (cat >= 1) & (cat <= 11) &             # CLS_MAP ids
+            ~((bw <= 0) | (bh <= 0)) &
+            (0 <= xc) & (xc <= 1) & (0 <= yc) & (yc <= 1) &  # keep only valid normalized boxes
+            ~((nw <= 0) | (nh <= 0)))
+    return [f"{CLS_MAP[int(c)]} {a:.6f} {b:.6f} {cw:.6f} {ch:.6f}"
+            for c, a, b, cw, ch in zip(cat[keep].tolist(), xc[keep].tolist(), yc[keep].tolist(),
+                                       nw[keep].tolist(), nh[keep].tolist())]
+
+def _dims(ip):
+    """(h, w) from the image header; full decode only if the header can't be read. None if unreadable."""
+    import cv2
+    try:
+        return image_size(ip)
+    except Exception:
+        im = cv2.imread(ip)
+        return None if im is None else im.shape[:2]
+
+def _convert_images(img_paths, ann_dir, out_img, out_lbl, link="copy"):
     for ip in img_paths:
         base = os.path.basename(ip)
-        shutil.copy(ip, os.path.join(out_img, base))
+        _link(ip, os.path.join(out_img, base), link)
 
         ann_in = os.path.join(ann_dir, base.replace(".jpg", ".txt"))
         ann_out = os.path.join(out_lbl, base.replace(".jpg", ".txt"))
         lines_out = []
         if os.path.exists(ann_in):
-            im = cv2.imread(ip)
-            if im is None:
+            hw = _dims(ip)
+            if hw is None:
                 # corrupted image; skip with empty label file
                 open(ann_out, "w").close()
                 continue
-            h, w = im.shape[:2]
+            h, w = hw
             with open(ann_in, "r") as f:
-                for raw in f.read().strip().splitlines():
-                    if not raw.strip():
-                        continue
-                    parts = raw.split(",")
-                    if len(parts) < 6:
-                        continue
-                    try:
-                        x = float(parts[0]); y = float(parts[1])
-                        bw = float(parts[2]); bh = float(parts[3])
-                        score = float(parts[4])
-                        cat = int(float(parts[5]))
-                    except Exception:
-                        continue
-
-                    if cat == 0:       # ignored region
-                        continue
-                    if score == 0:     # GT marked to ignore
-                        continue
-                    if cat not in CLS_MAP:
-                        continue
-                    if bw <= 0 or bh <= 0:
-                        continue
-
-                    xc = (x + bw/2.0) / w
-                    yc = (y + bh/2.0) / h
-                    nw = bw / w
-                    nh = bh / h
-                    # Keep only valid normalized boxes
-                    if not (0 <= xc <= 1 and 0 <= yc <= 1):
-                        continue
-                    if nw <= 0 or nh <= 0:
-                        continue
-
-                    lines_out.append(f"{CLS_MAP[cat]} {xc:.6f} {yc:.6f} {nw:.6f} {nh:.6f}")
+                lines_out = yolo_lines(f.read(), w, h)
         with open(ann_out, "w") as g:
             g.write("\n".join(lines_out))
+    return len(img_paths)
+
+def convert_split(split_root, out_root, split_name, workers=1, link="copy"):
+    """
+    workers > 1 converts chunks of images in a process pool; link picks how
+    images land in the output tree (copy, hardlink or symlink).
+    Image sizes come from the file header (EXIF orientation applied, as
+    cv2.imread does), so images are not decoded.
+    """
+    img_dir = os.path.join(split_root, f"VisDrone2019-DET-{split_name}", "images")
+    ann_dir = os.path.join(split_root, f"VisDrone2019-DET-{split_name}", "annotations")
+    if not os.path.isdir(img_dir) or not os.path.isdir(ann_dir):
+        raise FileNotFoundError(f"Expecting {img_dir} and {ann_dir}")
 
+    out_img = os.path.join(out_root, "images", split_name)
+    out_lbl = os.path.join(out_root, "labels", split_name)
+    os.makedirs(out_img, exist_ok=True)
+    os.makedirs(out_lbl, exist_ok=True)
+
+    img_paths = glob.glob(os.path.join(img_dir, "*.jpg"))
+    if workers <= 1 or len(img_paths) < 2:
+        _convert_images(img_paths, ann_dir, out_img, out_lbl, link)
+        return out_root
+
+    # a few chunks per worker keeps the pool busy without per-image IPC
+    n_chunks = min(len(img_paths), workers * 4)
+    chunks = [img_paths[i::n_chunks] for i in range(n_chunks)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(_convert_images, c, ann_dir, out_img, out_lbl, link) for c in chunks]
+        for fut in futs:
+            fut.result()
     return out_root
 
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--visdrone-root", required=True, help="Folder containing VisDrone2019-DET-train and -val")
     ap.add_argument("--out", default="data/visdrone-yolo", help="Output root folder for YOLO dataset")
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=0, help="Conversion processes (0 = all CPU cores, 1 = no pool)")
+    ap.add_argument("--link", choices=["copy", "hardlink", "symlink"], default="copy",
+                    help="How images are placed in the output tree")
+    add_profile_args(ap)
+    args = ap.parse_args(argv)
+    prof = open_profiler(args)
+    workers = args.workers or os.cpu_count() or 1
 
     out_root = os.path.abspath(args.out)
     os.makedirs(out_root, exist_ok=True)
 
-    convert_split(args.visdrone_root, out_root, "train")
-    convert_split(args.visdrone_root, out_root, "val")
+    for split in ("train", "val"):
+        with prof.stage(split):
+            convert_split(args.visdrone_root, out_root, split, workers, args.link)
 
     # Also write a names file (optional)
     names_path = os.path.join(out_root, "names.txt")
@@ -98,6 +174,7 @@ def main():
     print(f"Images: {os.path.join(out_root, 'images')}")
     print(f"Labels: {os.path.join(out_root, 'labels')}")
     print(f"Class names: {names_path}")
+    finish_profile(prof, args, out_root, "convert_profile")
 
 if __name__ == "__main__":
     main()
@@ -1,43 +1,188 @@
 
-import argparse, os, glob, csv
-from collections import Counter, defaultdict
-from ultralytics import YOLO
+import argparse, os, csv, time
 
-def main():
+import numpy as np
+
+from det_cache import add_cache_args, open_cache
+from detector import add_backend_args, load_model, make_detector
+from profiling import add_profile_args, finish_profile, open_profiler
+from utils import image_size
+
+EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def list_sorted(folder):
+    """Image paths in name order, so a resumed run sees the same sequence."""
+    return sorted(e.path for e in os.scandir(folder) if e.is_file() and e.name.lower().endswith(EXTS))
+
+def shape_of(src):
+    """(h, w) of a path (file header) or decoded array; None if unreadable."""
+    if not isinstance(src, str):
+        return src.shape[:2]
+    try:
+        return image_size(src)
+    except Exception:
+        return None
+
+def unreadable(src):
+    """True for a path OpenCV cannot decode: the one per-image failure that is skipped, not raised."""
+    import cv2
+    return isinstance(src, str) and cv2.imread(src) is None
+
+def resume_point(out_csv, header):
+    """
+    Name of the last fully written row of an earlier run (None if there is none).
+    A trailing partial line (crash mid-write) is truncated away.
+    """
+    if not os.path.exists(out_csv) or os.path.getsize(out_csv) == 0:
+        return None
+    with open(out_csv, "rb+") as f:
+        first = f.readline().decode().rstrip("\r\n")
+        if next(csv.reader([first])) != header:
+            raise SystemExit(f"⚠️ {out_csv} has different columns; pass another --out or drop --resume.")
+        size = f.seek(0, os.SEEK_END)
+        # walk back to the last newline
+        pos, tail = size, b""
+        while pos > 0 and b"\n" not in tail:
+            step = min(pos, 1 << 16)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+        end = pos + tail.rindex(b"\n") + 1
+        if end < size:
+            f.truncate(end)
+        # last complete line
+        body = tail[:tail.rindex(b"\n")]
+        last = body[body.rfind(b"\n") + 1:].decode().rstrip("\r")
+    if last == first:
+        return None
+    return next(csv.reader([last]))[0]
+
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--model", required=True, help="Path to weights .pt")
     p.add_argument("--source", required=True, help="Folder of images to analyze")
     p.add_argument("--out", default="outputs/counts.csv")
     p.add_argument("--conf", type=float, default=0.25)
-    args = p.parse_args()
-
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    model = YOLO(args.model)
-
-    # Collect image paths
-    exts = (".jpg", ".jpeg", ".png", ".bmp")
-    images = [p for p in glob.glob(os.path.join(args.source, "*")) if p.lower().endswith(exts)]
-    rows = []
-    class_names = [model.names[k] for k in sorted(model.names.keys())]
-
-    for img in images:
-        r = model.predict(img, conf=args.conf, verbose=False)[0]
-        cnt = Counter()
-        for c in r.boxes.cls.tolist():
-            cnt[model.names[int(c)]] += 1
-        row = {"image": os.path.basename(img)}
-        for n in class_names:
-            row[n] = cnt.get(n, 0)
-        rows.append(row)
-
-    # Write CSV
-    with open(args.out, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["image"] + class_names)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+    p.add_argument("--imgsz", type=int, default=None, help="Inference size (default: the model's)")
+    p.add_argument("--batch", type=int, default=16,
+                   help="Images read per step; each predict() call gets only images of one shape")
+    p.add_argument("--flush-every", type=int, default=1000, help="Flush + fsync the CSV every N images")
+    p.add_argument("--resume", action="store_true", help="Append to --out, skipping images already counted")
+    p.add_argument("--tile", type=int, default=0,
+                   help="Sliced inference: tile size in pixels for very large images (0 = whole image)")
+    p.add_argument("--tile-overlap", type=float, default=0.2, help="Fractional overlap between tiles")
+    p.add_argument("--tile-batch", type=int, default=8, help="Tiles per predict() call")
+    add_backend_args(p)
+    add_cache_args(p)
+    add_profile_args(p)
+    args = p.parse_args(argv)
+    import cv2  # after parsing, so --help stays fast (cli.py check-startup)
+    prof = open_profiler(args)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    model = load_model(args.model, args.backend, args.threads, args.server)
+    detect = make_detector(model, conf=args.conf, imgsz=args.imgsz, tile=args.tile,
+                           tile_overlap=args.tile_overlap, tile_batch=args.tile_batch)
+    cache = open_cache(args, getattr(model, "model_id", args.model), conf=args.conf, imgsz=args.imgsz,
+                       tile=args.tile, tile_overlap=args.tile_overlap)
+
+    ids = sorted(model.names.keys())
+    class_names = [model.names[k] for k in ids]
+    header = ["image"] + class_names
+    id_index = np.array(ids, dtype=np.int64)
+
+    # Collect image paths (sorted; resume continues after the last written row)
+    images = list_sorted(args.source)
+    last = resume_point(args.out, header) if args.resume else None
+    start = 0
+    if last is not None:
+        names = [os.path.basename(p) for p in images]
+        start = np.searchsorted(np.array(names), last, side="right") if names else 0
+        print(f"🔁 Resuming after {last} ({start}/{len(images)} already counted)")
+
+    skipped = []
+
+    def skip(pth):
+        skipped.append(pth)
+        print(f"⚠️ Skipping unreadable image: {pth}")
+
+    def detect_batch(paths):
+        batch_id = os.path.basename(paths[0])
+        with prof.stage("cache_get", batch_id):
+            keys = [cache.key_for(pth) for pth in paths] if cache is not None else [None] * len(paths)
+            out = [cache.get(k) if k else None for k in keys]
+        todo = [i for i, d in enumerate(out) if d is None]
+        srcs = []
+        for i in todo:
+            # tiles are cut from the decoded frame; otherwise let the model read the file
+            srcs.append(cv2.imread(paths[i]) if args.tile else paths[i])
+            if srcs[-1] is None:
+                skip(paths[i])
+        ok = [i for i, s in zip(todo, srcs) if s is not None]
+        srcs = [s for s in srcs if s is not None]
+        # one predict call per image shape: Ultralytics letterboxes a mixed-shape batch
+        # differently from single images (see image_analytics.shape_order)
+        groups = {}
+        for j, src in enumerate(srcs):
+            groups.setdefault(shape_of(src), []).append(j)
+        dets = [None] * len(srcs)
+        for idx in groups.values():
+            group = [srcs[j] for j in idx]
+            try:
+                with prof.stage("detect", batch_id):
+                    res = detect(group)
+            except Exception:
+                # an unreadable file fails the whole call; redo it one by one and skip only those.
+                # Anything else (server down, out of memory, bad model) is raised, not dropped.
+                if not any(unreadable(src) for src in group):
+                    raise
+                res = []
+                for src in group:
+                    if unreadable(src):
+                        skip(src)
+                        res.append(None)
+                    else:
+                        res.append(detect([src])[0])
+            for j, d in zip(idx, res):
+                dets[j] = d
+        for i, d in zip(ok, dets):
+            out[i] = d
+            if d is not None and cache is not None:
+                cache.put(keys[i], d)
+        return out
+
+    mode = "a" if last is not None else "w"
+    done, t0 = 0, time.perf_counter()
+    with open(args.out, mode, newline="") as f:
+        writer = csv.writer(f)
+        if mode == "w":
+            writer.writerow(header)
+        for s in range(start, len(images), args.batch):
+            paths = images[s:s + args.batch]
+            for pth, dets in zip(paths, detect_batch(paths)):
+                if dets is None:
+                    continue
+                name = os.path.basename(pth)
+                with prof.stage("count", name):
+                    clses = np.asarray(dets[1], dtype=np.int64)
+                    cnt = np.bincount(clses, minlength=int(id_index.max()) + 1) if len(clses) else \
+                        np.zeros(int(id_index.max()) + 1, np.int64)
+                    writer.writerow([name] + cnt[id_index].tolist())
+                prof.mark(name)
+            done += len(paths)
+            if done % args.flush_every < args.batch or s + args.batch >= len(images):
+                with prof.stage("flush"):
+                    f.flush()
+                    os.fsync(f.fileno())
+                rate = done / (time.perf_counter() - t0)
+                print(f"… {s + len(paths)}/{len(images)} images ({rate:.1f} img/s)")
 
     print(f"✅ Wrote counts to {args.out}")
+    if skipped:
+        print(f"⚠️ {len(skipped)} unreadable image(s) skipped (no row written; --resume will not retry them)")
+    if cache is not None:
+        print(cache.report())
+    finish_profile(prof, args, os.path.dirname(os.path.abspath(args.out)), "counts_profile")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,185 @@
+# src/det_cache.py
+# Persistent, content-addressed detection cache shared by the inference scripts.
+import hashlib, os, threading
+from collections import OrderedDict
+
+import numpy as np
+
+_CHUNK = 1 << 20
+
+def sha1_file(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for blk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(blk)
+    return h.hexdigest()
+
+def sha1_bytes(buf):
+    return hashlib.sha1(memoryview(buf)).hexdigest()
+
+def sha1_array(arr):
+    h = hashlib.sha1(str(arr.shape).encode())
+    h.update(memoryview(np.ascontiguousarray(arr)))
+    return h.hexdigest()
+
+class DiskLRU:
+    """
+    Directory of files capped at `max_bytes`, least recently used evicted first.
+    Recency is the file mtime (refreshed on every hit), so it survives restarts
+    and is shared by processes using the same directory.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.lock = threading.Lock()
+        self.evicted = 0
+        os.makedirs(root, exist_ok=True)
+        entries = []
+        for dirpath, _, files in os.walk(root):
+            for fn in files:
+                if fn.endswith(".tmp"):
+                    continue
+                p = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, p, st.st_size))
+        entries.sort()
+        self.index = OrderedDict((p, sz) for _, p, sz in entries)  # oldest first
+        self.total = sum(self.index.values())
+
+    def path(self, rel):
+        return os.path.join(self.root, rel)
+
+    def touch(self, p):
+        """Mark p as just used; False if it is not (or no longer) in the cache."""
+        try:
+            os.utime(p)
+        except FileNotFoundError:
+            with self.lock:
+                self.total -= self.index.pop(p, 0)
+            return False
+        with self.lock:
+            if p in self.index:
+                self.index.move_to_end(p)
+            else:  # written by another process
+                self.index[p] = os.path.getsize(p)
+                self.total += self.index[p]
+        return True
+
+    def write(self, p, data):
+        """Atomically write bytes to p, then evict down to max_bytes."""
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+        with self.lock:
+            self.total += len(data) - self.index.pop(p, 0)
+            self.index[p] = len(data)
+            while self.total > self.max_bytes and len(self.index) > 1:
+                old, sz = self.index.popitem(last=False)
+                self.total -= sz
+                self.evicted += 1
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+
+def pack_detections(boxes, clses, scores):
+    """uint32 n | n*4 float32 boxes | n uint16 classes | n float32 scores."""
+    n = len(boxes)
+    return (np.uint32(n).tobytes() + np.asarray(boxes, np.float32).tobytes() +
+            np.asarray(clses, np.uint16).tobytes() + np.asarray(scores, np.float32).tobytes())
+
+def unpack_detections(data):
+    n = int(np.frombuffer(data, np.uint32, 1)[0])
+    o = 4
+    boxes = np.frombuffer(data, np.float32, n * 4, o).reshape(n, 4).copy(); o += n * 16
+    clses = np.frombuffer(data, np.uint16, n, o).astype(int); o += n * 2
+    scores = np.frombuffer(data, np.float32, n, o).copy()
+    return boxes, clses, scores
+
+class DetectionCache:
+    """
+    Detections keyed by image content hash, under a namespace derived from the
+    model weights hash and every setting that changes the output (conf, imgsz,
+    tiling). Entries are a few bytes per box; see pack_detections.
+    """
+
+    def __init__(self, root, model_path, max_bytes=2 << 30, **settings):
+        self.lru = DiskLRU(root, max_bytes)
+        weights = sha1_file(model_path) if os.path.isfile(model_path) else model_path
+        params = [weights] + [f"{k}={settings[k]}" for k in sorted(settings)]
+        self.ns = hashlib.sha1("|".join(params).encode()).hexdigest()[:16]
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.lru.path(os.path.join(self.ns, key[:2], key + ".det"))
+
+    @staticmethod
+    def key_for(src):
+        """Content key for a path, raw encoded bytes, or a decoded array."""
+        if isinstance(src, np.ndarray):
+            return sha1_array(src)
+        if isinstance(src, (bytes, bytearray, memoryview)):
+            return sha1_bytes(src)
+        return sha1_file(src)
+
+    def get(self, key):
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+        if data is not None and self.lru.touch(p):
+            with self._lock:
+                self.hits += 1
+            return unpack_detections(data)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, dets):
+        self.lru.write(self._path(key), pack_detections(*dets))
+
+    def wrap(self, detect):
+        """detect(srcs) -> detect(srcs, keys=None) that only runs the model on misses."""
+        def cached(srcs, keys=None):
+            keys = keys or [self.key_for(s) for s in srcs]
+            out = [self.get(k) for k in keys]
+            todo = [i for i, d in enumerate(out) if d is None]
+            if todo:
+                for i, d in zip(todo, detect([srcs[i] for i in todo])):
+                    self.put(keys[i], d)
+                    out[i] = d
+            return out
+        return cached
+
+    def stats(self):
+        n = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / n, 4) if n else 0.0,
+                "entries": len(self.lru.index), "bytes": self.lru.total,
+                "max_bytes": self.lru.max_bytes, "evicted": self.lru.evicted}
+
+    def report(self):
+        s = self.stats()
+        return (f"🗃️ Detection cache: {s['hits']} hits / {s['misses']} misses "
+                f"({100 * s['hit_rate']:.1f}% hit rate), {s['entries']} entries, "
+                f"{s['bytes'] / 2**20:.1f}/{s['max_bytes'] / 2**20:.0f} MiB, {s['evicted']} evicted")
+
+def add_cache_args(ap):
+    ap.add_argument("--cache-dir", default=None,
+                    help="Reuse detections from this on-disk cache (keyed by image + weights + settings)")
+    ap.add_argument("--cache-max-mb", type=float, default=2048, help="Cache size cap; LRU entries evicted beyond it")
+
+def open_cache(args, model_path, **settings):
+    """DetectionCache from add_cache_args() options, or None when caching is off."""
+    if not args.cache_dir:
+        return None
+    return DetectionCache(args.cache_dir, model_path, max_bytes=args.cache_max_mb * 2**20, **settings)
@@ -0,0 +1,117 @@
+# src/det_store.py
+# Columnar detections store: one uncompressed .npz per run, frames indexed by offsets.
+import json, os, tempfile, zipfile
+
+import numpy as np
+
+# per-frame columns (one entry per frame) and per-box columns (one per detection)
+FRAME_COLS = {"height": np.int32, "width": np.int32, "frame_index": np.int64, "timestamp_s": np.float64}
+BOX_COLS = {"boxes": (np.float32, 4), "classes": (np.uint16, 1), "scores": (np.float32, 1)}
+
+class DetectionWriter:
+    """
+    Append frames one at a time; columns spill to temp files so memory stays
+    flat. close() assembles them into a single .npz (ZIP_STORED):
+      names[N], path[N], height[N], width[N], frame_index[N], timestamp_s[N],
+      offsets[N+1] (frame i owns boxes[offsets[i]:offsets[i+1]]),
+      boxes[M,4] float32 xyxy px, classes[M] uint16, scores[M] float32,
+      class_names[C], meta (JSON string).
+    """
+
+    def __init__(self, path, class_names, meta=None):
+        self.path = path
+        self.class_names = [class_names[k] for k in sorted(class_names)]
+        self.meta = dict(meta or {})
+        self.tmp = tempfile.TemporaryDirectory(prefix="detstore-", dir=os.path.dirname(os.path.abspath(path)))
+        self.files = {k: open(os.path.join(self.tmp.name, k), "wb") for k in list(FRAME_COLS) + list(BOX_COLS)}
+        self.names, self.paths, self.counts = [], [], []
+
+    def add(self, name, H, W, boxes, clses, scores, path="", frame_index=-1, timestamp_s=float("nan")):
+        self.names.append(name)
+        self.paths.append(path)
+        self.counts.append(len(boxes))
+        for k, v in (("height", H), ("width", W), ("frame_index", frame_index), ("timestamp_s", timestamp_s)):
+            self.files[k].write(np.asarray(v, FRAME_COLS[k]).tobytes())
+        for k, v in (("boxes", boxes), ("classes", clses), ("scores", scores)):
+            self.files[k].write(np.asarray(v, BOX_COLS[k][0]).tobytes())
+
+    def _write_raw(self, zf, name, raw_path, dtype, shape):
+        with zf.open(name + ".npy", "w", force_zip64=True) as out:
+            np.lib.format.write_array_header_2_0(
+                out, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                      "fortran_order": False, "shape": shape})
+            with open(raw_path, "rb") as f:
+                for blk in iter(lambda: f.read(1 << 22), b""):
+                    out.write(blk)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        n, m = len(self.names), int(sum(self.counts))
+        offsets = np.zeros(n + 1, np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        small = {"names": np.array(self.names, dtype=str), "path": np.array(self.paths, dtype=str),
+                 "offsets": offsets, "class_names": np.array(self.class_names, dtype=str),
+                 "meta": np.array(json.dumps(self.meta))}
+        tmp_out = self.path + ".tmp"
+        with zipfile.ZipFile(tmp_out, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for k, v in small.items():
+                with zf.open(k + ".npy", "w", force_zip64=True) as out:
+                    np.lib.format.write_array(out, v, allow_pickle=False)
+            for k, dt in FRAME_COLS.items():
+                self._write_raw(zf, k, os.path.join(self.tmp.name, k), dt, (n,))
+            for k, (dt, w) in BOX_COLS.items():
+                self._write_raw(zf, k, os.path.join(self.tmp.name, k), dt, (m, w) if w > 1 else (m,))
+        os.replace(tmp_out, self.path)
+        self.tmp.cleanup()
+        return self.path
+
+def _member_memmap(path, info):
+    """Memory-map one stored (uncompressed) .npy member of a zip file."""
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        local = f.read(30)
+        name_len = int.from_bytes(local[26:28], "little")
+        extra_len = int.from_bytes(local[28:30], "little")
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                       else np.lib.format.read_array_header_2_0)
+        shape, fortran, dtype = read_header(f)
+        start = f.tell()
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=start, shape=shape,
+                     order="F" if fortran else "C")
+
+def load_detections(path, mmap=True):
+    """
+    dict of columns written by DetectionWriter. With mmap, the large per-box
+    columns are memory-mapped straight out of the .npz instead of read.
+    """
+    out = {}
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            key = info.filename[:-4]
+            if mmap and key in BOX_COLS and info.compress_type == zipfile.ZIP_STORED:
+                out[key] = _member_memmap(path, info)
+            else:
+                with zf.open(info) as f:
+                    out[key] = np.lib.format.read_array(f, allow_pickle=False)
+    out["meta"] = json.loads(str(out["meta"]))
+    return out
+
+def merge_detections(paths, out_path, meta=None):
+    """Concatenate stores (same class names) into one, frames in the order given; returns out_path."""
+    first = load_detections(paths[0])
+    names = {i: str(n) for i, n in enumerate(first["class_names"])}
+    w = DetectionWriter(out_path, names, meta=first["meta"] if meta is None else meta)
+    for p in paths:
+        s = load_detections(p)
+        off = s["offsets"]
+        for i in range(len(s["names"])):
+            a, b = off[i], off[i + 1]
+            w.add(str(s["names"][i]), s["height"][i], s["width"][i], s["boxes"][a:b], s["classes"][a:b],
+                  s["scores"][a:b], path=str(s["path"][i]), frame_index=s["frame_index"][i],
+                  timestamp_s=s["timestamp_s"][i])
+    return w.close()
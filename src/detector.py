@@ -0,0 +1,92 @@
+# src/detector.py
+# Shared model loading + detection entry point for the inference scripts.
+import numpy as np
+
+from tiling import detect_tiled
+
+# VisDrone class names (order matters)
+VISDRONE_NAMES = [
+    "pedestrian","people","bicycle","car","van","truck",
+    "tricycle","awning-tricycle","bus","motor","others"
+]
+
+def class_names(m):
+    """id -> name; names can be dict (id->name) or list."""
+    if isinstance(m.names, dict):
+        return {int(i): n for i, n in m.names.items()}
+    return {i: n for i, n in enumerate(VISDRONE_NAMES)}
+
+def detections_from_result(res):
+    """Ultralytics Results -> (boxes xyxy, class ids, scores) as numpy arrays."""
+    if res.boxes is not None and len(res.boxes) > 0:
+        boxes  = res.boxes.xyxy.cpu().numpy()
+        clses  = res.boxes.cls.cpu().numpy().astype(int)
+        scores = res.boxes.conf.cpu().numpy()
+    else:
+        boxes  = np.zeros((0, 4), np.float32)
+        clses  = np.zeros((0,), int)
+        scores = np.zeros((0,), np.float32)
+    return boxes, clses, scores
+
+def make_detector(m, conf=0.25, imgsz=960, tile=0, tile_overlap=0.2, tile_batch=8):
+    """
+    detect(list of BGR arrays or paths) -> [(boxes, classes, scores), ...].
+    With tile > 0, frames are cut into overlapping tile x tile windows, the
+    tiles go through the model `tile_batch` at a time and are merged back
+    with cross-tile NMS (decoded arrays only). detect.model is m (e.g. for
+    a RemoteModel's model_id).
+    """
+    kw = {} if imgsz is None else {"imgsz": imgsz}  # None: the model's own training imgsz
+    if hasattr(m, "check_imgsz"):  # infer_server.RemoteModel: the server's imgsz is fixed
+        m.check_imgsz(imgsz)
+
+    def predict(srcs):
+        if hasattr(m, "detect"):  # onnx_backend.OnnxModel / infer_server.RemoteModel
+            return m.detect(srcs, conf=conf, imgsz=imgsz)
+        results = m.predict(source=srcs, conf=conf, batch=len(srcs), save=False, verbose=False, **kw)
+        return [detections_from_result(r) for r in results]
+
+    predict.model = m
+    if not tile:
+        return predict
+
+    def detect(srcs):
+        return [detect_tiled(predict, im, tile, tile_overlap, tile_batch) for im in srcs]
+    detect.model = m
+    return detect
+
+BACKENDS = ("auto", "ultralytics", "onnxruntime")
+
+def resolve_backend(model_path, backend="auto"):
+    """auto: .onnx files run on onnxruntime, everything else (.pt, *_openvino_model/) through Ultralytics."""
+    if backend != "auto":
+        return backend
+    return "onnxruntime" if str(model_path).lower().endswith(".onnx") else "ultralytics"
+
+def load_model(model_path, backend="auto", threads=0, server=None):
+    """
+    YOLO, or an OnnxModel with tuned CPU threading (threads=0: one per
+    physical core), or with server set a RemoteModel that sends frames to
+    a running infer_server.py instead of loading anything.
+    """
+    if server:
+        from infer_server import RemoteModel
+        return RemoteModel(server)
+    if resolve_backend(model_path, backend) == "onnxruntime":
+        from onnx_backend import OnnxModel  # onnxruntime is only needed for this backend
+        return OnnxModel(model_path, threads=threads)
+    from ultralytics import YOLO  # imported on first use: it pulls in torch (seconds)
+    return YOLO(model_path)
+
+def add_backend_args(ap, client=True):
+    ap.add_argument("--backend", choices=BACKENDS, default="auto",
+                    help="Inference backend (auto: onnxruntime for .onnx, Ultralytics otherwise)")
+    ap.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0 = physical cores)")
+    if client:
+        ap.add_argument("--server", default=None,
+                        help="URL of a running infer_server.py (e.g. 127.0.0.1:8766); --model is not loaded")
+
+def load_detector(model_path, backend="auto", threads=0, server=None, **kw):
+    """(detect, names) for a weights file; kw as for make_detector."""
+    m = load_model(model_path, backend, threads, server)
+    return make_detector(m, **kw), class_names(m)
@@ -0,0 +1,309 @@
+# src/eval_predictions.py
+# mAP / precision / recall from saved predictions vs YOLO labels: per class, per object size, per crowd density.
+import argparse, json, math, os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils import image_size, list_images
+
+IOUV = np.linspace(0.5, 0.95, 10)  # COCO IoU thresholds
+# COCO area ranges in original-image pixels²
+SIZE_BUCKETS = {"small": (0.0, 32.0 ** 2), "medium": (32.0 ** 2, 96.0 ** 2), "large": (96.0 ** 2, math.inf)}
+
+def read_yolo_txt(path):
+    """(cls[n], xyxy[n,4] normalized, conf[n]) from 'cls xc yc w h [conf]' lines; conf = 1 without the column."""
+    try:
+        arr = np.loadtxt(path, ndmin=2, dtype=np.float64)
+    except (OSError, ValueError):
+        arr = np.zeros((0, 5))
+    if arr.size == 0 or arr.shape[1] not in (5, 6):
+        arr = np.zeros((0, 5))
+    xy, wh = arr[:, 1:3], arr[:, 3:5]
+    conf = arr[:, 5] if arr.shape[1] == 6 else np.ones(len(arr))
+    return arr[:, 0].astype(int), np.concatenate([xy - wh / 2, xy + wh / 2], axis=1), conf
+
+def box_iou(a, b):
+    """IoU matrix (len(a), len(b)) for xyxy boxes."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def match_image(gt_cls, gt_box, p_cls, p_box):
+    """
+    Greedy COCO matching, predictions in descending confidence order: each
+    takes the best still-unclaimed target of its class at every IoU
+    threshold. Ultralytics before 8.4 matches pairs in IoU order instead,
+    so its mAP on the same predictions can differ.
+    -> matched target index (n_pred, 10), -1 = FP.
+    """
+    n, t = len(p_cls), len(IOUV)
+    out = np.full((n, t), -1, np.int64)
+    if n == 0 or len(gt_cls) == 0:
+        return out
+    iou = box_iou(gt_box, p_box) * (gt_cls[:, None] == p_cls[None, :])
+    claimed = np.zeros((len(gt_cls), t), bool)
+    cols = np.arange(t)
+    for j in np.flatnonzero((iou >= IOUV[0]).any(0)):
+        avail = np.where(claimed, 0.0, iou[:, j, None])
+        k = avail.argmax(0)
+        ok = avail[k, cols] >= IOUV
+        out[j] = np.where(ok, k, -1)
+        claimed[k[ok], cols[ok]] = True
+    return out
+
+def _eval_chunk(items):
+    """
+    items: (image id, gt label path, prediction (txt path or (cls, xyxy px, conf)), h, w).
+    Per-prediction and per-target arrays for the whole chunk, areas in pixels².
+    """
+    P = {k: [] for k in ("img", "cls", "conf", "area", "tp", "m_area")}
+    T = {k: [] for k in ("img", "cls", "area")}
+    for img_id, gt_path, pred, h, w in items:
+        scale = np.array([w, h, w, h], np.float64)
+        g_cls, g_box, _ = read_yolo_txt(gt_path) if gt_path else read_yolo_txt("")
+        g_box = g_box * scale
+        if isinstance(pred, tuple):
+            p_cls, p_box, p_conf = pred
+        else:
+            p_cls, p_box, p_conf = read_yolo_txt(pred) if pred else read_yolo_txt("")
+            p_box = p_box * scale
+        order = np.argsort(-p_conf, kind="stable")
+        p_cls, p_box, p_conf = np.asarray(p_cls)[order], np.asarray(p_box, np.float64)[order], p_conf[order]
+        m = match_image(g_cls, g_box, p_cls, p_box)
+        g_area = (g_box[:, 2:] - g_box[:, :2]).prod(1)
+        P["img"].append(np.full(len(p_cls), img_id))
+        P["cls"].append(p_cls)
+        P["conf"].append(p_conf)
+        P["area"].append((p_box[:, 2:] - p_box[:, :2]).prod(1))
+        P["tp"].append(m >= 0)
+        P["m_area"].append(np.where(m >= 0, g_area[np.clip(m, 0, None)] if len(g_area) else 0.0, np.nan))
+        T["img"].append(np.full(len(g_cls), img_id))
+        T["cls"].append(g_cls)
+        T["area"].append(g_area)
+    cat = lambda xs, shape: np.concatenate(xs) if xs else np.zeros(shape)
+    return ({k: cat(v, (0, len(IOUV)) if k in ("tp", "m_area") else (0,)) for k, v in P.items()},
+            {k: cat(v, (0,)) for k, v in T.items()})
+
+def compute_ap(recall, precision):
+    """101-point interpolated AP (COCO), as Ultralytics computes it."""
+    mrec = np.concatenate(([0.0], recall, [recall[-1] if len(recall) else 1.0], [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0], [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    return np.trapezoid(np.interp(x, mrec, mpre), x) if hasattr(np, "trapezoid") else np.trapz(np.interp(x, mrec, mpre), x)
+
+def _smooth(y, f=0.1):
+    nf = round(len(y) * f * 2) // 2 + 1
+    p = np.ones(nf // 2)
+    return np.convolve(np.concatenate((p * y[0], y, p * y[-1])), np.ones(nf) / nf, mode="valid")
+
+def ap_per_class(tp, conf, pred_cls, target_cls, keep=None):
+    """
+    tp (n, 10) bool, keep (n, 10) bool or None (which predictions count at
+    each IoU threshold; used by the size buckets). -> classes with targets,
+    their target counts, AP (nc, 10), and P / R / F1 per class at the
+    confidence that maximizes mean F1 (Ultralytics' operating point).
+    """
+    classes, nt = np.unique(target_cls, return_counts=True)
+    ap = np.zeros((len(classes), tp.shape[1]))
+    x = np.linspace(0, 1, 1000)
+    p_curve, r_curve = np.zeros((len(classes), 1000)), np.zeros((len(classes), 1000))
+    order = np.argsort(-conf, kind="stable")
+    tp, conf, pred_cls = tp[order], conf[order], pred_cls[order]
+    keep = np.ones_like(tp) if keep is None else keep[order]
+    for ci, c in enumerate(classes):
+        sel = pred_cls == c
+        for j in range(tp.shape[1]):
+            s = sel & keep[:, j]
+            if not s.any():
+                continue
+            tpc = tp[s, j].cumsum()
+            fpc = (~tp[s, j]).cumsum()
+            recall, precision = tpc / (nt[ci] + 1e-16), tpc / (tpc + fpc)
+            ap[ci, j] = compute_ap(recall, precision)
+            if j == 0:
+                r_curve[ci] = np.interp(-x, -conf[s], recall, left=0)
+                p_curve[ci] = np.interp(-x, -conf[s], precision, left=1)
+    f1 = 2 * p_curve * r_curve / (p_curve + r_curve + 1e-16)
+    i = _smooth(f1.mean(0), 0.1).argmax() if len(classes) else 0
+    return classes, nt, ap, p_curve[:, i], r_curve[:, i], f1[:, i], float(x[i])
+
+def _summary(tp, conf, pcls, tcls, names, keep=None, per_class=True):
+    classes, nt, ap, p, r, f1, best_conf = ap_per_class(tp, conf, pcls, tcls, keep)
+    out = {"targets": int(nt.sum()), "predictions": int(len(conf) if keep is None else keep[:, 0].sum()),
+           "precision": round(float(p.mean()), 5) if len(classes) else 0.0,
+           "recall": round(float(r.mean()), 5) if len(classes) else 0.0,
+           "map50": round(float(ap[:, 0].mean()), 5) if len(classes) else 0.0,
+           "map50_95": round(float(ap.mean()), 5) if len(classes) else 0.0}
+    if per_class:
+        out["best_f1_conf"] = round(best_conf, 4)
+        out["per_class"] = {names.get(int(c), str(int(c))): {
+            "targets": int(n), "precision": round(float(pc), 5), "recall": round(float(rc), 5),
+            "f1": round(float(fc), 5), "ap50": round(float(a[0]), 5), "ap50_95": round(float(a.mean()), 5)}
+            for c, n, pc, rc, fc, a in zip(classes, nt, p, r, f1, ap)}
+    return out
+
+def at_conf(tp50, conf, n_targets, thr):
+    """Overall P / R / F1 at IoU 0.5 keeping predictions with conf >= thr (class-agnostic pooling)."""
+    keep = conf >= thr
+    tp = int(tp50[keep].sum())
+    p = tp / keep.sum() if keep.any() else 0.0
+    r = tp / n_targets if n_targets else 0.0
+    return {"conf": thr, "precision": round(p, 5), "recall": round(r, 5),
+            "f1": round(2 * p * r / (p + r), 5) if p + r else 0.0, "predictions": int(keep.sum())}
+
+def load_predictions(pred, stems):
+    """{stem: txt path or (cls, xyxy px, conf)}, {stem: (h, w)} and class names known from the store."""
+    if os.path.isdir(pred):
+        return {s: os.path.join(pred, s + ".txt") for s in stems
+                if os.path.exists(os.path.join(pred, s + ".txt"))}, {}, {}
+    from det_store import load_detections
+    st = load_detections(pred, mmap=False)
+    off = st["offsets"]
+    preds, sizes = {}, {}
+    for i, n in enumerate(st["names"]):
+        s = os.path.splitext(str(n))[0]
+        a, b = off[i], off[i + 1]
+        preds[s] = (st["classes"][a:b].astype(int), st["boxes"][a:b].astype(np.float64),
+                    st["scores"][a:b].astype(np.float64))
+        sizes[s] = (int(st["height"][i]), int(st["width"][i]))
+    return preds, sizes, {i: str(n) for i, n in enumerate(st["class_names"])}
+
+def default_images_dir(labels_dir):
+    """YOLO layout: <root>/labels/<split> -> <root>/images/<split>."""
+    parts = os.path.normpath(os.path.abspath(labels_dir)).split(os.sep)
+    if "labels" in parts:
+        i = len(parts) - 1 - parts[::-1].index("labels")
+        parts[i] = "images"
+    return os.sep.join(parts)
+
+def evaluate(labels_dir, pred, images_dir=None, names=None, workers=1, density_bins=(10, 50, 200),
+             conf_thresholds=()):
+    """
+    Report dict: overall + per-class metrics, per size bucket (COCO areas,
+    targets outside a bucket and predictions matched to them are ignored),
+    per crowd density (images grouped by their number of targets), and
+    optionally P/R/F1 at fixed confidence thresholds.
+    """
+    images_dir = images_dir or default_images_dir(labels_dir)
+    images = {os.path.splitext(os.path.basename(p))[0]: p for p in list_images(images_dir)} \
+        if os.path.isdir(images_dir) else {}
+    gt = {os.path.splitext(f)[0]: os.path.join(labels_dir, f) for f in os.listdir(labels_dir) if f.endswith(".txt")}
+    stems = sorted(set(images) | set(gt))
+    preds, sizes, store_names = load_predictions(pred, stems)
+    items = []
+    for i, s in enumerate(stems):
+        if s in sizes:
+            h, w = sizes[s]
+        elif s in images:
+            h, w = image_size(images[s])
+        else:
+            raise FileNotFoundError(f"No image for {s} in {images_dir} (needed for its size); pass --images")
+        items.append((i, gt.get(s), preds.get(s), h, w))
+
+    if workers > 1 and len(items) > 1:
+        n_chunks = min(len(items), workers * 4)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(_eval_chunk, [items[k::n_chunks] for k in range(n_chunks)]))
+    else:
+        parts = [_eval_chunk(items)]
+    P = {k: np.concatenate([p[0][k] for p in parts]) for k in parts[0][0]}
+    T = {k: np.concatenate([p[1][k] for p in parts]) for k in parts[0][1]}
+    names = names or store_names
+
+    report = {"images": len(stems), "labels": labels_dir, "predictions": pred}
+    report["overall"] = _summary(P["tp"], P["conf"], P["cls"], T["cls"], names)
+
+    report["size"] = {}
+    for b, (lo, hi) in SIZE_BUCKETS.items():
+        t_in = (T["area"] >= lo) & (T["area"] < hi)
+        if not t_in.any():
+            continue
+        p_in = (P["area"] >= lo) & (P["area"] < hi)
+        m_in = (P["m_area"] >= lo) & (P["m_area"] < hi)
+        keep = np.where(P["tp"], m_in, p_in[:, None])
+        report["size"][b] = _summary(P["tp"], P["conf"], P["cls"], T["cls"][t_in], names, keep, per_class=False)
+
+    report["density"] = {}
+    per_img = np.bincount(T["img"].astype(int), minlength=len(stems))
+    edges = [0, *density_bins, math.inf]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        imgs = (per_img >= lo) & (per_img < hi)
+        if not imgs.any():
+            continue
+        p_sel, t_sel = imgs[P["img"].astype(int)], imgs[T["img"].astype(int)]
+        label = f"{lo}-{hi - 1}" if hi != math.inf else f"{lo}+"
+        report["density"][label] = dict(
+            _summary(P["tp"][p_sel], P["conf"][p_sel], P["cls"][p_sel], T["cls"][t_sel], names, per_class=False),
+            images=int(imgs.sum()))
+
+    if conf_thresholds:
+        report["at_conf"] = [at_conf(P["tp"][:, 0], P["conf"], len(T["cls"]), c) for c in conf_thresholds]
+    return report
+
+def read_names(path):
+    """Class names from names.txt (convert_visdrone_to_yolo.py) or a dataset yaml's names: block."""
+    if not path:
+        return {}
+    with open(path) as f:
+        lines = [l.rstrip("\n") for l in f]
+    if path.endswith(".txt"):
+        return {i: n for i, n in enumerate(l for l in lines if l.strip())}
+    names, inside = {}, False
+    for l in lines:
+        if l.startswith("names:"):
+            inside = True
+        elif inside and ":" in l and l.startswith((" ", "\t")):
+            k, v = l.split(":", 1)
+            names[int(k)] = v.strip().strip("'\"")
+        elif inside and l.strip():
+            break
+    return names
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--labels", required=True, help="Ground-truth YOLO labels (e.g. data/visdrone-yolo/labels/val)")
+    ap.add_argument("--pred", required=True,
+                    help="Predictions: folder of 'cls xc yc w h conf' txt files (predict_images.py labels, "
+                         "low --conf such as 0.001 for mAP) or a detections store .npz")
+    ap.add_argument("--images", default=None, help="Images folder for sizes (default: labels/ → images/)")
+    ap.add_argument("--names", default=None,
+                    help="names.txt or dataset yaml for class names (default: <dataset>/names.txt if present)")
+    ap.add_argument("--workers", type=int, default=0, help="Matching processes (0 = all CPU cores)")
+    ap.add_argument("--density-bins", default="10,50,200", help="Targets-per-image bucket edges")
+    ap.add_argument("--conf-thresholds", default="", help="Also report P/R/F1 at these confidences, e.g. 0.1,0.25,0.5")
+    ap.add_argument("--out", default="outputs/eval/report.json")
+    a = ap.parse_args(argv)
+    if a.names is None:
+        guess = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(a.labels))), "names.txt")
+        a.names = guess if os.path.exists(guess) else None
+
+    rep = evaluate(a.labels, a.pred, a.images, read_names(a.names), a.workers or os.cpu_count() or 1,
+                   tuple(int(x) for x in a.density_bins.split(",") if x),
+                   tuple(float(x) for x in a.conf_thresholds.split(",") if x))
+    os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+    with open(a.out, "w") as f:
+        json.dump(rep, f, indent=2)
+
+    row = "{:16s} {:>8} {:>8} {:>8} {:>8} {:>9}"
+    print(row.format("", "targets", "P", "R", "mAP50", "mAP50-95"))
+    o = rep["overall"]
+    print(row.format("all", o["targets"], f"{o['precision']:.3f}", f"{o['recall']:.3f}", f"{o['map50']:.3f}",
+                     f"{o['map50_95']:.3f}"))
+    for name, c in o["per_class"].items():
+        print(row.format(name[:16], c["targets"], f"{c['precision']:.3f}", f"{c['recall']:.3f}",
+                         f"{c['ap50']:.3f}", f"{c['ap50_95']:.3f}"))
+    for group in ("size", "density"):
+        for k, s in rep[group].items():
+            print(row.format(f"{group}:{k}"[:16], s["targets"], f"{s['precision']:.3f}", f"{s['recall']:.3f}",
+                             f"{s['map50']:.3f}", f"{s['map50_95']:.3f}"))
+    for c in rep.get("at_conf", []):
+        print(f"📊 conf ≥ {c['conf']:g}: P {c['precision']:.3f}  R {c['recall']:.3f}  F1 {c['f1']:.3f}")
+    print(f"✅ Wrote {a.out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 
 import argparse
-from ultralytics import YOLO
 
-def main():
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--data", default="configs/visdrone.yaml")
     p.add_argument("--model", required=True, help="Path to trained model weights (.pt)")
-    args = p.parse_args()
+    args = p.parse_args(argv)
+    from ultralytics import YOLO  # after parsing: --help and arg errors stay fast
 
     model = YOLO(args.model)
     metrics = model.val(data=args.data)
@@ -0,0 +1,48 @@
+import argparse
+import os
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", required=True, help="Trained weights .pt (e.g., runs/detect/train/weights/best.pt)")
+    p.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    p.add_argument("--imgsz", type=int, default=640, help="Export (and inference) size")
+    p.add_argument("--int8", action="store_true", help="Static INT8 quantization, calibrated on the val split of --data")
+    p.add_argument("--data", default="configs/visdrone.yaml", help="Dataset yaml; its val split is the calibration set")
+    p.add_argument(
+        "--calib-fraction",
+        type=float,
+        default=1.0,
+        help="Fraction of the val split used for INT8 calibration (300+ images recommended)"
+    )
+    p.add_argument("--batch", type=int, default=1, help="Export batch size (also the calibration batch)")
+    p.add_argument("--dynamic", action="store_true", help="Dynamic batch/size input (ONNX); static is faster on CPU")
+    args = p.parse_args(argv)
+    from ultralytics import YOLO  # after parsing: --help and arg errors stay fast
+
+    model = YOLO(args.model)
+    kw = {}
+    if args.int8:
+        if not os.path.exists(args.data):
+            raise FileNotFoundError(f"⚠️ INT8 calibration needs the dataset yaml: {args.data} not found.")
+        # Ultralytics builds the calibration loader from data[val] (letterboxed like inference)
+        kw.update(quantize=8, data=args.data, split="val", fraction=args.calib_fraction)
+
+    print(f"📦 Exporting {args.model} → {args.format}{' INT8' if args.int8 else ''} (imgsz={args.imgsz})")
+    out = model.export(
+        format=args.format,
+        imgsz=args.imgsz,
+        batch=args.batch,
+        dynamic=args.dynamic,
+        simplify=True,
+        device="cpu",
+        **kw
+    )
+
+    print(f"✅ Exported: {out}")
+    print(f"ℹ️ Run it with e.g.: python src/image_analytics.py --model {out} --source <images> --threads 0")
+    print(f"ℹ️ Check parity with: python src/backend_parity.py --reference {args.model} --candidate {out} --data {args.data}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,26 @@
 # src/image_analytics.py
-import argparse, os, glob, math
+import argparse, csv, json, os, math, shutil, time
+import multiprocessing as mp
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
-import cv2
-from PIL import Image, ImageDraw, ImageFont
-from ultralytics import YOLO
 
-# VisDrone class names (order matters)
-VISDRONE_NAMES = [
-    "pedestrian","people","bicycle","car","van","truck",
-    "tricycle","awning-tricycle","bus","motor","others"
-]
+from det_cache import DetectionCache, add_cache_args
+from det_store import DetectionWriter, merge_detections
+from detector import VISDRONE_NAMES, add_backend_args, load_detector  # VISDRONE_NAMES kept importable from here
+from keyframes import KeyframeDetector
+from metrics_writer import (MetricsWriter, RowWriter, concat_csvs, merge_sorted_csvs, metrics_columns, top_k_rows,
+                            write_rows, zone_columns)
+from pipeline import run_staged
+from profiling import NULL, add_profile_args, finish_profile, open_profiler
+from render import OverlayRenderer, colorize_heatmap, heatmap_overlay  # colorize_heatmap kept importable from here
+from risk import split_centers, proximity_risk
+from sources import is_video, iter_video_frames, list_image_paths
+from utils import image_size
+from zones import load_zones, zone_csv_path
 
 # Vehicles set (for proximity risk to pedestrians)
 VEHICLE_SET = {
@@ -26,10 +33,13 @@ CI_WEIGHTS = {
     "tricycle":0.7, "awning-tricycle":0.9, "bus":2.0, "motor":0.6, "others":0.5
 }
 
+# PRI distance threshold as a fraction of the frame diagonal
+PRI_THR_FRAC = 0.08
+
 def ensure_dir(p):
     os.makedirs(p, exist_ok=True)
 
-def _safe_textbbox(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont):
+def _safe_textbbox(draw: "ImageDraw.ImageDraw", text: str, font: "ImageFont.ImageFont"):
     """
     Pillow 10+ removed textsize(); prefer textbbox(), with fallbacks.
     Returns (left, top, right, bottom)
@@ -46,6 +56,7 @@ def _safe_textbbox(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFo
             return (0, 0, w, h)
 
 def draw_overlay(img_pil, boxes, classes, scores, class_id_to_name):
+    from PIL import ImageDraw, ImageFont
     im = img_pil.copy()
     dr = ImageDraw.Draw(im)
     try:
@@ -76,153 +87,503 @@ def draw_overlay(img_pil, boxes, classes, scores, class_id_to_name):
 
     return im
 
-def heatmap_from_points(H, W, points, sigma=15):
-    """
-    Simple density heatmap: impulse map + Gaussian blur.
-    points: list of (x,y) pixel coords
-    """
-    if len(points) == 0:
-        return np.zeros((H, W), dtype=np.float32)
-    acc = np.zeros((H, W), dtype=np.float32)
-    for (x, y) in points:
-        xi, yi = int(round(x)), int(round(y))
-        if 0 <= yi < H and 0 <= xi < W:
-            acc[yi, xi] += 1.0
-    # Blur
-    k = max(3, int(sigma*3)//2*2+1)
-    hm = cv2.GaussianBlur(acc, (k, k), sigmaX=sigma, sigmaY=sigma)
-    hm = (hm - hm.min()) / (hm.max() - hm.min() + 1e-6)
-    return hm
-
-def colorize_heatmap(hm):
-    """0..1 -> colored RGBA overlay using OpenCV colormap."""
-    hm_u8 = (hm * 255).astype(np.uint8)
-    color = cv2.applyColorMap(hm_u8, cv2.COLORMAP_JET)  # BGR
-    color = cv2.cvtColor(color, cv2.COLOR_BGR2RGBA)
-    color[..., 3] = (hm * 200).astype(np.uint8)  # alpha
-    return color  # HxWx4
-
 def center_of(box):
     x1, y1, x2, y2 = box
     return ((x1 + x2) / 2.0, (y1 + y2) / 2.0)
 
-def run(model_path, source, out_dir, conf=0.25, imgsz=960, do_heatmap=True):
+def frame_metrics(boxes, clses, H, W, names):
+    """CI / PRI / occupancy / per-class counts for one frame (CSV row without 'image')."""
+    # --- per-class counts ---
+    cnt_ids = Counter(clses.tolist())
+    counts = {names.get(k, str(k)): int(v) for k, v in cnt_ids.items()}
+
+    # Congestion Index: sum(weights per detection)
+    ci = 0.0
+    for cls in clses.tolist():
+        nm = names.get(int(cls), "others")
+        ci += CI_WEIGHTS.get(nm, 1.0)
+
+    # Proximity Risk Index: vehicles close to pedestrians in a single frame
+    ped_centers, veh_centers = split_centers(boxes, clses, names, VEHICLE_SET)
+    diag = math.hypot(W, H)
+    thr = PRI_THR_FRAC * diag  # ~8% of diagonal; tune for your data
+    pri, min_dists = proximity_risk(ped_centers, veh_centers, thr)
+
+    # Occupancy (sum of bbox area / image area)
+    areas = ((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])).clip(min=0)
+    occupancy = float(areas.sum() / (W * H + 1e-6))
+
+    row = {
+        "congestion_index": round(ci, 3),
+        "proximity_risk_index": round(pri, 3),
+        "occupancy_frac": round(occupancy, 4),
+        "total_detections": int(len(boxes)),
+    }
+    # attach per-class counts (columns like count_car, count_pedestrian, ...)
+    for n, v in counts.items():
+        row[f"count_{n}"] = v
+
+    # extras: average min distance ped→vehicle (pixels)
+    row["avg_min_ped_vehicle_px"] = round(float(np.mean(min_dists)) if len(min_dists) else 0.0, 2)
+    return row
+
+def render_frame(arr, boxes, clses, scores, renderer, base, over_dir, hm_dir, do_heatmap, prof=NULL):
+    """
+    Write the overlay and (optionally) the RGBA density heatmap for one BGR
+    frame; both come out at the renderer's scale.
+    """
+    import cv2
+    from PIL import Image
+    with prof.stage("overlay", base):
+        overlay = renderer.render(arr, boxes, clses, scores)
+    with prof.stage("overlay_write", base):
+        cv2.imwrite(os.path.join(over_dir, base), overlay)
+
+    # --- density heatmap (all detections) ---
+    if do_heatmap:
+        blend = heatmap_overlay(arr, boxes, renderer.scale, prof=prof, frame=base)
+        # ✅ Save as PNG to support RGBA (no JPEG alpha error)
+        hm_out = Path(hm_dir) / (Path(base).stem + "_heatmap.png")
+        with prof.stage("png_write", base):
+            Image.fromarray(blend, mode="RGBA").save(hm_out)
+
+def shape_order(images):
+    """
+    Input indices reordered so images of equal (h, w) are adjacent.
+    Ultralytics only uses minimal-padding letterboxing when every image in a
+    batch has the same shape, so mixed-shape batches would see a different
+    input tensor than the per-image path. Shapes come from the file header.
+    """
+    groups = {}
+    for i, ip in enumerate(images):
+        try:
+            key = image_size(ip)
+        except Exception:
+            key = None
+        groups.setdefault(key, []).append(i)
+    return [i for idx in groups.values() for i in idx]
+
+def decode_frame(frame, cache=None, need_pixels=True, prefetch=True):
+    """
+    Decode once (BGR, same decoder as Ultralytics); shared by detector and renderers.
+    With a detection cache, the file bytes read here are also hashed (and,
+    with prefetch, looked up); a hit that needs no pixels skips decoding.
+    """
+    import cv2
+    buf = np.fromfile(frame["path"], np.uint8)
+    if cache is not None:
+        frame["key"] = cache.key_for(buf)
+        if prefetch:
+            frame["dets"] = cache.get(frame["key"])
+        if frame.get("dets") is not None and not need_pixels:
+            frame["shape"] = image_size(frame["path"])
+            return frame
+    frame["image"] = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if frame["image"] is None:
+        raise ValueError(f"Cannot decode image: {frame['path']}")
+    frame["shape"] = frame["image"].shape[:2]
+    return frame
+
+def lookup_frame(frame, cache=None, prefetch=True):
+    """Decoded (video) frames: just the cache key (pixel content) and lookup."""
+    frame["shape"] = frame["image"].shape[:2]
+    if cache is not None:
+        frame["key"] = cache.key_for(frame["image"])
+        if prefetch:
+            frame["dets"] = cache.get(frame["key"])
+    return frame
+
+def prof_iter(it, prof, stage):
+    """Time each next() of a frame source (video decoding happens there)."""
+    it = iter(it)
+    while True:
+        with prof.stage(stage):
+            f = next(it, None)
+        if f is None:
+            return
+        yield f
+
+def prof_call(fn, prof, stage):
+    def timed(frame):
+        with prof.stage(stage, frame.get("name", "")):
+            return fn(frame)
+    return timed
+
+def run(model_path, source, out_dir, conf=0.25, imgsz=960, do_heatmap=True, batch=1,
+        decode_workers=2, post_workers=2, queue_depth=8,
+        stride=1, max_fps=None, render="all", render_min_pri=0.0,
+        keyframe_every=1, scene_thr=0.3, tile=0, tile_overlap=0.2, tile_batch=8,
+        cache_dir=None, cache_max_mb=2048, save_detections=None, max_labels=None, overlay_scale=1.0,
+        backend="auto", threads=0, server=None, zones=None, sort="risk", sort_chunk_rows=200_000, top_k=100,
+        prof=NULL, detector=None, out_csv=None, verbose=True):
+    """
+    render: "all" writes overlay/heatmap images for every frame, "risk" only
+    for frames whose PRI >= render_min_pri, "none" writes metrics only,
+    "lazy" writes metrics + the detections store and leaves the images to
+    render_server.py, which renders them when the dashboard asks.
+    stride / max_fps thin out video sources (ignored for images).
+    keyframe_every > 1 runs the detector on every Nth frame (or on a scene
+    change beyond scene_thr) and propagates boxes with optical flow in between;
+    image folders are then processed in file-name order.
+    tile > 0 runs sliced inference on overlapping tile x tile windows
+    (tile_batch per predict call) merged with cross-tile NMS.
+    cache_dir enables the on-disk detection cache (see det_cache.py).
+    save_detections writes every frame's boxes to a columnar store
+    (see det_store.py) that offline_analytics.py can recompute metrics from.
+    max_labels caps the labelled boxes per overlay (highest scores first);
+    overlay_scale < 1 writes overlays and heatmaps at thumbnail resolution.
+    backend / threads pick the inference runtime (see detector.load_model);
+    static-shape .onnx exports ignore imgsz and run at their export size.
+    server: URL of a running infer_server.py to send frames to instead.
+    zones: a zones.py JSON config (or ZoneMap); the metrics are then also
+    computed per zone into zone_metrics.csv (one row per frame and zone).
+    metrics.csv is streamed with one count_ column per model class (see
+    metrics_writer.py): sort="risk" ranks it by PRI, then CI, spilling
+    sorted runs of sort_chunk_rows rows to disk and merging them, "none"
+    keeps frames in input order; ties are in input order too. The top_k riskiest frames also go to
+    top_risk.csv (0 = skip).
+    prof: a profiling.Profiler to record per-frame stage times (default: off).
+    A folder is read in name order; source may also be a list of image paths,
+    taken in the order given; detector (detect, names) reuses
+    an already loaded model; out_csv overrides <out_dir>/metrics.csv
+    (run_sharded uses all three). Returns the number of frames analyzed.
+    """
     ensure_dir(out_dir)
-    over_dir = os.path.join(out_dir, "overlays"); ensure_dir(over_dir)
-    hm_dir   = os.path.join(out_dir, "heatmaps"); ensure_dir(hm_dir)
+    over_dir = os.path.join(out_dir, "overlays")
+    hm_dir   = os.path.join(out_dir, "heatmaps")
+    eager = render in ("all", "risk")
+    if eager:
+        ensure_dir(over_dir); ensure_dir(hm_dir)
+    if render == "lazy" and not save_detections:
+        save_detections = os.path.join(out_dir, "detections.npz")
+
+    detect, names = detector or load_detector(model_path, backend, threads, server, conf=conf, imgsz=imgsz,
+                                              tile=tile, tile_overlap=tile_overlap, tile_batch=tile_batch)
+    renderer = OverlayRenderer(names, max_labels=max_labels, scale=overlay_scale)
+    zone_map = load_zones(zones)
+    cache = None
+    if cache_dir:
+        model_key = getattr(getattr(detect, "model", None), "model_id", model_path)  # the RemoteModel detect already talks to
+        cache = DetectionCache(cache_dir, model_key, max_bytes=cache_max_mb * 2**20, conf=conf,
+                               imgsz=imgsz, tile=tile, tile_overlap=tile_overlap)
+    need_pixels = eager or keyframe_every > 1
+    prefetch = keyframe_every <= 1  # keyframe mode only looks up frames it detects on
 
-    m = YOLO(model_path)
-    # names can be dict (id->name) or list
-    if isinstance(m.names, dict):
-        names = {int(i): n for i, n in m.names.items()}
+    # collect frames: video frames arrive decoded, stills are decoded in the pipeline
+    video = isinstance(source, str) and is_video(source)
+    if video:
+        frames = iter_video_frames(source, stride=stride, max_fps=max_fps)
+        decode = partial(lookup_frame, cache=cache, prefetch=prefetch)
     else:
-        names = {i: n for i, n in enumerate(VISDRONE_NAMES)}
+        images = list_image_paths(source) if isinstance(source, str) else list(source)
+        order = shape_order(images) if batch > 1 and keyframe_every <= 1 else range(len(images))
+        frames = ({"index": i, "path": images[i], "name": os.path.basename(images[i])} for i in order)
+        decode = partial(decode_frame, cache=cache, need_pixels=need_pixels, prefetch=prefetch)
 
-    # collect images
-    if os.path.isdir(source):
-        images = [p for p in glob.glob(os.path.join(source, "*"))
-                  if p.lower().endswith((".jpg", ".jpeg", ".png", ".bmp"))]
+    if prof.enabled:
+        if video:
+            frames = prof_iter(frames, prof, "video_read")
+        decode = prof_call(decode, prof, "decode")
+
+    # --- predict (inference stage, one call per batch; cache hits skip the model) ---
+    def detect_frames(batch_frames):
+        if cache is not None and not prefetch:
+            for f in batch_frames:
+                f["dets"] = cache.get(f["key"])
+        todo = [f for f in batch_frames if f.get("dets") is None]
+        if todo:
+            with prof.stage("infer", f"{todo[0]['name']}+{len(todo) - 1}"):
+                dets = detect([f["image"] for f in todo])
+            for f, d in zip(todo, dets):
+                f["dets"] = d
+                if cache is not None:
+                    cache.put(f["key"], d)
+        return [f.pop("dets") for f in batch_frames]
+
+    if keyframe_every > 1:
+        kf = KeyframeDetector(None, every=keyframe_every, scene_thr=scene_thr)
+        def infer(batch_frames):
+            by_id = {id(f["image"]): f for f in batch_frames}
+            kf.detect = lambda ims: detect_frames([by_id[id(im)] for im in ims])
+            dets, flags = kf([f["image"] for f in batch_frames])
+            for f, key in zip(batch_frames, flags):
+                f["keyframe"] = int(key)
+                f.pop("dets", None)
+            return dets
     else:
-        images = [source]
-
-    rows = []  # for CSV
-    for ip in images:
-        # --- predict ---
-        res = m.predict(source=ip, conf=conf, imgsz=imgsz, save=False, verbose=False)[0]
-        H, W = res.orig_shape
-        if res.boxes is not None and len(res.boxes) > 0:
-            boxes  = res.boxes.xyxy.cpu().numpy()
-            clses  = res.boxes.cls.cpu().numpy().astype(int)
-            scores = res.boxes.conf.cpu().numpy()
-        else:
-            boxes  = np.zeros((0, 4), np.float32)
-            clses  = np.zeros((0,), int)
-            scores = np.zeros((0,), np.float32)
-
-        # --- overlay image ---
-        img = Image.open(ip).convert("RGB")
-        overlay = draw_overlay(img, boxes, clses, scores, names)
-        base = os.path.basename(ip)
-        overlay.save(os.path.join(over_dir, base))
-
-        # --- per-class counts ---
-        cnt_ids = Counter(clses.tolist())
-        counts = {names.get(k, str(k)): int(v) for k, v in cnt_ids.items()}
-
-        # --- density heatmap (all detections) ---
-        centers = [center_of(b) for b in boxes]
-        if do_heatmap:
-            hm = heatmap_from_points(H, W, centers, sigma=max(8, int(0.015 * max(H, W))))
-            rgba = colorize_heatmap(hm)
-            bg = np.array(img.convert("RGBA"))
-            blend = bg.copy()
-            alpha = rgba[..., 3:4].astype(np.float32) / 255.0
-            blend[..., :3] = (alpha * rgba[..., :3] + (1 - alpha) * blend[..., :3]).astype(np.uint8)
-
-            # ✅ Save as PNG to support RGBA (no JPEG alpha error)
-            hm_out = Path(hm_dir) / (Path(base).stem + "_heatmap.png")
-            Image.fromarray(blend, mode="RGBA").save(hm_out)
+        infer = detect_frames
+
+    # --- metrics + overlay / heatmap images (postprocess stage) ---
+    def post(frame, dets):
+        boxes, clses, scores = dets
+        arr = frame.pop("image", None)
+        H, W = frame["shape"]
+        row = {"image": frame["name"]}
+        if video:
+            row["frame_index"] = frame["frame_index"]
+            row["timestamp_s"] = frame["timestamp_s"]
+        if "keyframe" in frame:
+            row["keyframe"] = frame["keyframe"]
+        with prof.stage("metrics", frame["name"]):
+            row.update(frame_metrics(boxes, clses, H, W, names))
+        zrows = []
+        if zone_map is not None:
+            with prof.stage("zones", frame["name"]):
+                head = {k: row[k] for k in ("image", "frame_index", "timestamp_s") if k in row}
+                zrows = [dict(head, **z) for z in zone_map.frame_rows(
+                    boxes, clses, H, W, names, CI_WEIGHTS, VEHICLE_SET, PRI_THR_FRAC * math.hypot(W, H))]
+        if render == "all" or (render == "risk" and row["proximity_risk_index"] >= render_min_pri):
+            render_frame(arr, boxes, clses, scores, renderer, frame["name"], over_dir, hm_dir, do_heatmap, prof)
+        prof.mark(frame["name"])
+        return frame["index"], (row, zrows), (frame.get("path", ""), H, W, dets)
 
-        # --- metrics ---
-        # Congestion Index: sum(weights per detection)
-        ci = 0.0
-        for cls in clses.tolist():
-            nm = names.get(int(cls), "others")
-            ci += CI_WEIGHTS.get(nm, 1.0)
-
-        # Proximity Risk Index: vehicles close to pedestrians in a single frame
-        veh_centers = [center_of(b) for b, c in zip(boxes, clses) if names.get(int(c), "") in VEHICLE_SET]
-        ped_centers = [center_of(b) for b, c in zip(boxes, clses) if names.get(int(c), "") in {"pedestrian", "people"}]
-        diag = math.hypot(W, H)
-        thr = 0.08 * diag  # ~8% of diagonal; tune for your data
-        pri = 0.0
-        min_dists = []
-        if veh_centers and ped_centers:
-            vc = np.array(veh_centers); pc = np.array(ped_centers)
-            for p in pc:
-                d = np.sqrt(((vc - p) ** 2).sum(axis=1)).min()
-                min_dists.append(d)
-                pri += max(0.0, (thr - d) / thr)  # closer => higher risk
-
-        # Occupancy (sum of bbox area / image area)
-        areas = ((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])).clip(min=0)
-        occupancy = float(areas.sum() / (W * H + 1e-6))
-
-        row = {
-            "image": base,
-            "congestion_index": round(ci, 3),
-            "proximity_risk_index": round(pri, 3),
-            "occupancy_frac": round(occupancy, 4),
-            "total_detections": int(len(boxes)),
-        }
-        # attach per-class counts (columns like count_car, count_pedestrian, ...)
-        for n, v in counts.items():
-            row[f"count_{n}"] = v
-
-        # extras: average min distance ped→vehicle (pixels)
-        row["avg_min_ped_vehicle_px"] = round(float(np.mean(min_dists)) if min_dists else 0.0, 2)
-        rows.append(row)
-
-    # write CSV sorted by risk/CI
-    df = pd.DataFrame(rows).fillna(0)
-    if not df.empty:
-        df = df.sort_values(["proximity_risk_index", "congestion_index"], ascending=False)
     ensure_dir(out_dir)
-    out_csv = os.path.join(out_dir, "metrics.csv")
-    df.to_csv(out_csv, index=False)
+    out_csv = out_csv or os.path.join(out_dir, "metrics.csv")
+    metrics_out = MetricsWriter(out_csv, metrics_columns(names, video, keyframe_every > 1), sort=sort,
+                                chunk_rows=sort_chunk_rows, top_k=top_k)
+    zones_out = RowWriter(zone_csv_path(out_csv), zone_columns(names, video)) if zone_map is not None else None
+    writer = None
+    if save_detections:
+        writer = DetectionWriter(save_detections, names,
+                                 meta={"source": source if isinstance(source, str) else "", "model": model_path, "conf": conf, "imgsz": imgsz,
+                                       "tile": tile, "keyframe_every": keyframe_every})
+    t0 = time.perf_counter()
+    for idx, (row, zrows), (path, H, W, dets) in run_staged(frames, decode, infer, post, batch=batch,
+                                                   batch_key=lambda f: f["shape"],
+                                                   decode_workers=decode_workers, post_workers=post_workers,
+                                                   queue_depth=queue_depth):
+        metrics_out.add(row, idx)  # idx: input position, so batched runs write what per-image runs do
+        if zones_out is not None:
+            zones_out.add(zrows, idx)
+        if writer is not None:
+            writer.add(row["image"], H, W, *dets, path=path,
+                       frame_index=row.get("frame_index", -1), timestamp_s=row.get("timestamp_s", float("nan")))
+    elapsed = time.perf_counter() - t0
+    n_frames = metrics_out.rows
+    metrics_out.close()  # sort="risk": ranked by PRI, then CI
+    if zones_out is not None:
+        zones_out.close()
+    top_csv = None
+    if top_k:
+        top_csv = os.path.join(os.path.dirname(out_csv), "top_risk.csv")
+        write_rows(top_csv, metrics_out.columns, metrics_out.top_rows())
+    if writer is not None:
+        writer.close()
+    if not verbose:
+        return n_frames
     print(f"✅ Wrote metrics: {out_csv}")
-    print(f"📂 Overlays: {over_dir}")
-    if do_heatmap:
+    if top_csv:
+        print(f"📊 Top {min(top_k, n_frames)} riskiest frames: {top_csv}")
+    if zone_map is not None:
+        print(f"🗺️ Zone metrics ({len(zone_map.names)} zones): {zone_csv_path(out_csv)}")
+    if eager:
+        print(f"📂 Overlays: {over_dir}")
+    if do_heatmap and eager:
         print(f"🔥 Heatmaps: {hm_dir}")
+    if writer is not None:
+        print(f"🗄️ Detections: {writer.path}")
+    if render == "lazy":
+        print(f"🌐 Overlays/heatmaps on demand: python src/render_server.py --out {out_dir}")
+    fps = n_frames / elapsed if elapsed > 0 else 0.0
+    if cache is not None:
+        print(cache.report())
+    print(f"⏱️ {n_frames} frames in {elapsed:.1f}s → {fps:.2f} frames/s (batch={batch})")
+    return n_frames
 
-if __name__ == "__main__":
+# --- multi-process mode: one model per worker process, image list split into shards ---
+_WORKER = {}
+
+def _init_worker(model_path, backend, threads, det_kw):
+    import cv2
+    cv2.setNumThreads(threads)
+    if not det_kw.get("server"):
+        import torch
+        torch.set_num_threads(threads)
+    _WORKER["detector"] = load_detector(model_path, backend, threads, **det_kw)
+
+def _run_shard(model_path, paths, out_dir, shard_csv, shard_store, kw):
+    t0 = time.perf_counter()
+    n = run(model_path, paths, out_dir, detector=_WORKER["detector"], out_csv=shard_csv,
+            save_detections=shard_store, verbose=False, **kw)
+    return n, time.perf_counter() - t0
+
+def merge_metrics(csvs, out_csv, sort="risk"):
+    """
+    Stream shard CSVs (same header) into out_csv. With sort="risk" each shard
+    is already ranked (ties in input order), so a k-way merge ranks the whole
+    run by PRI, CI; ties stay in shard order, then input order within a
+    shard, i.e. by image name. Returns the number of rows.
+    """
+    if not csvs:
+        open(out_csv, "w").close()
+        return 0
+    if sort == "none":
+        return concat_csvs(csvs, out_csv)
+    with open(csvs[0], newline="") as f:
+        header = next(csv.reader(f))
+    return merge_sorted_csvs(csvs, out_csv, header)
+
+def run_sharded(model_path, source, out_dir, workers, threads=0, retries=2, backend="auto", server=None,
+                conf=0.25, imgsz=960, tile=0, tile_overlap=0.2, tile_batch=8,
+                save_detections=None, render="all", top_k=100, **kw):
+    """
+    run() over an image folder with `workers` processes. Images are sorted
+    by name and cut into contiguous shards (4 per worker, for balance); each
+    process loads the model once with `threads` intra-op threads (0 = cores
+    / workers) and analyzes whole shards into _shards/. A failed shard is
+    retried up to `retries` times in a fresh pool; shards that still fail
+    are listed in failed_shards.json and left out of metrics.csv, which is
+    merged from the rest in a fixed order (merge_metrics); top_risk.csv is
+    taken from the merged file.
+    """
+    images = list_image_paths(source)
+    if not images:
+        raise FileNotFoundError(f"No images found in {source}")
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    n_shards = min(len(images), workers * 4)
+    shards = [images[i * len(images) // n_shards:(i + 1) * len(images) // n_shards] for i in range(n_shards)]
+    shard_dir = os.path.join(out_dir, "_shards")
+    ensure_dir(shard_dir)
+    if render == "lazy" and not save_detections:
+        save_detections = os.path.join(out_dir, "detections.npz")
+    csv_of = lambda i: os.path.join(shard_dir, f"shard_{i:04d}.csv")
+    store_of = lambda i: os.path.join(shard_dir, f"shard_{i:04d}.npz") if save_detections else None
+    det_kw = dict(conf=conf, imgsz=imgsz, tile=tile, tile_overlap=tile_overlap, tile_batch=tile_batch, server=server)
+    kw = dict(kw, conf=conf, imgsz=imgsz, tile=tile, render=render, server=server, top_k=0)
+
+    print(f"🔀 {len(images)} images → {n_shards} shards on {workers} workers ({threads} threads each)")
+    t0 = time.perf_counter()
+    pending, tries, failed, done_frames = list(range(n_shards)), Counter(), {}, 0
+    while pending:
+        # a crashed worker breaks the whole pool, so every retry round gets a fresh one
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(model_path, backend, threads, det_kw)) as ex:
+            futs = {ex.submit(_run_shard, model_path, shards[i], out_dir, csv_of(i), store_of(i), kw): i
+                    for i in pending}
+            pending = []
+            for fut in as_completed(futs):
+                i = futs[fut]
+                try:
+                    n, secs = fut.result()
+                except Exception as e:
+                    tries[i] += 1
+                    if tries[i] <= retries:
+                        pending.append(i)
+                        print(f"⚠️ shard {i} failed ({type(e).__name__}: {e}); retry {tries[i]}/{retries}")
+                    else:
+                        failed[i] = f"{type(e).__name__}: {e}"
+                        print(f"❌ shard {i} failed after {retries} retries; skipped ({len(shards[i])} images)")
+                    continue
+                done_frames += n
+                rate = done_frames / (time.perf_counter() - t0)
+                print(f"… shard {i} done ({n} frames, {secs:.1f}s); {done_frames}/{len(images)} images "
+                      f"({rate:.2f} img/s)")
+        pending.sort()
+    elapsed = time.perf_counter() - t0
+
+    ok = [i for i in range(n_shards) if i not in failed]
+    out_csv = os.path.join(out_dir, "metrics.csv")
+    n_rows = merge_metrics([csv_of(i) for i in ok], out_csv, kw.get("sort", "risk"))
+    print(f"✅ Wrote metrics: {out_csv} ({n_rows} frames from {len(ok)}/{n_shards} shards)")
+    if top_k and ok:
+        top_csv = os.path.join(out_dir, "top_risk.csv")
+        write_rows(top_csv, *top_k_rows(out_csv, top_k))
+        print(f"📊 Top {min(top_k, n_rows)} riskiest frames: {top_csv}")
+    if kw.get("zones") and ok:
+        # shards are contiguous runs of the sorted image list
+        concat_csvs([zone_csv_path(csv_of(i)) for i in ok], zone_csv_path(out_csv))
+        print(f"🗺️ Zone metrics: {zone_csv_path(out_csv)}")
+    if save_detections and ok:
+        meta = {"source": source, "model": model_path, "conf": conf, "imgsz": imgsz, "tile": tile,
+                "keyframe_every": kw.get("keyframe_every", 1)}
+        print(f"🗄️ Detections: {merge_detections([store_of(i) for i in ok], save_detections, meta=meta)}")
+    if failed:
+        with open(os.path.join(out_dir, "failed_shards.json"), "w") as f:
+            json.dump({str(i): {"error": failed[i], "images": shards[i]} for i in sorted(failed)}, f, indent=2)
+        print(f"⚠️ {len(failed)} shard(s) failed; see {os.path.join(out_dir, 'failed_shards.json')}")
+    else:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    if render == "lazy":
+        print(f"🌐 Overlays/heatmaps on demand: python src/render_server.py --out {out_dir}")
+    fps = done_frames / elapsed if elapsed > 0 else 0.0
+    print(f"⏱️ {done_frames} frames in {elapsed:.1f}s → {fps:.2f} frames/s ({workers} workers)")
+    return done_frames
+
+def main(argv=None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--model", default="runs/detect/train/weights/best.pt",
                     help="Path to .pt weights (use yolov8n.pt to sanity-check pipeline)")
-    ap.add_argument("--source", required=True, help="Folder of images OR a single image path")
+    ap.add_argument("--source", required=True, help="Folder of images, a single image, OR a video file")
     ap.add_argument("--out", default="outputs/analytics")
     ap.add_argument("--conf", type=float, default=0.25)
     ap.add_argument("--imgsz", type=int, default=960)
     ap.add_argument("--no-heatmap", action="store_true")
-    a = ap.parse_args()
-    run(a.model, a.source, a.out, a.conf, a.imgsz, do_heatmap=not a.no_heatmap)
+    ap.add_argument("--batch", type=int, default=1,
+                    help="Images per predict() call (same-shape images are batched together)")
+    ap.add_argument("--decode-workers", type=int, default=2, help="Threads decoding images ahead of the model")
+    ap.add_argument("--post-workers", type=int, default=2, help="Threads drawing overlays/heatmaps and writing PNGs")
+    ap.add_argument("--queue-depth", type=int, default=8,
+                    help="Max frames waiting between stages (bounds memory)")
+    ap.add_argument("--stride", type=int, default=1, help="Video: analyze every Nth frame")
+    ap.add_argument("--max-fps", type=float, default=None, help="Video: analyze at most this many frames per second")
+    ap.add_argument("--render", choices=["all", "risk", "none", "lazy"], default="all",
+                    help="Write overlays/heatmaps for all frames, only risky ones (--render-min-pri), none, "
+                         "or lazy (metrics + detections only; images rendered on request by render_server.py)")
+    ap.add_argument("--render-min-pri", type=float, default=1.0,
+                    help="With --render risk: minimum proximity_risk_index to render a frame")
+    ap.add_argument("--keyframe-every", type=int, default=1,
+                    help="Detect on every Nth frame only; propagate boxes with optical flow in between")
+    ap.add_argument("--scene-thr", type=float, default=0.3,
+                    help="Histogram distance (0..1) that forces a keyframe on a scene change")
+    ap.add_argument("--tile", type=int, default=0,
+                    help="Sliced inference: tile size in pixels for very large frames (0 = whole frame)")
+    ap.add_argument("--tile-overlap", type=float, default=0.2, help="Fractional overlap between tiles")
+    ap.add_argument("--tile-batch", type=int, default=8, help="Tiles per predict() call")
+    ap.add_argument("--max-labels", type=int, default=None,
+                    help="Label at most N boxes per overlay (highest scores); boxes are always drawn")
+    ap.add_argument("--overlay-scale", type=float, default=1.0,
+                    help="Write overlays/heatmaps at this fraction of the frame size (e.g. 0.5 for thumbnails)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Image folders: analyze shards in N processes, one model each (0 = all cores)")
+    ap.add_argument("--retries", type=int, default=2, help="With --workers: re-runs of a failed shard")
+    ap.add_argument("--sort", choices=["risk", "none"], default="risk",
+                    help="metrics.csv order: by PRI then CI (external merge sort), or input order")
+    ap.add_argument("--sort-chunk-rows", type=int, default=200_000,
+                    help="Rows sorted in memory before a sorted run is spilled to disk")
+    ap.add_argument("--top-k", type=int, default=100, help="Riskiest frames written to top_risk.csv (0 = off)")
+    ap.add_argument("--zones", default=None,
+                    help="Zone polygons (JSON, see zones.py): also write per-zone metrics to zone_metrics.csv")
+    add_backend_args(ap)
+    add_cache_args(ap)
+    add_profile_args(ap)
+    ap.add_argument("--save-detections", default=None,
+                    help="Also write all detections to this .npz store (re-analyze with offline_analytics.py)")
+    a = ap.parse_args(argv)
+    workers = a.workers or os.cpu_count() or 1
+    if workers > 1 and not is_video(a.source):
+        if a.profile:
+            print("⚠️ --profile is not collected from worker processes; run with --workers 1 to profile.")
+        run_sharded(a.model, a.source, a.out, workers, a.threads, a.retries, a.backend, a.server,
+                    conf=a.conf, imgsz=a.imgsz, tile=a.tile, tile_overlap=a.tile_overlap, tile_batch=a.tile_batch,
+                    save_detections=a.save_detections, render=a.render,
+                    do_heatmap=not a.no_heatmap, batch=a.batch,
+                    decode_workers=a.decode_workers, post_workers=a.post_workers, queue_depth=a.queue_depth,
+                    render_min_pri=a.render_min_pri, keyframe_every=a.keyframe_every, scene_thr=a.scene_thr,
+                    cache_dir=a.cache_dir, cache_max_mb=a.cache_max_mb,
+                    max_labels=a.max_labels, overlay_scale=a.overlay_scale, zones=a.zones,
+                    sort=a.sort, sort_chunk_rows=a.sort_chunk_rows, top_k=a.top_k)
+        return
+    prof = open_profiler(a)
+    run(a.model, a.source, a.out, a.conf, a.imgsz, do_heatmap=not a.no_heatmap, batch=a.batch,
+        decode_workers=a.decode_workers, post_workers=a.post_workers, queue_depth=a.queue_depth,
+        stride=a.stride, max_fps=a.max_fps, render=a.render, render_min_pri=a.render_min_pri,
+        keyframe_every=a.keyframe_every, scene_thr=a.scene_thr,
+        tile=a.tile, tile_overlap=a.tile_overlap, tile_batch=a.tile_batch,
+        cache_dir=a.cache_dir, cache_max_mb=a.cache_max_mb, save_detections=a.save_detections,
+        max_labels=a.max_labels, overlay_scale=a.overlay_scale,
+        backend=a.backend, threads=a.threads, server=a.server, zones=a.zones,
+        sort=a.sort, sort_chunk_rows=a.sort_chunk_rows, top_k=a.top_k, prof=prof)
+    finish_profile(prof, a, a.out)
+
+if __name__ == "__main__":
+    main()
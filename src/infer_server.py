@@ -0,0 +1,270 @@
+# src/infer_server.py
+# Long-lived localhost detection service: the model stays loaded, concurrent requests are batched.
+import argparse, hashlib, http.client, io, json, os, queue, threading, time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import numpy as np
+
+from det_cache import sha1_file
+from detector import add_backend_args, class_names, load_model, make_detector, resolve_backend
+
+class _Item:
+    __slots__ = ("image", "t_in", "result", "error", "done")
+
+    def __init__(self, image):
+        self.image, self.t_in = image, time.perf_counter()
+        self.result = self.error = None
+        self.done = threading.Event()
+
+class Batcher:
+    """
+    One thread owns the model. Images queued by any number of request threads
+    are run together: a batch closes at max_batch images or max_wait_ms after
+    its first image arrived, whichever comes first. Each batch goes to the
+    model as one call per image shape.
+    """
+
+    def __init__(self, detect, max_batch=16, max_wait_ms=5.0, window=10000):
+        self.detect = detect
+        self.max_batch, self.max_wait = max_batch, max_wait_ms / 1000.0
+        self.q = queue.Queue()
+        self.waits, self.totals = deque(maxlen=window), deque(maxlen=window)   # per image, s
+        self.infer = deque(maxlen=window)                                      # per batch, s
+        self.batches = self.images = self.errors = self.in_flight = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop, name="batcher", daemon=True).start()
+
+    def submit(self, images):
+        """Blocks until every image has been through the model; -> [(boxes, classes, scores), ...]."""
+        items = [_Item(im) for im in images]
+        for it in items:
+            self.q.put(it)
+        for it in items:
+            it.done.wait()
+        for it in items:
+            if it.error is not None:
+                raise it.error
+        return [it.result for it in items]
+
+    def _loop(self):
+        while True:
+            items = [self.q.get()]
+            deadline = items[0].t_in + self.max_wait
+            while len(items) < self.max_batch:
+                left = deadline - time.perf_counter()
+                try:
+                    items.append(self.q.get(timeout=left) if left > 0 else self.q.get_nowait())
+                except queue.Empty:
+                    break
+            t0 = time.perf_counter()
+            with self._lock:
+                self.in_flight = len(items)
+            # one model call per image shape: Ultralytics pads a mixed-shape batch differently from
+            # single images, so a frame's boxes must not depend on what else was queued
+            groups = {}
+            for it in items:
+                groups.setdefault(it.image.shape, []).append(it)
+            errors = 0
+            for group in groups.values():
+                try:
+                    dets = self.detect([it.image for it in group])
+                    err = None
+                except Exception as e:
+                    dets, err = [None] * len(group), e
+                    errors += 1
+                for it, d in zip(group, dets):
+                    it.result, it.error = d, err
+            t1 = time.perf_counter()
+            with self._lock:
+                self.in_flight = 0
+                self.batches += len(groups)
+                self.images += len(items)
+                self.errors += errors
+                self.infer.append(t1 - t0)
+                for it in items:
+                    self.waits.append(t0 - it.t_in)
+                    self.totals.append(t1 - it.t_in)
+            for it in items:
+                it.done.set()
+
+    def stats(self):
+        def pct(xs):
+            if not xs:
+                return {}
+            ms = np.array(xs) * 1000.0
+            return {k: round(float(v), 3) for k, v in zip(("p50", "p95", "p99", "max"),
+                                                           np.percentile(ms, [50, 95, 99, 100]))}
+        with self._lock:
+            return {"queue_depth": self.q.qsize(), "in_flight": self.in_flight,
+                    "batches": self.batches, "images": self.images, "errors": self.errors,
+                    "mean_batch": round(self.images / self.batches, 3) if self.batches else 0.0,
+                    "uptime_s": round(time.time() - self.started, 1),
+                    "latency_ms": {"queue_wait": pct(list(self.waits)), "total": pct(list(self.totals)),
+                                   "batch_infer": pct(list(self.infer))}}
+
+def _results_json(dets, conf):
+    out = []
+    for boxes, clses, scores in dets:
+        keep = scores >= conf
+        out.append({"boxes": np.asarray(boxes)[keep].tolist(), "classes": np.asarray(clses)[keep].tolist(),
+                    "scores": np.asarray(scores)[keep].tolist()})
+    return out
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    POST /detect  JSON {"paths": [...]} (files read by the server) or an .npz
+                  of BGR uint8 arrays; ?conf= filters above the server's conf.
+    GET  /info    model id, class names, conf, imgsz.
+    GET  /stats   queue depth, batch sizes, latency percentiles.
+    """
+
+    batcher = info = None
+    protocol_version = "HTTP/1.1"  # keep-alive for the client's persistent connection
+
+    def _send(self, code, obj):
+        data = json.dumps(obj, separators=(",", ":")).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self._send(200, self.batcher.stats())
+        elif path == "/info":
+            self._send(200, self.info)
+        else:
+            self._send(404, {"error": "unknown endpoint"})
+
+    def do_POST(self):
+        import cv2
+        url = urlparse(self.path)
+        if url.path != "/detect":
+            self._send(404, {"error": "unknown endpoint"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        conf = float(parse_qs(url.query).get("conf", [0.0])[0])
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                paths = json.loads(body)["paths"]
+                images = [cv2.imread(p) for p in paths]
+                bad = [p for p, im in zip(paths, images) if im is None]
+                if bad:
+                    self._send(400, {"error": f"unreadable image(s): {bad[:5]}"})
+                    return
+            else:
+                with np.load(io.BytesIO(body), allow_pickle=False) as z:
+                    images = [z[k] for k in sorted(z.files, key=lambda k: int(k.split("_")[1]))]
+        except Exception as e:
+            self._send(400, {"error": f"bad request: {e}"})
+            return
+        try:
+            self._send(200, {"results": _results_json(self.batcher.submit(images), conf)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, fmt, *args):
+        pass
+
+class RemoteModel:
+    """
+    Client for a running infer_server: detect(srcs, conf) like OnnxModel, so
+    make_detector() (tiling included) works on top of it. Paths are sent as
+    paths (the server reads them); arrays go as an .npz. imgsz is the
+    server's; any other value is rejected.
+    """
+
+    def __init__(self, url, timeout=300):
+        u = urlparse(url if "://" in url else "http://" + url)
+        self.host, self.port, self.timeout = u.hostname, u.port or 80, timeout
+        self._local = threading.local()
+        self.info = self._request("GET", "/info")
+        self.names = {int(k): v for k, v in self.info["names"].items()}
+        self.model_id = self.info["model_id"]
+        self.min_conf = float(self.info.get("conf", 0.0))
+
+    def _request(self, method, path, body=None, ctype=None):
+        for attempt in (0, 1):  # one reconnect if the kept-alive connection went away
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request(method, path, body=body, headers={"Content-Type": ctype} if ctype else {})
+                resp = conn.getresponse()
+                data = json.loads(resp.read())
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+                continue
+            if resp.status != 200:
+                raise RuntimeError(f"infer_server {path}: {resp.status} {data.get('error', '')}")
+            return data
+
+    def check_imgsz(self, imgsz):
+        """The server runs every request at its own imgsz; refuse a client asking for another."""
+        if imgsz is not None and int(imgsz) != int(self.info["imgsz"]):
+            raise ValueError(f"infer_server at {self.host}:{self.port} runs at imgsz {self.info['imgsz']}, not {imgsz}; "
+                             f"pass --imgsz {self.info['imgsz']} or restart the server with --imgsz {imgsz}")
+
+    def detect(self, srcs, conf=0.25, imgsz=None):
+        import cv2
+        self.check_imgsz(imgsz)
+        if conf < self.min_conf:
+            conf = self.min_conf  # the server already dropped everything below its own conf
+        q = "/detect?" + urlencode({"conf": conf})
+        if all(isinstance(s, (str, os.PathLike)) for s in srcs):
+            res = self._request("POST", q, json.dumps({"paths": [os.path.abspath(s) for s in srcs]}),
+                                "application/json")
+        else:
+            buf = io.BytesIO()
+            np.savez(buf, *[cv2.imread(s) if isinstance(s, (str, os.PathLike)) else s for s in srcs])
+            res = self._request("POST", q, buf.getvalue(), "application/x-npz")
+        return [(np.asarray(r["boxes"], np.float32).reshape(-1, 4), np.asarray(r["classes"], int),
+                 np.asarray(r["scores"], np.float32)) for r in res["results"]]
+
+    def stats(self):
+        return self._request("GET", "/stats")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="runs/detect/train/weights/best.pt", help="Weights (.pt / .onnx / OpenVINO dir)")
+    ap.add_argument("--conf", type=float, default=0.05, help="Lowest conf any client can ask for")
+    ap.add_argument("--imgsz", type=int, default=960)
+    ap.add_argument("--max-batch", type=int, default=16, help="Images per model call at most")
+    ap.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits to fill up")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    add_backend_args(ap, client=False)
+    a = ap.parse_args(argv)
+
+    m = load_model(a.model, a.backend, a.threads)
+    detect = make_detector(m, conf=a.conf, imgsz=a.imgsz)
+    detect([np.zeros((a.imgsz, a.imgsz, 3), np.uint8)])  # warm-up: first call pays for lazy init
+    weights = sha1_file(a.model) if os.path.isfile(a.model) else os.path.abspath(a.model)
+    Handler.batcher = Batcher(detect, a.max_batch, a.max_wait_ms)
+    Handler.info = {"model": a.model, "backend": resolve_backend(a.model, a.backend), "conf": a.conf,
+                    "imgsz": a.imgsz, "names": {str(k): v for k, v in class_names(m).items()},
+                    # same weights + settings -> same id, so client-side detection caches stay valid
+                    "model_id": hashlib.sha1(f"{weights}|imgsz={a.imgsz}|conf={a.conf}".encode()).hexdigest()}
+    srv = ThreadingHTTPServer((a.host, a.port), Handler)
+    srv.daemon_threads = True
+    print(f"🌐 Serving {a.model} at http://{a.host}:{a.port}/ (max batch {a.max_batch}, "
+          f"wait {a.max_wait_ms:g} ms); GET /stats for queue depth + latency")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s = Handler.batcher.stats()
+        print(f"📊 {s['images']} images in {s['batches']} batches (mean {s['mean_batch']}), "
+              f"total latency {s['latency_ms']['total']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# src/keyframes.py
+# Run the detector on keyframes only; carry boxes forward with sparse optical flow.
+import numpy as np
+
+class KeyframeDetector:
+    """
+    Wraps detect(images) -> [(boxes, classes, scores), ...] for sequential frames.
+
+    A frame is a keyframe when `every` frames have passed since the last one,
+    or when its gray-level histogram differs from the last keyframe's by more
+    than `scene_thr` (Bhattacharyya distance, 0 = same, 1 = disjoint).
+    In-between frames reuse the previous frame's boxes, each shifted by the
+    Lucas-Kanade flow of its center on a downscaled gray image; centers that
+    fail to track move with the median flow of the ones that did.
+
+    Call it with consecutive frames, in order; state carries over between calls,
+    and the keyframes of one call are detected in a single batch.
+    """
+
+    def __init__(self, detect, every=5, scene_thr=0.3, flow_side=960):
+        self.detect = detect
+        self.every = max(1, int(every))
+        self.scene_thr = scene_thr
+        self.flow_side = flow_side
+        self._since_key = None   # frames since the last keyframe
+        self._key_hist = None
+        self._prev = None        # (gray, scale, boxes, classes, scores)
+
+    def _thumb(self, img):
+        import cv2
+        h, w = img.shape[:2]
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        s = min(1.0, self.flow_side / max(h, w))
+        if s < 1.0:
+            gray = cv2.resize(gray, (int(round(w * s)), int(round(h * s))), interpolation=cv2.INTER_AREA)
+        return gray, s
+
+    @staticmethod
+    def _hist(gray):
+        import cv2
+        h = cv2.calcHist([gray], [0], None, [64], [0, 256])
+        return cv2.normalize(h, h).flatten()
+
+    def _propagate(self, gray, s, shape):
+        import cv2
+        pgray, ps, boxes, clses, scores = self._prev
+        if len(boxes) == 0:
+            return boxes, clses, scores
+        if gray.shape != pgray.shape:  # resolution changed: nothing to track against
+            return boxes.copy(), clses, scores
+        ctr = ((boxes[:, :2] + boxes[:, 2:]) / 2.0 * ps).astype(np.float32).reshape(-1, 1, 2)
+        nxt, st, _ = cv2.calcOpticalFlowPyrLK(pgray, gray, ctr, None, winSize=(15, 15), maxLevel=2)
+        disp = ((nxt - ctr).reshape(-1, 2) / s).astype(np.float32)
+        ok = st.reshape(-1).astype(bool)
+        disp[~ok] = np.median(disp[ok], axis=0) if ok.any() else 0.0
+        H, W = shape[:2]
+        out = boxes + np.concatenate([disp, disp], axis=1)
+        out[:, [0, 2]] = out[:, [0, 2]].clip(0, W)
+        out[:, [1, 3]] = out[:, [1, 3]].clip(0, H)
+        return out.astype(boxes.dtype), clses, scores
+
+    def __call__(self, images):
+        """images: list of BGR frames -> (list of detections, list of keyframe flags)."""
+        import cv2
+        thumbs = [self._thumb(im) for im in images]
+        flags = []
+        for gray, _ in thumbs:
+            hist = self._hist(gray)
+            key = (self._since_key is None or self._since_key + 1 >= self.every or
+                   cv2.compareHist(self._key_hist, hist, cv2.HISTCMP_BHATTACHARYYA) > self.scene_thr)
+            if key:
+                self._since_key, self._key_hist = 0, hist
+            else:
+                self._since_key += 1
+            flags.append(key)
+
+        key_dets = iter(self.detect([im for im, k in zip(images, flags) if k]))
+        dets = []
+        for im, (gray, s), key in zip(images, thumbs, flags):
+            d = next(key_dets) if key else self._propagate(gray, s, im.shape)
+            self._prev = (gray, s) + tuple(d)
+            dets.append(d)
+        return dets, flags
@@ -9,7 +9,7 @@
   <!-- React + ReactDOM (CDN) -->
   <script crossorigin src="https://unpkg.com/react@18/umd/react.production.min.js"></script>
   <script crossorigin src="https://unpkg.com/react-dom@18/umd/react-dom.production.min.js"></script>
-  <!-- PapaParse for CSV -->
+  <!-- PapaParse for CSV (fallback when there is no report/ data from build_report_data.py) -->
   <script src="https://unpkg.com/papaparse@5.4.1/papaparse.min.js"></script>
   <!-- Chart.js -->
   <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>
@@ -52,6 +52,7 @@
       const params = new URLSearchParams(location.search);
       return {
         metricsPath: params.get("metrics") || "metrics.csv",
+        reportDir: params.get("report") || "report",
         overlaysDir: params.get("overlays") || "overlays",
         heatmapsDir: params.get("heatmaps") || "heatmaps",
       };
@@ -80,18 +81,24 @@
       );
     }
 
-    function ChartCard({ title, data, label }) {
+    // Pre-binned histogram {edges, counts} -> bar labels (bin centers) + counts
+    const histBars = h => ({
+      labels: h.counts.map((_, i) => ((h.edges[i] + h.edges[i+1]) / 2).toFixed(2)),
+      data: h.counts,
+    });
+
+    function ChartCard({ title, data, label, labels }) {
       const ref = useRef(null);
-      useChart(ref, [data], () => ({
+      useChart(ref, [data, labels], () => ({
         type: 'bar',
         data: {
-          labels: data.map((_, i) => i+1),
+          labels: labels || data.map((_, i) => i+1),
           datasets: [{ label, data }]
         },
         options: {
           responsive: true,
           plugins: { legend: { display: false }, title: { display: true, text: title } },
-          scales: { x: { ticks: { display: false }}}
+          scales: { x: { ticks: { display: !!labels }}}
         }
       }));
       return (
@@ -128,6 +135,10 @@
     function App() {
       const defaults = useQueryDefaults();
       const [metricsPath, setMetricsPath] = useState(defaults.metricsPath);
+      const [reportDir, setReportDir] = useState(defaults.reportDir);
+      const [summary, setSummary] = useState(null);   // report/summary.json, null = CSV fallback
+      const [pageRows, setPageRows] = useState([]);   // rows from the top/<sortBy>/ pages fetched so far
+      const pageCache = useRef(new Map());
       const [overlaysDir, setOverlaysDir] = useState(defaults.overlaysDir);
       const [heatmapsDir, setHeatmapsDir] = useState(defaults.heatmapsDir);
       const [sortBy, setSortBy] = useState("proximity_risk_index");
@@ -140,8 +151,48 @@
 
       const numericColumns = ["proximity_risk_index","congestion_index","occupancy_frac","total_detections"];
 
+      // Pre-aggregated report data first; the whole CSV only if there is none
+      useEffect(() => {
+        let cancelled = false;
+        setLoading(true); setError(""); pageCache.current = new Map();
+        fetch(`${reportDir}/summary.json`)
+          .then(r => r.ok ? r.json() : Promise.reject(new Error(r.status)))
+          .then(s => { if (!cancelled) { setSummary(s); setRows([]); setLoading(false); } })
+          .catch(() => { if (!cancelled) { setSummary(null); loadCsv(); } });
+        return () => { cancelled = true; };
+      // eslint-disable-next-line react-hooks/exhaustive-deps
+      }, [reportDir, metricsPath]);
+
+      const passes = r => toNum(r.proximity_risk_index) >= minPRI && toNum(r.congestion_index) >= minCI;
+
+      // Chunk mode: fetch pages of the current sort order until top N rows pass the filters
       useEffect(() => {
-        setLoading(true); setError("");
+        if (!summary) return;
+        let cancelled = false;
+        const nPages = summary.pages[sortBy] || 0;
+        const getPage = i => {
+          const key = `${sortBy}/${i}`;
+          if (!pageCache.current.has(key)) {
+            const name = String(i).padStart(4, "0");
+            pageCache.current.set(key, fetch(`${reportDir}/top/${sortBy}/page_${name}.json`).then(r => r.json()));
+          }
+          return pageCache.current.get(key);
+        };
+        (async () => {
+          setLoading(true);
+          const out = [];
+          for (let i = 0; i < nPages && out.length < topN; i++) {
+            const page = await getPage(i);
+            if (cancelled) return;
+            out.push(...page.filter(passes));
+          }
+          if (!cancelled) { setPageRows(out.slice(0, topN)); setLoading(false); }
+        })().catch(err => { if (!cancelled) { setError("Failed to load report page: " + err.message); setLoading(false); } });
+        return () => { cancelled = true; };
+      // eslint-disable-next-line react-hooks/exhaustive-deps
+      }, [summary, sortBy, minPRI, minCI, topN]);
+
+      function loadCsv() {
         Papa.parse(metricsPath, {
           download: true, header: true, dynamicTyping: true, skipEmptyLines: true,
           complete: (res) => {
@@ -161,15 +212,17 @@
             setRows([]); setLoading(false);
           }
         });
-      }, [metricsPath]);
+      }
 
       const filtered = useMemo(() => {
+        if (summary) return pageRows;
         let out = rows.filter(r => r.proximity_risk_index >= minPRI && r.congestion_index >= minCI);
         out.sort((a,b) => (b[sortBy] - a[sortBy]) || (b.congestion_index - a.congestion_index));
         return out.slice(0, topN);
-      }, [rows, sortBy, minPRI, minCI, topN]);
+      }, [rows, summary, pageRows, sortBy, minPRI, minCI, topN]);
 
       const kpi = useMemo(() => {
+        if (summary) return summary.kpi;
         const n = rows.length;
         const mean = (k) => n ? rows.reduce((s,r)=>s+toNum(r[k]),0)/n : 0;
         return {
@@ -178,7 +231,13 @@
           meanCI:  mean("congestion_index"),
           meanOcc: mean("occupancy_frac"),
         };
-      }, [rows]);
+      }, [rows, summary]);
+
+      const charts = useMemo(() => {
+        const keys = [["proximity_risk_index","PRI"], ["congestion_index","CI"], ["occupancy_frac","Occ"]];
+        return Object.fromEntries(keys.map(([k, lab]) => [lab,
+          summary ? histBars(summary.hist[k]) : { labels: null, data: rows.map(r => toNum(r[k])) }]));
+      }, [rows, summary]);
 
       return (
         <div className="space-y-6">
@@ -195,6 +254,9 @@
             <label className="text-sm">metrics.csv path
               <input className="inp mt-1" value={metricsPath} onChange={e=>setMetricsPath(e.target.value)} />
             </label>
+            <label className="text-sm">report dir
+              <input className="inp mt-1" value={reportDir} onChange={e=>setReportDir(e.target.value)} />
+            </label>
             <label className="text-sm">overlays dir
               <input className="inp mt-1" value={overlaysDir} onChange={e=>setOverlaysDir(e.target.value)} />
             </label>
@@ -234,9 +296,9 @@
 
           <!-- Charts -->
           <div className="grid grid-cols-1 md:grid-cols-3 gap-3">
-            <ChartCard title="PRI distribution" data={rows.map(r=>toNum(r.proximity_risk_index))} label="PRI"/>
-            <ChartCard title="CI distribution"  data={rows.map(r=>toNum(r.congestion_index))}     label="CI"/>
-            <ChartCard title="Occupancy"        data={rows.map(r=>toNum(r.occupancy_frac))}      label="Occ"/>
+            <ChartCard title="PRI distribution" data={charts.PRI.data} labels={charts.PRI.labels} label="PRI"/>
+            <ChartCard title="CI distribution"  data={charts.CI.data}  labels={charts.CI.labels}  label="CI"/>
+            <ChartCard title="Occupancy"        data={charts.Occ.data} labels={charts.Occ.labels} label="Occ"/>
           </div>
 
           <!-- List -->
@@ -264,6 +326,7 @@
 
           <footer className="muted text-xs text-center py-6">
             Tip: add <code>?metrics=outputs/analytics/metrics.csv&overlays=outputs/analytics/overlays&heatmaps=outputs/analytics/heatmaps</code> to the URL.
+            Run <code>python src/build_report_data.py --metrics outputs/analytics/metrics.csv</code> first so large runs load as pre-aggregated <code>report/</code> chunks instead of the whole CSV.
           </footer>
         </div>
       );
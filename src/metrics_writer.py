@@ -0,0 +1,221 @@
+# src/metrics_writer.py
+# Streaming metrics.csv: fixed column schema, top-K riskiest frames on a heap, external merge sort by risk.
+import csv, heapq, itertools, os, shutil, tempfile
+
+RANK_COLS = ("proximity_risk_index", "congestion_index")  # ranked descending
+
+def metrics_columns(names, video=False, keyframe=False):
+    """metrics.csv header for a model: every class gets a count_ column, whether or not it was seen."""
+    cols = ["image"]
+    if video:
+        cols += ["frame_index", "timestamp_s"]
+    if keyframe:
+        cols.append("keyframe")
+    cols += ["congestion_index", "proximity_risk_index", "occupancy_frac", "total_detections"]
+    cols += [f"count_{names[k]}" for k in sorted(names)]
+    cols.append("avg_min_ped_vehicle_px")
+    return cols
+
+def zone_columns(names, video=False):
+    """zone_metrics.csv header (long format, one row per frame and zone)."""
+    cols = ["image"] + (["frame_index", "timestamp_s"] if video else [])
+    cols += ["zone", "zone_area_frac", "congestion_index", "proximity_risk_index", "occupancy_frac",
+             "total_detections"]
+    cols += [f"count_{names[k]}" for k in sorted(names)]
+    cols.append("avg_min_ped_vehicle_px")
+    return cols
+
+def _read_rows(path):
+    with open(path, newline="") as f:
+        r = csv.reader(f)
+        next(r, None)
+        yield from r
+
+def merge_sorted_csvs(paths, out_path, columns, key_cols=RANK_COLS):
+    """
+    k-way merge of CSVs that are each sorted by key_cols (descending) into
+    out_path, one row in memory per input. Ties keep the order of `paths`,
+    then the order within each file. Returns the number of rows.
+    """
+    idx = [columns.index(c) for c in key_cols]
+    key = lambda row: tuple(-float(row[i]) for i in idx)
+    n = 0
+    with open(out_path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(columns)
+        for row in heapq.merge(*[_read_rows(p) for p in paths], key=key):
+            w.writerow(row)
+            n += 1
+    return n
+
+def concat_csvs(paths, out_path):
+    """Concatenate CSVs sharing one header, streaming. Returns the number of rows."""
+    n = 0
+    with open(out_path, "w", newline="") as f:
+        w = csv.writer(f)
+        for i, p in enumerate(paths):
+            with open(p, newline="") as g:
+                r = csv.reader(g)
+                header = next(r, None)
+                if i == 0 and header is not None:
+                    w.writerow(header)
+                for row in r:
+                    w.writerow(row)
+                    n += 1
+    return n
+
+def top_k_rows(path, k, key_cols=RANK_COLS):
+    """(header, the k highest-ranked rows of a metrics CSV), streamed through a k-sized heap."""
+    with open(path, newline="") as f:
+        r = csv.reader(f)
+        header = next(r, [])
+        idx = [header.index(c) for c in key_cols]
+        # heap of (rank, -seq, row): the root is the lowest-ranked row kept; later rows lose ties
+        heap = []
+        for seq, row in enumerate(r):
+            item = (tuple(float(row[i]) for i in idx), -seq, row)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return header, [row for *_, row in sorted(heap, reverse=True)]
+
+class _InOrder:
+    """Releases items added out of order by their consecutive 0-based seq, holding only the gaps."""
+
+    def __init__(self):
+        self.next, self.pending = 0, {}
+
+    def add(self, seq, item):
+        self.pending[seq] = item
+        while self.next in self.pending:
+            yield self.pending.pop(self.next)
+            self.next += 1
+
+    def rest(self):
+        """Whatever is still held (a seq never arrived), in seq order."""
+        for seq in sorted(self.pending):
+            yield self.pending.pop(seq)
+
+def write_rows(path, header, rows):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+class MetricsWriter:
+    """
+    Writes metrics rows as they arrive, with a fixed header (missing counts
+    are 0, unknown keys dropped), so memory does not grow with the number of
+    frames.
+
+    Rows may arrive in any order (batched runs group frames by shape); seq,
+    the frame's input position, puts them back in input order.
+
+    sort="risk": rows are ranked by PRI, then CI (descending; ties by seq).
+    Up to chunk_rows rows are sorted in memory; beyond that, each full chunk
+    is spilled as a sorted run (seq kept as a last column) to a temp dir and
+    the runs are k-way merged on close (external merge sort).
+    sort="none": rows are written in seq order; only rows that arrived ahead
+    of a missing seq are held.
+
+    A heap of the top_k highest-risk rows is kept either way (top_rows()).
+    """
+
+    def __init__(self, path, columns, sort="risk", chunk_rows=200_000, top_k=100, tmp_dir=None):
+        if sort not in ("risk", "none"):
+            raise ValueError(f"sort must be 'risk' or 'none', not {sort!r}")
+        self.path, self.columns, self.sort = path, list(columns), sort
+        self.chunk_rows, self.top_k, self.tmp_dir = max(1, chunk_rows), top_k, tmp_dir
+        self.defaults = {c: 0 for c in self.columns if c.startswith("count_")}
+        self._buf, self._runs, self._run_dir = [], [], None
+        self._heap = []
+        self.rows = 0
+        self._seq = itertools.count()
+        self._order = _InOrder()
+        os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+        self._f = self._w = None
+        if sort == "none":
+            self._f = open(path, "w", newline="")
+            self._w = csv.writer(self._f)
+            self._w.writerow(self.columns)
+
+    def add(self, row, seq=None):
+        """row: dict of frame_metrics() plus the image / frame columns; seq: input position (default: arrival)."""
+        seq = next(self._seq) if seq is None else seq
+        vals = [row.get(c, self.defaults.get(c, "")) for c in self.columns]
+        self.rows += 1
+        rank = (row.get(RANK_COLS[0], 0.0), row.get(RANK_COLS[1], 0.0))
+        if self.top_k:
+            item = (rank, -seq, vals)
+            if len(self._heap) < self.top_k:
+                heapq.heappush(self._heap, item)
+            elif item > self._heap[0]:
+                heapq.heapreplace(self._heap, item)
+        if self._w is not None:
+            self._w.writerows(self._order.add(seq, vals))
+            return
+        self._buf.append(((-rank[0], -rank[1], seq), vals))
+        if len(self._buf) >= self.chunk_rows:
+            self._spill()
+
+    def _spill(self):
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix="metrics_runs_", dir=self.tmp_dir)
+        self._buf.sort(key=lambda t: t[0])
+        path = os.path.join(self._run_dir, f"run_{len(self._runs):05d}.csv")
+        write_rows(path, self.columns + ["_seq"], [vals + [key[2]] for key, vals in self._buf])
+        self._runs.append(path)
+        self._buf = []
+
+    def top_rows(self):
+        """The top_k highest-risk rows (lists in column order), highest first."""
+        return [vals for *_, vals in sorted(self._heap, key=lambda t: (t[0], t[1]), reverse=True)]
+
+    def close(self):
+        if self._f is not None:
+            self._w.writerows(self._order.rest())
+            self._f.close()
+            self._f = self._w = None
+            return self.path
+        if not self._runs:  # everything fit in one chunk
+            self._buf.sort(key=lambda t: t[0])
+            write_rows(self.path, self.columns, [vals for _, vals in self._buf])
+        else:
+            if self._buf:
+                self._spill()
+            i_pri, i_ci = (self.columns.index(c) for c in RANK_COLS)
+            key = lambda r: (-float(r[i_pri]), -float(r[i_ci]), int(r[-1]))
+            with open(self.path, "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(self.columns)
+                for r in heapq.merge(*[_read_rows(p) for p in self._runs], key=key):
+                    w.writerow(r[:-1])
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+        self._buf, self._runs = [], []
+        return self.path
+
+class RowWriter:
+    """
+    Fixed-header CSV (zone_metrics.csv); missing counts are 0. add() takes
+    one frame's rows and its input position; frames are written in that order.
+    """
+
+    def __init__(self, path, columns):
+        self.columns = list(columns)
+        self.defaults = {c: 0 for c in self.columns if c.startswith("count_")}
+        self._f = open(path, "w", newline="")
+        self._w = csv.writer(self._f)
+        self._w.writerow(self.columns)
+        self.path = path
+        self._order = _InOrder()
+
+    def add(self, rows, seq):
+        for frame_rows in self._order.add(seq, rows):
+            self._w.writerows([r.get(c, self.defaults.get(c, "")) for c in self.columns] for r in frame_rows)
+
+    def close(self):
+        for frame_rows in self._order.rest():
+            self._w.writerows([r.get(c, self.defaults.get(c, "")) for c in self.columns] for r in frame_rows)
+        self._f.close()
+        return self.path
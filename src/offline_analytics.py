@@ -0,0 +1,112 @@
+# src/offline_analytics.py
+# Recompute per-frame analytics from a saved detections store — no model needed.
+import argparse, json, os
+
+import numpy as np
+
+from det_store import load_detections
+from image_analytics import CI_WEIGHTS, VEHICLE_SET
+from profiling import add_profile_args, finish_profile, open_profiler
+from risk import PED_SET, proximity_risk_frames
+
+class OfflineAnalytics:
+    """
+    Vectorized CI / PRI / occupancy / per-class counts over every frame of a
+    DetectionWriter store. The store is loaded (memory-mapped) once; metrics()
+    can then be called repeatedly with different weights, vehicle sets and
+    thresholds.
+
+    Matches image_analytics.run(): counts and CI exactly; occupancy and PRI
+    are summed in float64, so they can differ in the last rounded digit.
+    """
+
+    def __init__(self, path):
+        self.store = load_detections(path)
+        st = self.store
+        self.class_names = [str(n) for n in st["class_names"]]
+        self.n = len(st["names"])
+        counts = np.diff(st["offsets"])
+        self.fid = np.repeat(np.arange(self.n), counts)
+        self.cls = np.asarray(st["classes"]).astype(np.int64)
+        b = np.asarray(st["boxes"])
+        self.centers = np.stack([(b[:, 0] + b[:, 2]) / 2.0, (b[:, 1] + b[:, 3]) / 2.0], axis=1)
+        self.areas = ((b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])).clip(min=0)
+        self.H = st["height"].astype(np.float64)
+        self.W = st["width"].astype(np.float64)
+        n_cls = max(len(self.class_names), int(self.cls.max()) + 1 if len(self.cls) else 0)
+        self.per_class = np.bincount(self.fid * n_cls + self.cls, minlength=self.n * n_cls).reshape(self.n, n_cls)
+
+    def _name(self, k):
+        return self.class_names[k] if k < len(self.class_names) else str(k)
+
+    def _class_mask(self, names):
+        return np.array([self._name(k) in names for k in range(self.per_class.shape[1])], dtype=bool)
+
+    def metrics(self, ci_weights=CI_WEIGHTS, vehicle_set=VEHICLE_SET, thr_frac=0.08, ped_set=PED_SET,
+                sort=True):
+        """DataFrame with the metrics.csv columns of image_analytics.run()."""
+        import pandas as pd
+        n_cls = self.per_class.shape[1]
+        # unknown ids count as "others", then unknown names weigh 1.0 (as in frame_metrics)
+        w = np.array([ci_weights.get(self.class_names[k] if k < len(self.class_names) else "others", 1.0)
+                      for k in range(n_cls)], dtype=np.float64)
+        ci = np.bincount(self.fid, weights=w[self.cls], minlength=self.n)
+
+        thr = thr_frac * np.hypot(self.W, self.H)
+        is_ped = self._class_mask(ped_set)[self.cls]
+        is_veh = self._class_mask(vehicle_set)[self.cls]
+        pri, avg = proximity_risk_frames(self.fid[is_ped], self.centers[is_ped],
+                                         self.fid[is_veh], self.centers[is_veh], thr, self.n)
+
+        occ = np.bincount(self.fid, weights=self.areas, minlength=self.n) / (self.W * self.H + 1e-6)
+
+        df = pd.DataFrame({
+            "image": self.store["names"],
+            "congestion_index": np.round(ci, 3),
+            "proximity_risk_index": np.round(pri, 3),
+            "occupancy_frac": np.round(occ, 4),
+            "total_detections": self.per_class.sum(axis=1),
+        })
+        if (self.store["frame_index"] >= 0).any():
+            df.insert(1, "frame_index", self.store["frame_index"])
+            df.insert(2, "timestamp_s", self.store["timestamp_s"])
+        for k in range(n_cls):  # every class, like metrics_writer.metrics_columns
+            df[f"count_{self._name(k)}"] = self.per_class[:, k]
+        df["avg_min_ped_vehicle_px"] = np.round(avg, 2)
+        if sort and not df.empty:
+            df = df.sort_values(["proximity_risk_index", "congestion_index"], ascending=False)
+        return df
+
+def _load_weights(spec):
+    """--ci-weights: JSON object inline or a path to a JSON file; merged over CI_WEIGHTS."""
+    if not spec:
+        return dict(CI_WEIGHTS)
+    txt = open(spec).read() if os.path.isfile(spec) else spec
+    return {**CI_WEIGHTS, **json.loads(txt)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--detections", required=True, help="Detections store (.npz) from image_analytics --save-detections")
+    ap.add_argument("--out", default="outputs/analytics/metrics_offline.csv")
+    ap.add_argument("--ci-weights", default=None, help='JSON (inline or file) overriding CI_WEIGHTS, e.g. \'{"bus": 3.0}\'')
+    ap.add_argument("--vehicle-set", default=None, help="Comma-separated class names counted as vehicles")
+    ap.add_argument("--thr-frac", type=float, default=0.08, help="PRI distance threshold as a fraction of the diagonal")
+    ap.add_argument("--top", type=int, default=10, help="Print the top-N rows")
+    add_profile_args(ap)
+    a = ap.parse_args(argv)
+    prof = open_profiler(a)
+
+    vehicles = set(a.vehicle_set.split(",")) if a.vehicle_set else VEHICLE_SET
+    with prof.stage("load"):
+        eng = OfflineAnalytics(a.detections)
+    with prof.stage("metrics"):
+        df = eng.metrics(_load_weights(a.ci_weights), vehicles, a.thr_frac)
+    os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+    with prof.stage("write_csv"):
+        df.to_csv(a.out, index=False)
+    print(df.head(a.top).to_string(index=False))
+    print(f"✅ Recomputed {len(df)} frames from {a.detections} → {a.out}")
+    finish_profile(prof, a, os.path.dirname(os.path.abspath(a.out)), "offline_profile")
+
+if __name__ == "__main__":
+    main()
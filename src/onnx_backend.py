@@ -0,0 +1,97 @@
+# src/onnx_backend.py
+# ONNX Runtime CPU inference for exported YOLO detectors (see export_model.py).
+import ast, os
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.utils.nms import non_max_suppression
+from ultralytics.utils.ops import scale_boxes
+
+def session_options(threads=0, spin=True):
+    """
+    CPU session tuned for one model per process: all graph optimisations,
+    sequential execution, `threads` intra-op threads (0 = one per physical
+    core, ORT's default). spin=False stops idle worker threads from busy-
+    waiting, which helps when decode/post threads share the cores.
+    """
+    import onnxruntime as ort
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    so.intra_op_num_threads = int(threads)
+    so.inter_op_num_threads = 1
+    if not spin:
+        so.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return so
+
+def letterbox(img, shape):
+    """Ultralytics LetterBox(auto=False): resize long side to fit, pad center with 114."""
+    h, w = img.shape[:2]
+    r = min(shape[0] / h, shape[1] / w)
+    nw, nh = round(w * r), round(h * r)
+    if (nw, nh) != (w, h):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    dw, dh = (shape[1] - nw) / 2, (shape[0] - nh) / 2
+    top, bottom = round(dh - 0.1), round(dh + 0.1)
+    left, right = round(dw - 0.1), round(dw + 0.1)
+    return cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+class OnnxModel:
+    """
+    An exported YOLO .onnx run through onnxruntime directly, with the same
+    pre/post-processing as Ultralytics predict (letterbox, NMS iou=0.7,
+    max_det=300), so counts match the PyTorch model up to numerics.
+    names/imgsz/stride come from the export metadata.
+    """
+
+    def __init__(self, path, threads=0, spin=True):
+        import onnxruntime as ort
+        self.path = path
+        self.session = ort.InferenceSession(path, session_options(threads, spin), providers=["CPUExecutionProvider"])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = {int(k): v for k, v in ast.literal_eval(meta["names"]).items()} if "names" in meta else {}
+        self.end2end = meta.get("end2end", "False") == "True"
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.dtype = np.float16 if "float16" in inp.type else np.float32
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+        self.fixed_batch = 1 if self.dynamic_batch else int(inp.shape[0])  # export --batch without --dynamic
+        self.fixed_hw = tuple(inp.shape[2:]) if all(isinstance(d, int) for d in inp.shape[2:]) else None
+        self.imgsz = tuple(ast.literal_eval(meta["imgsz"])) if "imgsz" in meta else (640, 640)
+        self.stride = int(meta.get("stride", 32))
+
+    def input_hw(self, imgsz=None):
+        """Static exports run at their own size; dynamic ones at imgsz (rounded up to the stride)."""
+        if self.fixed_hw:
+            return self.fixed_hw
+        if imgsz is None:
+            return self.imgsz
+        s = -(-int(imgsz) // self.stride) * self.stride
+        return s, s
+
+    def detect(self, srcs, conf=0.25, imgsz=None, iou=0.7, max_det=300):
+        """list of BGR arrays or paths -> [(boxes xyxy, class ids, scores), ...] in source pixels."""
+        hw = self.input_hw(imgsz)
+        imgs = [cv2.imread(s) if isinstance(s, (str, os.PathLike)) else s for s in srcs]
+        x = np.stack([letterbox(im, hw)[..., ::-1].transpose(2, 0, 1) for im in imgs])
+        x = np.ascontiguousarray(x, dtype=self.dtype) / self.dtype(255.0)
+        if self.dynamic_batch:
+            preds = self.session.run(None, {self.input_name: x})[0]
+        else:
+            # static batch: feed exactly fixed_batch images per run, the last chunk padded with copies of its last image
+            b, preds = self.fixed_batch, []
+            for i in range(0, len(x), b):
+                chunk = x[i:i + b]
+                if len(chunk) < b:
+                    chunk = np.concatenate([chunk, np.repeat(chunk[-1:], b - len(chunk), axis=0)])
+                preds.append(self.session.run(None, {self.input_name: chunk})[0][:len(x) - i])
+            preds = np.concatenate(preds)
+        dets = non_max_suppression(torch.from_numpy(preds.astype(np.float32)), conf, iou,
+                                   max_det=max_det, end2end=self.end2end)
+        out = []
+        for im, d in zip(imgs, dets):
+            d = d.numpy()
+            boxes = scale_boxes(hw, d[:, :4].copy(), im.shape[:2]).astype(np.float32)
+            out.append((boxes, d[:, 5].astype(int), d[:, 4].astype(np.float32)))
+        return out
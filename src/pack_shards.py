@@ -0,0 +1,167 @@
+# src/pack_shards.py
+# Pack a converted YOLO split into memory-mapped shards of pre-resized images.
+import os, argparse, math, json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from convert_visdrone_to_yolo import ID2NAME
+from utils import list_images, image_size
+
+def resized_hw(h0, w0, imgsz):
+    """Long side to imgsz, as Ultralytics' load_image(rect_mode=True) does."""
+    r = imgsz / max(h0, w0)
+    if r == 1:
+        return h0, w0
+    return min(math.ceil(h0 * r), imgsz), min(math.ceil(w0 * r), imgsz)
+
+def label_path(img_path):
+    """images/<split>/x.jpg -> labels/<split>/x.txt (Ultralytics convention)."""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return sb.join(img_path.rsplit(sa, 1)).rsplit(".", 1)[0] + ".txt"
+
+def read_labels(path):
+    """(cls[n], xywh[n,4]) float32 from a YOLO label file; None if the file is malformed."""
+    if not os.path.exists(path):
+        return np.zeros(0, np.float32), np.zeros((0, 4), np.float32)
+    with open(path) as f:
+        rows = [ln.split() for ln in f.read().strip().splitlines() if ln.strip()]
+    if not rows:
+        return np.zeros(0, np.float32), np.zeros((0, 4), np.float32)
+    try:
+        lb = np.array(rows, dtype=np.float32)
+    except ValueError:
+        return None
+    if lb.ndim != 2 or lb.shape[1] != 5:
+        return None
+    if len(lb):
+        if (lb[:, 1:] < 0).any() or (lb[:, 1:] > 1).any():
+            return None
+        lb = lb[np.sort(np.unique(lb, axis=0, return_index=True)[1])]  # drop duplicate rows
+    return lb[:, 0], lb[:, 1:]
+
+def _pack_chunk(shard_path, items):
+    """Decode, resize and write one run of images into an existing shard; ok flag per image."""
+    import cv2
+    buf = np.load(shard_path, mmap_mode="r+")
+    ok = []
+    for ip, off, h, w in items:
+        im = cv2.imread(ip)
+        if im is None:
+            ok.append(False)
+            continue
+        if im.shape[:2] != (h, w):
+            im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        buf[off:off + im.size] = im.reshape(-1)
+        ok.append(True)
+    buf.flush()
+    return ok
+
+def pack_split(img_dir, out_dir, imgsz=640, shard_mb=1024, workers=1):
+    """
+    Writes out_dir/shard_XXX.npy (flat uint8 BGR pixels) and out_dir/index.npz:
+      names[N], shard[N], offset[N], hw[N,2] (packed), hw0[N,2] (original),
+      lb_off[N+1] (image i owns cls/bboxes[lb_off[i]:lb_off[i+1]]),
+      cls[M] float32, bboxes[M,4] float32 normalized xywh, imgsz.
+    Image sizes come from the headers, so every image's slot is laid out
+    before anything is decoded and workers write straight into the shards.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = sorted(list_images(img_dir))
+    items, cls, boxes, skipped = [], [], [], 0
+    for ip in paths:
+        lb = read_labels(label_path(ip))
+        try:
+            h0, w0 = image_size(ip)
+        except Exception:
+            lb = None
+        if lb is None:
+            skipped += 1
+            continue
+        items.append((ip, h0, w0) + resized_hw(h0, w0, imgsz))
+        cls.append(lb[0]); boxes.append(lb[1])
+
+    # --- lay out shards ---
+    cap = int(shard_mb * 2**20)
+    shard, offset, sizes = [], [], [0]
+    for _, _, _, h, w in items:
+        n = h * w * 3
+        if sizes[-1] and sizes[-1] + n > cap:
+            sizes.append(0)
+        shard.append(len(sizes) - 1); offset.append(sizes[-1])
+        sizes[-1] += n
+    shard_paths = [os.path.join(out_dir, f"shard_{k:03d}.npy") for k in range(len(sizes))]
+    for p, n in zip(shard_paths, sizes):
+        if n:
+            np.lib.format.open_memmap(p, mode="w+", dtype=np.uint8, shape=(n,)).flush()
+
+    # --- decode + resize into the shards (runs of up to 256 images of one shard per task) ---
+    tasks, start = [], 0
+    for i in range(1, len(items) + 1):
+        if i == len(items) or shard[i] != shard[start] or i - start == 256:
+            run = list(range(start, i))
+            tasks.append((run, shard_paths[shard[start]],
+                          [(items[j][0], offset[j], items[j][3], items[j][4]) for j in run]))
+            start = i
+    ok = np.zeros(len(items), bool)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futs = [(run, ex.submit(_pack_chunk, p, its)) for run, p, its in tasks]
+            for run, fut in futs:
+                ok[run] = fut.result()
+    else:
+        for run, p, its in tasks:
+            ok[run] = _pack_chunk(p, its)
+    skipped += int((~ok).sum())
+
+    keep = np.flatnonzero(ok)
+    counts = np.array([len(cls[i]) for i in keep], np.int64)
+    lb_off = np.zeros(len(keep) + 1, np.int64)
+    np.cumsum(counts, out=lb_off[1:])
+    np.savez(os.path.join(out_dir, "index.npz"),
+             names=np.array([os.path.basename(items[i][0]) for i in keep], dtype=str),
+             shard=np.array(shard, np.int32)[keep], offset=np.array(offset, np.int64)[keep],
+             hw=np.array([items[i][3:5] for i in keep], np.int32).reshape(-1, 2),
+             hw0=np.array([items[i][1:3] for i in keep], np.int32).reshape(-1, 2),
+             lb_off=lb_off,
+             cls=np.concatenate([cls[i] for i in keep]) if len(keep) else np.zeros(0, np.float32),
+             bboxes=np.concatenate([boxes[i] for i in keep]) if len(keep) else np.zeros((0, 4), np.float32),
+             imgsz=np.int32(imgsz))
+    return len(keep), skipped, sum(sizes)
+
+def read_names(data_root):
+    """Class names from the converter's names.txt, else the VisDrone defaults."""
+    p = os.path.join(data_root, "names.txt")
+    if os.path.exists(p):
+        with open(p) as f:
+            return [ln.strip() for ln in f if ln.strip()]
+    return [ID2NAME[k] for k in sorted(ID2NAME)]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data-root", default="data/visdrone-yolo", help="Output of convert_visdrone_to_yolo.py")
+    ap.add_argument("--splits", nargs="+", default=["train", "val"])
+    ap.add_argument("--out", default="data/visdrone-shards")
+    ap.add_argument("--imgsz", type=int, default=640, help="Long side of the packed images (train with the same --imgsz)")
+    ap.add_argument("--shard-mb", type=float, default=1024, help="Target shard size")
+    ap.add_argument("--workers", type=int, default=0, help="Decode processes (0 = all CPU cores)")
+    args = ap.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    out_root = os.path.abspath(args.out)
+    for split in args.splits:
+        n, skipped, nbytes = pack_split(os.path.join(args.data_root, "images", split),
+                                        os.path.join(out_root, split), args.imgsz, args.shard_mb, workers)
+        print(f"📦 {split}: {n} images, {nbytes / 2**30:.2f} GiB ({skipped} skipped: unreadable image or bad labels)")
+
+    # dataset yaml for train_yolo.py --shards (JSON is valid YAML)
+    names = read_names(args.data_root)
+    yaml_path = os.path.join(out_root, "shards.yaml")
+    with open(yaml_path, "w") as f:
+        json.dump({"path": out_root, "train": "train", "val": "val" if "val" in args.splits else "train",
+                   "names": names, "imgsz": args.imgsz}, f, indent=2)
+    print(f"✅ Shards at: {out_root}")
+    print(f"Dataset yaml: {yaml_path}")
+
+if __name__ == "__main__":
+    main()
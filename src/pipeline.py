@@ -0,0 +1,81 @@
+# src/pipeline.py
+# Staged decode -> infer -> postprocess runner joined by bounded queues.
+import queue, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+def _feed(items, decode, pool, q, stop):
+    """Producer thread: submit decodes in input order; q bounds frames in flight."""
+    try:
+        for item in items:
+            fut = pool.submit(decode, item)
+            while not stop.is_set():
+                try:
+                    q.put(fut, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        q.put(_DONE)
+    except BaseException as e:  # surfaced on the consumer side
+        q.put(e)
+
+def run_staged(items, decode, infer, post, batch=1, batch_key=None,
+               decode_workers=2, post_workers=2, queue_depth=8):
+    """
+    Yield post(item, result) for every item, in input order.
+
+    decode(item) -> decoded item       runs on a pool of `decode_workers` threads
+    infer(list)  -> list of results    runs on the calling thread, `batch` items at a time
+    post(item, result) -> output       runs on a pool of `post_workers` threads
+
+    At most `queue_depth` decoded items wait for inference and at most
+    `queue_depth` items sit in postprocessing, so memory stays bounded no
+    matter how long `items` is. When `batch_key(item)` is given, a batch is
+    flushed early whenever the key changes (e.g. image shape).
+    """
+    q = queue.Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+    dec_pool = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="decode")
+    post_pool = ThreadPoolExecutor(max_workers=max(1, post_workers), thread_name_prefix="post")
+    feeder = threading.Thread(target=_feed, args=(items, decode, dec_pool, q, stop), daemon=True)
+    pending = deque()
+
+    def _flush(buf):
+        for it, res in zip(buf, infer(buf)):
+            pending.append(post_pool.submit(post, it, res))
+
+    try:
+        feeder.start()
+        buf = []
+        while True:
+            fut = q.get()
+            if fut is _DONE:
+                break
+            if isinstance(fut, BaseException):
+                raise fut
+            it = fut.result()
+            if buf and (len(buf) >= batch or
+                        (batch_key is not None and batch_key(it) != batch_key(buf[0]))):
+                _flush(buf); buf = []
+            buf.append(it)
+            while len(pending) > queue_depth:
+                yield pending.popleft().result()
+        if buf:
+            _flush(buf)
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        stop.set()
+        # unblock the producer if it is waiting on a full queue
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        feeder.join(timeout=1.0)
+        dec_pool.shutdown(wait=True, cancel_futures=True)
+        post_pool.shutdown(wait=True, cancel_futures=True)
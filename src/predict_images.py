@@ -1,18 +1,73 @@
 
 import argparse, os
-from ultralytics import YOLO
 
-def main():
+from det_cache import add_cache_args, open_cache
+from detector import add_backend_args, class_names, load_model, make_detector, resolve_backend
+from profiling import NULL, add_profile_args, finish_profile, open_profiler
+from render import OverlayRenderer
+from sources import list_image_paths
+from utils import image_size
+
+def write_yolo_txt(path, boxes, clses, scores, H, W):
+    """Same layout as Ultralytics save_txt + save_conf: cls xc yc w h conf (normalized)."""
+    with open(path, "w") as f:
+        for (x1, y1, x2, y2), c, s in zip(boxes.tolist(), clses.tolist(), scores.tolist()):
+            line = (c, (x1 + x2) / 2 / W, (y1 + y2) / 2 / H, (x2 - x1) / W, (y2 - y1) / H, s)
+            f.write(("%g " * len(line)).rstrip() % line + "\n")
+
+def predict_cached(model, args, cache, prof=NULL):
+    """
+    Per-image predictions through the detection cache (if any) and our own
+    detect(); labels (+ overlays) under runs/detect/<name>.
+    """
+    import cv2
+    out_dir = os.path.join("runs", "detect", args.name)
+    lbl_dir = os.path.join(out_dir, "labels")
+    os.makedirs(lbl_dir, exist_ok=True)
+    detect = make_detector(model, conf=args.conf, imgsz=None)
+    if cache is not None:
+        detect = cache.wrap(detect)
+    names = class_names(model)
+    renderer = OverlayRenderer(names) if args.save else None
+    for ip in list_image_paths(args.source):
+        base = os.path.basename(ip)
+        with prof.stage("detect", base):
+            boxes, clses, scores = detect([ip])[0]
+        with prof.stage("labels", base):
+            H, W = image_size(ip)
+            stem = os.path.splitext(base)[0]
+            write_yolo_txt(os.path.join(lbl_dir, stem + ".txt"), boxes, clses, scores, H, W)
+        if renderer is not None:
+            with prof.stage("overlay", base):
+                img = cv2.imread(ip)
+                if img is not None:
+                    cv2.imwrite(os.path.join(out_dir, base), renderer.render(img, boxes, clses, scores))
+        prof.mark(base)
+    if cache is not None:
+        print(cache.report())
+
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--model", required=True, help="Path to weights .pt (e.g., runs/detect/train/weights/best.pt)")
     p.add_argument("--source", required=True, help="Folder of images (e.g., data/visdrone-yolo/images/val)")
     p.add_argument("--conf", type=float, default=0.25)
     p.add_argument("--name", default="predict-visdrone")
     p.add_argument("--save", action="store_true", help="Save visualized predictions")
-    args = p.parse_args()
+    add_backend_args(p)
+    add_cache_args(p)
+    add_profile_args(p)
+    args = p.parse_args(argv)
+    prof = open_profiler(args)
 
-    model = YOLO(args.model)
-    results = model.predict(source=args.source, conf=args.conf, save=args.save, name=args.name)
+    model = load_model(args.model, args.backend, args.threads, args.server)
+    cache = open_cache(args, getattr(model, "model_id", args.model), conf=args.conf, imgsz=None, tile=0,
+                       tile_overlap=0.2)
+    if cache is not None or args.server or resolve_backend(args.model, args.backend) == "onnxruntime":
+        predict_cached(model, args, cache, prof)
+    else:
+        with prof.stage("predict"):
+            results = model.predict(source=args.source, conf=args.conf, save=args.save, name=args.name)
+    finish_profile(prof, args, os.path.join("runs", "detect", args.name))
     print("✅ Prediction done. See runs/detect/%s" % args.name)
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+# src/profiling.py
+# Per-stage wall-time / peak-RSS profiling for the analytics scripts (no-op unless --profile).
+import contextlib, csv, json, os, resource, sys, threading, time
+
+import numpy as np
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # KiB on Linux
+
+class Profiler:
+    """
+    Records one event per (frame, stage): start offset and wall time.
+    Safe to use from the pipeline's worker threads. mark() snapshots peak
+    RSS once a frame is finished.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.events = []   # (frame, stage, start_s, dur_s, thread)
+        self.frames = {}   # frame -> peak RSS bytes when it finished
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name, frame=""):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.events.append((frame, name, t - self.t0, end - t, threading.current_thread().name))
+
+    def mark(self, frame):
+        self.frames[frame] = peak_rss_bytes()
+
+    def summary(self):
+        by_stage = {}
+        for _, name, _, dur, _ in self.events:
+            by_stage.setdefault(name, []).append(dur)
+        stages = {}
+        for name, ds in by_stage.items():
+            ms = np.array(ds) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stages[name] = {"count": len(ms), "total_s": round(float(ms.sum()) / 1000.0, 4),
+                            "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+                            "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+        return {"wall_s": round(time.perf_counter() - self.t0, 4), "frames": len(self.frames),
+                "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1), "stages": stages}
+
+    def write(self, out_dir, prefix="profile", prometheus=False):
+        """<prefix>_summary.json, <prefix>_trace.csv and optionally <prefix>.prom; returns the summary."""
+        os.makedirs(out_dir, exist_ok=True)
+        s = self.summary()
+        with open(os.path.join(out_dir, f"{prefix}_summary.json"), "w") as f:
+            json.dump(s, f, indent=2)
+        with open(os.path.join(out_dir, f"{prefix}_trace.csv"), "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["frame", "stage", "start_ms", "ms", "thread", "peak_rss_mb"])
+            for frame, name, start, dur, th in sorted(self.events, key=lambda e: e[2]):
+                rss = self.frames.get(frame)
+                w.writerow([frame, name, f"{start * 1000:.3f}", f"{dur * 1000:.3f}", th,
+                            f"{rss / 2**20:.1f}" if rss else ""])
+        if prometheus:
+            with open(os.path.join(out_dir, f"{prefix}.prom"), "w") as f:
+                f.write(prometheus_text(s))
+        return s
+
+    def report(self):
+        s = self.summary()
+        frames = f"{s['frames']} frames, " if s["frames"] else ""
+        lines = [f"📊 Profile: {frames}{s['wall_s']:.2f}s wall, peak RSS {s['peak_rss_mb']:.0f} MB"]
+        for name, st in sorted(s["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+            lines.append(f"   {name:14s} n={st['count']:<6d} p50 {st['p50_ms']:9.2f} ms  p95 {st['p95_ms']:9.2f} ms"
+                         f"  p99 {st['p99_ms']:9.2f} ms  total {st['total_s']:8.2f} s")
+        return "\n".join(lines)
+
+class NullProfiler:
+    """Profiler stand-in when profiling is off: every call is a no-op."""
+
+    enabled = False
+    _null = contextlib.nullcontext()
+
+    def stage(self, name, frame=""):
+        return self._null
+
+    def mark(self, frame):
+        pass
+
+NULL = NullProfiler()
+
+def prometheus_text(summary, metric="analytics_stage_seconds"):
+    """Prometheus text exposition of a Profiler summary."""
+    out = [f"# HELP {metric} Wall time per stage and frame.", f"# TYPE {metric} summary"]
+    for name, st in sorted(summary["stages"].items()):
+        for q, k in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            out.append(f'{metric}{{stage="{name}",quantile="{q}"}} {st[k] / 1000.0:.6f}')
+        out.append(f'{metric}_sum{{stage="{name}"}} {st["total_s"]:.6f}')
+        out.append(f'{metric}_count{{stage="{name}"}} {st["count"]}')
+    out += ["# HELP analytics_peak_rss_bytes Peak resident set size.", "# TYPE analytics_peak_rss_bytes gauge",
+            f"analytics_peak_rss_bytes {int(summary['peak_rss_mb'] * 2**20)}",
+            "# HELP analytics_wall_seconds Wall time of the profiled run.", "# TYPE analytics_wall_seconds gauge",
+            f"analytics_wall_seconds {summary['wall_s']:.6f}"]
+    return "\n".join(out) + "\n"
+
+def add_profile_args(ap):
+    ap.add_argument("--profile", action="store_true",
+                    help="Record per-frame, per-stage wall time + peak RSS (summary JSON, trace CSV)")
+    ap.add_argument("--profile-dir", default=None, help="Where profile files go (default: next to the outputs)")
+    ap.add_argument("--profile-prom", action="store_true", help="Also write a Prometheus text file")
+
+def open_profiler(args):
+    """Profiler from add_profile_args() options, or NULL when profiling is off."""
+    return Profiler() if getattr(args, "profile", False) else NULL
+
+def finish_profile(prof, args, default_dir, prefix="profile"):
+    """Write the profile files and print the per-stage table (nothing when profiling is off)."""
+    if not prof.enabled:
+        return
+    out_dir = args.profile_dir or default_dir
+    prof.write(out_dir, prefix, prometheus=args.profile_prom)
+    print(prof.report())
+    print(f"📊 Profile files: {os.path.join(out_dir, prefix)}_summary.json / _trace.csv"
+          + (" / .prom" if args.profile_prom else ""))
@@ -0,0 +1,114 @@
+# src/render.py
+# Overlay rendering straight into BGR arrays with cached fonts and label sprites.
+from functools import lru_cache
+
+import numpy as np
+
+from heatmap import heatmap_from_points
+from profiling import NULL
+
+BOX_COLOR = (0, 0, 255)    # red, BGR
+TEXT_COLOR = (255, 255, 255)
+
+@lru_cache(maxsize=None)
+def load_font(size=16):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except Exception:
+        return ImageFont.load_default()
+
+class OverlayRenderer:
+    """
+    Same look as image_analytics.draw_overlay (red boxes, "name 0.87" labels
+    on a red tab), drawn with OpenCV into a BGR numpy buffer.
+
+    Each distinct label text (class, score rounded to 2 decimals) is rasterized
+    once with PIL and cached as a small sprite, so a dense frame costs one
+    cv2.rectangle and one array copy per detection.
+    max_labels: label only the N highest-scoring boxes (all boxes are drawn).
+    scale < 1 renders at thumbnail resolution (labels keep their pixel size).
+    """
+
+    def __init__(self, names, font_size=16, max_labels=None, scale=1.0, thickness=2):
+        self.names = names
+        self.font = load_font(font_size)
+        self.max_labels = max_labels
+        self.scale = scale
+        self.thickness = thickness
+        self._sprites = {}
+
+    def sprite(self, cls, score):
+        """BGR label tab for one (class, score) pair, built on first use."""
+        from PIL import Image, ImageDraw
+        text = f"{self.names.get(cls, str(cls))} {score:.2f}"
+        spr = self._sprites.get(text)
+        if spr is None:
+            l, t, r, b = self.font.getbbox(text)
+            tw, th = r - l, b - t
+            im = Image.new("RGB", (tw + 7, th + 7), BOX_COLOR[::-1])
+            ImageDraw.Draw(im).text((3, 3), text, fill=TEXT_COLOR, font=self.font)
+            spr = self._sprites[text] = np.ascontiguousarray(np.array(im)[..., ::-1])
+        return spr
+
+    def render(self, img, boxes, classes, scores):
+        """img: HxWx3 BGR array (not modified). Returns the overlay as a new BGR array."""
+        import cv2
+        if self.scale != 1.0:
+            H0, W0 = img.shape[:2]
+            W, H = max(1, int(round(W0 * self.scale))), max(1, int(round(H0 * self.scale)))
+            out = cv2.resize(img, (W, H), interpolation=cv2.INTER_AREA)
+            boxes = np.asarray(boxes, np.float64) * np.array([W / W0, H / H0, W / W0, H / H0])
+        else:
+            out = img.copy()
+        H, W = out.shape[:2]
+        if len(boxes) == 0:
+            return out
+
+        xy = np.asarray(boxes).round().astype(np.int64)
+        for x1, y1, x2, y2 in xy.tolist():
+            cv2.rectangle(out, (x1, y1), (x2, y2), BOX_COLOR, self.thickness)
+
+        # labels: highest scores first when capped
+        order = np.arange(len(xy))
+        if self.max_labels is not None and len(order) > self.max_labels:
+            order = np.argsort(-np.asarray(scores), kind="stable")[:self.max_labels]
+        clses = np.asarray(classes).astype(int)
+        sc = np.asarray(scores, np.float64)
+        for i in order.tolist():
+            spr = self.sprite(int(clses[i]), sc[i])
+            sh, sw = spr.shape[:2]
+            x0 = min(max(0, xy[i, 0]), W - 1)
+            y0 = max(0, xy[i, 1] - sh)  # tab above the box, pushed down at the top edge
+            h, w = min(sh, H - y0), min(sw, W - x0)
+            if h > 0 and w > 0:
+                out[y0:y0 + h, x0:x0 + w] = spr[:h, :w]
+        return out
+
+def colorize_heatmap(hm):
+    """0..1 -> colored RGBA overlay using OpenCV colormap."""
+    import cv2
+    hm_u8 = (hm * 255).astype(np.uint8)
+    color = cv2.applyColorMap(hm_u8, cv2.COLORMAP_JET)  # BGR
+    color = cv2.cvtColor(color, cv2.COLOR_BGR2RGBA)
+    color[..., 3] = (hm * 200).astype(np.uint8)  # alpha
+    return color  # HxWx4
+
+def heatmap_overlay(arr, boxes, scale=1.0, prof=NULL, frame=""):
+    """Detection-density heatmap blended over a BGR frame -> HxWx4 RGBA (frame size x scale)."""
+    import cv2
+    if scale != 1.0:
+        H0, W0 = arr.shape[:2]
+        arr = cv2.resize(arr, (max(1, int(round(W0 * scale))), max(1, int(round(H0 * scale)))),
+                         interpolation=cv2.INTER_AREA)
+        boxes = boxes * np.array([arr.shape[1] / W0, arr.shape[0] / H0] * 2, dtype=np.float32)
+    H, W = arr.shape[:2]
+    with prof.stage("heatmap", frame):
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2.0
+        hm = heatmap_from_points(H, W, centers, sigma=max(8, int(0.015 * max(H, W))))
+        rgba = colorize_heatmap(hm)
+    with prof.stage("blend", frame):
+        blend = cv2.cvtColor(arr, cv2.COLOR_BGR2RGBA)
+        alpha = rgba[..., 3:4].astype(np.float32) / 255.0
+        blend[..., :3] = (alpha * rgba[..., :3] + (1 - alpha) * blend[..., :3]).astype(np.uint8)
+    return blend
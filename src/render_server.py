@@ -0,0 +1,154 @@
+# src/render_server.py
+# Serve an analytics folder; overlays/heatmaps are rendered on first request and cached on disk.
+import argparse, hashlib, os, threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+
+from det_cache import DiskLRU
+from det_store import load_detections
+from render import OverlayRenderer, heatmap_overlay
+from sources import is_video, read_video_frame
+
+class LazyRenderer:
+    """
+    Renders overlays and heatmaps for frames of a detections store
+    (image_analytics --render lazy) and keeps the encoded images in a DiskLRU.
+    Pixels are re-read from the original image files (or seeked in the source
+    video), so the store holds no pixels at all.
+    """
+
+    def __init__(self, store_path, cache_dir, max_bytes, image_root=None, max_labels=None, scale=1.0):
+        self.store = load_detections(store_path)
+        self.names = {i: str(n) for i, n in enumerate(self.store["class_names"])}
+        self.index = {str(n): i for i, n in enumerate(self.store["names"])}
+        self.image_root = image_root
+        self.renderer = OverlayRenderer(self.names, max_labels=max_labels, scale=scale)
+        self.scale = scale
+        st = os.stat(store_path)
+        # a re-run rewrites the store, which retires everything rendered from the old one
+        self.ns = hashlib.sha1(f"{os.path.abspath(store_path)}|{st.st_size}|{st.st_mtime_ns}|"
+                               f"{max_labels}|{scale}".encode()).hexdigest()[:12]
+        self.lru = DiskLRU(cache_dir, max_bytes)
+        self.rendered = self.hits = 0
+        self._video_lock = threading.Lock()
+
+    def frame_of(self, name):
+        """Index of the frame behind an overlay/heatmap file name, or None."""
+        if name in self.index:
+            return self.index[name]
+        if name.endswith("_heatmap.png"):
+            stem = name[:-len("_heatmap.png")]
+            for ext in (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"):
+                if stem + ext in self.index:
+                    return self.index[stem + ext]
+        return None
+
+    def _pixels(self, i):
+        import cv2
+        path = str(self.store["path"][i])
+        if path:
+            if not os.path.exists(path) and self.image_root:
+                path = os.path.join(self.image_root, os.path.basename(path))
+            return cv2.imread(path)
+        src = self.store["meta"].get("source", "")
+        if is_video(src):
+            with self._video_lock:
+                return read_video_frame(src, int(self.store["frame_index"][i]))
+        return None
+
+    def _render(self, kind, i):
+        import cv2
+        img = self._pixels(i)
+        if img is None:
+            return None
+        a, b = self.store["offsets"][i], self.store["offsets"][i + 1]
+        boxes = np.asarray(self.store["boxes"][a:b])
+        if kind == "overlays":
+            out = self.renderer.render(img, boxes, self.store["classes"][a:b], self.store["scores"][a:b])
+            ok, buf = cv2.imencode(".jpg", out)
+        else:
+            rgba = heatmap_overlay(img, boxes, self.scale)
+            ok, buf = cv2.imencode(".png", cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA))
+        return buf.tobytes() if ok else None
+
+    def get(self, kind, name):
+        """(bytes, content type) for overlays/<name> or heatmaps/<name>; None if unknown."""
+        i = self.frame_of(name)
+        if i is None:
+            return None
+        ctype = "image/jpeg" if kind == "overlays" else "image/png"
+        p = self.lru.path(os.path.join(self.ns, kind, name))
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+            if self.lru.touch(p):
+                self.hits += 1
+                return data, ctype
+        except FileNotFoundError:
+            pass
+        data = self._render(kind, i)
+        if data is None:
+            return None
+        self.lru.write(p, data)
+        self.rendered += 1
+        return data, ctype
+
+class Handler(SimpleHTTPRequestHandler):
+    """Static files from the analytics folder; missing overlays/heatmaps come from the LazyRenderer."""
+
+    lazy = None
+
+    def do_GET(self):
+        path = unquote(urlparse(self.path).path).lstrip("/")
+        kind, _, name = path.partition("/")
+        if kind in ("overlays", "heatmaps") and name and "/" not in name and \
+                not os.path.exists(os.path.join(self.directory, path)):
+            res = self.lazy.get(kind, name)
+            if res is None:
+                self.send_error(404, "Unknown frame")
+                return
+            data, ctype = res
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", "max-age=3600")
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        super().do_GET()
+
+    def log_message(self, fmt, *args):
+        pass
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="outputs/analytics", help="Analytics folder (metrics.csv + detections.npz)")
+    ap.add_argument("--detections", default=None, help="Detections store (default: <out>/detections.npz)")
+    ap.add_argument("--cache-dir", default=None, help="Rendered-image cache (default: <out>/render_cache)")
+    ap.add_argument("--cache-max-mb", type=float, default=512, help="Cache size cap; LRU images evicted beyond it")
+    ap.add_argument("--image-root", default=None, help="Folder to find images in if they have moved since analysis")
+    ap.add_argument("--max-labels", type=int, default=None)
+    ap.add_argument("--overlay-scale", type=float, default=1.0)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    a = ap.parse_args(argv)
+
+    lazy = LazyRenderer(a.detections or os.path.join(a.out, "detections.npz"),
+                        a.cache_dir or os.path.join(a.out, "render_cache"), a.cache_max_mb * 2**20,
+                        image_root=a.image_root, max_labels=a.max_labels, scale=a.overlay_scale)
+    Handler.lazy = lazy
+    srv = ThreadingHTTPServer((a.host, a.port), partial(Handler, directory=a.out))
+    print(f"🌐 Serving {a.out} at http://{a.host}:{a.port}/ ({len(lazy.index)} frames, renders cached in "
+          f"{lazy.lru.root})")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"🖼️ Rendered {lazy.rendered}, served {lazy.hits} from cache")
+
+if __name__ == "__main__":
+    main()
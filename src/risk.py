@@ -0,0 +1,173 @@
+# src/risk.py
+# Proximity Risk Index (pedestrians near vehicles) with a uniform-grid cell hash.
+import numpy as np
+
+PED_SET = {"pedestrian", "people"}
+
+# pairs examined per vectorized chunk when a pedestrian has no vehicle within thr
+_BRUTE_CHUNK = 1 << 20
+
+def center_dtype(boxes):
+    """
+    dtype of the per-box centers image_analytics has always used
+    (scalar `(x1 + x2) / 2.0`), which depends on NumPy's scalar promotion rules.
+    """
+    return np.asarray(boxes.dtype.type(0) / 2.0).dtype
+
+def split_centers(boxes, clses, names, vehicle_set):
+    """(pedestrian centers, vehicle centers) as (N,2) arrays, in box order."""
+    dt = center_dtype(boxes)
+    cx = ((boxes[:, 0] + boxes[:, 2]) / 2.0).astype(dt)
+    cy = ((boxes[:, 1] + boxes[:, 3]) / 2.0).astype(dt)
+    lab = [names.get(int(c), "") for c in clses.tolist()]
+    is_veh = np.fromiter((n in vehicle_set for n in lab), bool, len(lab))
+    is_ped = np.fromiter((n in PED_SET for n in lab), bool, len(lab))
+    xy = np.stack([cx, cy], axis=1)
+    return xy[is_ped], xy[is_veh]
+
+def _grid_min_d2(ped, veh, thr):
+    """
+    Squared distance from each pedestrian to its nearest vehicle, looking only
+    at the 3x3 block of thr-sized cells around it (inf if none there).
+    """
+    lo = np.minimum(ped.min(axis=0), veh.min(axis=0)).astype(np.float64)
+    gp = np.floor((ped - lo) / thr).astype(np.int64) + 1
+    gv = np.floor((veh - lo) / thr).astype(np.int64) + 1
+    ny = int(max(gp[:, 1].max(), gv[:, 1].max())) + 2
+    pkey = gp[:, 0] * ny + gp[:, 1]
+    vkey = gv[:, 0] * ny + gv[:, 1]
+    order = np.argsort(vkey, kind="stable")
+    skey = vkey[order]
+
+    px, py = ped[:, 0].copy(), ped[:, 1].copy()
+    vx, vy = veh[:, 0].copy(), veh[:, 1].copy()
+    best = np.full(len(ped), np.inf, dtype=ped.dtype)
+    pidx = np.arange(len(ped))
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            q = pkey + dx * ny + dy
+            start = np.searchsorted(skey, q, "left")
+            cnt = np.searchsorted(skey, q, "right") - start
+            tot = int(cnt.sum())
+            if tot == 0:
+                continue
+            pi = np.repeat(pidx, cnt)
+            seg = np.cumsum(cnt) - cnt
+            vi = order[np.repeat(start - seg, cnt) + np.arange(tot)]
+            d2 = (vx[vi] - px[pi]) ** 2 + (vy[vi] - py[pi]) ** 2
+            # pairs are grouped by pedestrian, so a segmented min does the reduction
+            hit = cnt > 0
+            best[hit] = np.minimum(best[hit], np.minimum.reduceat(d2, seg[hit]))
+    return best
+
+def _brute_min_d2(ped, veh):
+    out = np.empty(len(ped), dtype=ped.dtype)
+    step = max(1, _BRUTE_CHUNK // max(1, len(veh)))
+    for s in range(0, len(ped), step):
+        p = ped[s:s + step]
+        out[s:s + step] = ((veh[None, :, :] - p[:, None, :]) ** 2).sum(axis=2).min(axis=1)
+    return out
+
+def proximity_risk(ped, veh, thr):
+    """
+    PRI = sum over pedestrians of max(0, (thr - d) / thr), d = distance to the
+    nearest vehicle. Returns (pri, min_dists) with min_dists in pedestrian
+    order, bit-identical to the brute-force O(P*V) loop.
+
+    Vehicles are hashed into thr-sized cells, so any vehicle within thr of a
+    pedestrian lies in the surrounding 3x3 cells; only those are compared.
+    Pedestrians with nothing inside thr add 0 to PRI but still need their true
+    nearest distance for the average, so just those fall back to a chunked
+    vectorized scan.
+    """
+    if len(ped) == 0 or len(veh) == 0:
+        return 0.0, np.zeros((0,), dtype=ped.dtype)
+    best = _grid_min_d2(ped, veh, thr)
+    d = np.sqrt(best)
+    # a vehicle outside the block is >= thr away; keep a rounding margin
+    far = ~(d < thr * (1 - 1e-6))
+    if far.any():
+        d[far] = np.sqrt(_brute_min_d2(ped[far], veh))
+
+    # Only pedestrians within thr contribute. The original loop computed each
+    # term as a NumPy scalar and accumulated left to right; evaluate the terms
+    # in that scalar's dtype and use a (sequential) cumsum for the same bits.
+    dt = np.asarray((thr - d[0]) / thr).dtype
+    terms = (thr - d.astype(dt)) / thr
+    terms = terms[terms > 0]
+    pri = np.cumsum(terms)[-1] if len(terms) else 0.0  # closer => higher risk
+    return pri, d
+
+def proximity_risk_batch(frames):
+    """proximity_risk over many frames: iterable of (ped, veh, thr) -> list of (pri, min_dists)."""
+    return [proximity_risk(ped, veh, thr) for ped, veh, thr in frames]
+
+def proximity_risk_frames(ped_fid, ped, veh_fid, veh, thr, n_frames):
+    """
+    PRI and mean pedestrian->nearest-vehicle distance for many frames in one
+    vectorized pass (offline analytics). ped_fid / veh_fid give each center's
+    frame, thr is per frame. Same grid as proximity_risk, with the frame id
+    folded into the cell key; sums are accumulated in float64.
+    Returns (pri[n_frames], avg_min[n_frames]).
+    """
+    pri = np.zeros(n_frames, np.float64)
+    avg = np.zeros(n_frames, np.float64)
+    n_veh = np.bincount(veh_fid, minlength=n_frames)
+    sel = n_veh[ped_fid] > 0
+    ped_fid, ped = ped_fid[sel], ped[sel].astype(np.float64)
+    if len(ped) == 0:
+        return pri, avg
+    veh = veh.astype(np.float64)
+    t_p, t_v = thr[ped_fid], thr[veh_fid]
+
+    lo = min(ped.min(), veh.min())
+    gp = np.floor((ped - lo) / t_p[:, None]).astype(np.int64) + 1
+    gv = np.floor((veh - lo) / t_v[:, None]).astype(np.int64) + 1
+    K = int(max(gp.max(), gv.max())) + 2
+    pkey = (ped_fid * K + gp[:, 0]) * K + gp[:, 1]
+    vkey = (veh_fid * K + gv[:, 0]) * K + gv[:, 1]
+    order = np.argsort(vkey, kind="stable")
+    skey = vkey[order]
+
+    best = np.full(len(ped), np.inf)
+    pidx = np.arange(len(ped))
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            q = pkey + dx * K + dy
+            start = np.searchsorted(skey, q, "left")
+            cnt = np.searchsorted(skey, q, "right") - start
+            tot = int(cnt.sum())
+            if tot == 0:
+                continue
+            pi = np.repeat(pidx, cnt)
+            seg = np.cumsum(cnt) - cnt
+            vi = order[np.repeat(start - seg, cnt) + np.arange(tot)]
+            d2 = ((veh[vi] - ped[pi]) ** 2).sum(axis=1)
+            hit = cnt > 0
+            best[hit] = np.minimum(best[hit], np.minimum.reduceat(d2, seg[hit]))
+    d = np.sqrt(best)
+
+    # pedestrians with nothing within thr: scan every vehicle of their frame
+    far = np.flatnonzero(~(d < t_p * (1 - 1e-6)))
+    if len(far):
+        vorder = np.argsort(veh_fid, kind="stable")
+        vstart = np.concatenate([[0], np.cumsum(n_veh)[:-1]])
+        cnt_all = n_veh[ped_fid[far]]
+        csum = np.cumsum(cnt_all)  # once: chunk ends are searched against the running total
+        s = 0
+        while s < len(far):
+            e = max(s + 1, int(np.searchsorted(csum, csum[s - 1] + _BRUTE_CHUNK if s else _BRUTE_CHUNK)))
+            f, cnt = far[s:e], cnt_all[s:e]
+            tot = int(cnt.sum())
+            seg = np.cumsum(cnt) - cnt
+            vi = vorder[np.repeat(vstart[ped_fid[f]] - seg, cnt) + np.arange(tot)]
+            d2 = ((veh[vi] - np.repeat(ped[f], cnt, axis=0)) ** 2).sum(axis=1)
+            d[f] = np.sqrt(np.minimum.reduceat(d2, seg))
+            s = e
+
+    terms = np.maximum(0.0, (t_p - d) / t_p)  # closer => higher risk
+    pri = np.bincount(ped_fid, weights=terms, minlength=n_frames)
+    n_ped = np.bincount(ped_fid, minlength=n_frames)
+    sums = np.bincount(ped_fid, weights=d, minlength=n_frames)
+    np.divide(sums, n_ped, out=avg, where=n_ped > 0)
+    return pri, avg
@@ -0,0 +1,110 @@
+# src/shard_dataset.py
+# Ultralytics dataset/trainer that read images from pack_shards.py output instead of JPEGs.
+import os
+
+import cv2
+import numpy as np
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import LOGGER
+
+class ShardDataset(YOLODataset):
+    """
+    YOLODataset over a packed split directory (index.npz + shard_XXX.npy).
+    Images come out of the memory-mapped shards already resized to the packed
+    imgsz, so a worker's load_image is a slice instead of a JPEG decode; the
+    mosaic buffer and all augmentations are inherited unchanged.
+    """
+
+    def get_img_files(self, img_path):
+        self.split_dir = img_path[0] if isinstance(img_path, list) else img_path
+        idx = np.load(os.path.join(self.split_dir, "index.npz"))
+        self.index = {k: idx[k] for k in idx.files}
+        n = len(self.index["names"])
+        count = self.fraction if isinstance(self.fraction, int) else max(1, round(n * self.fraction))
+        self.n_used = min(n, count)
+        self.packed_imgsz = int(self.index["imgsz"])
+        if self.packed_imgsz != self.imgsz:
+            LOGGER.warning(f"{self.prefix}shards packed at imgsz={self.packed_imgsz}, training at {self.imgsz}: "
+                           f"images are resized again on load")
+        self._shards = {}
+        return [os.path.join(self.split_dir, str(nm)) for nm in self.index["names"][:self.n_used]]
+
+    def get_labels(self):
+        ix = self.index
+        labels = []
+        for i, f in enumerate(self.im_files):
+            a, b = ix["lb_off"][i], ix["lb_off"][i + 1]
+            labels.append({
+                "im_file": f,
+                "shape": tuple(int(v) for v in ix["hw0"][i]),
+                "cls": ix["cls"][a:b].reshape(-1, 1).copy(),
+                "bboxes": ix["bboxes"][a:b].copy(),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        return labels
+
+    def _shard(self, k):
+        # opened lazily so each dataloader worker maps the shards itself
+        if k not in self._shards:
+            self._shards[k] = np.load(os.path.join(self.split_dir, f"shard_{k:03d}.npy"), mmap_mode="r")
+        return self._shards[k]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def load_image(self, i, rect_mode=True, resize_short=False):
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+        ix = self.index
+        h, w = (int(v) for v in ix["hw"][i])
+        off = int(ix["offset"][i])
+        im = np.array(self._shard(int(ix["shard"][i]))[off:off + h * w * 3]).reshape(h, w, 3)
+        h0, w0 = (int(v) for v in ix["hw0"][i])
+        if rect_mode:
+            if self.imgsz != self.packed_imgsz:
+                r = self.imgsz / max(h0, w0)
+                size = (min(int(np.ceil(w0 * r)), self.imgsz), min(int(np.ceil(h0 * r)), self.imgsz))
+                if size != (w, h):
+                    im = cv2.resize(im, size, interpolation=cv2.INTER_LINEAR)
+        elif not (h == w == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+        # Add to buffer if training with augmentations (as BaseDataset.load_image)
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, (h0, w0), im.shape[:2]
+
+class ShardTrainer(DetectionTrainer):
+    """DetectionTrainer whose train/val datasets are ShardDatasets."""
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        model = getattr(self.model, "module", self.model)  # DDP-wrapped or not
+        gs = max(int(model.stride.max()), 32)
+        cfg = self.args
+        return ShardDataset(
+            img_path=img_path,
+            imgsz=cfg.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=cfg,
+            rect=cfg.rect or mode == "val",
+            cache=None,  # shards are already memory-mapped
+            single_cls=cfg.single_cls or False,
+            stride=gs,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=f"{mode}: ",
+            task=cfg.task,
+            classes=cfg.classes,
+            data=self.data,
+            fraction=cfg.fraction if mode == "train" else 1.0,
+        )
@@ -0,0 +1,65 @@
+# src/sources.py
+# Frame sources for analytics: folders of stills, single images, and videos.
+import os, glob, math
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".mpg", ".mpeg", ".ts")
+
+def is_video(path):
+    return os.path.isfile(path) and path.lower().endswith(VIDEO_EXTS)
+
+def list_image_paths(source):
+    """Folder -> image files in it, sorted by name; anything else is treated as a single image."""
+    if os.path.isdir(source):
+        return sorted(p for p in glob.glob(os.path.join(source, "*"))
+                      if p.lower().endswith(IMAGE_EXTS))
+    return [source]
+
+def iter_video_frames(path, stride=1, max_fps=None):
+    """
+    Generator of decoded video frames (BGR) with constant memory.
+    Keeps every `stride`-th frame, further thinned so kept frames are at
+    least 1/max_fps seconds apart. Skipped frames are only grabbed, not
+    decoded. Yields dicts: index (kept-frame counter), frame_index, timestamp_s,
+    name (used for the CSV row and overlay file names) and image.
+    """
+    import cv2
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stride = max(1, int(stride))
+    min_gap = 1.0 / max_fps if max_fps else 0.0
+    next_t = -math.inf
+    fi, kept = -1, 0
+    try:
+        while True:
+            if not cap.grab():
+                break
+            fi += 1
+            if fi % stride:
+                continue
+            t = fi / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if t + 1e-9 < next_t:
+                continue
+            ok, img = cap.retrieve()
+            if not ok:
+                break
+            next_t = t + min_gap
+            yield {"index": kept, "frame_index": fi, "timestamp_s": round(t, 3),
+                   "name": f"{stem}_f{fi:06d}.jpg", "image": img}
+            kept += 1
+    finally:
+        cap.release()
+
+def read_video_frame(path, frame_index):
+    """One decoded frame (BGR) by index; None if the video ends before it."""
+    import cv2
+    cap = cv2.VideoCapture(path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ok, img = cap.read()
+    finally:
+        cap.release()
+    return img if ok else None
@@ -0,0 +1,74 @@
+# src/tiling.py
+# Sliced inference for very large frames: overlapping tiles + cross-tile NMS.
+import numpy as np
+
+def tile_origins(H, W, tile, overlap=0.2):
+    """Top-left corners of overlapping tile x tile windows covering an HxW frame."""
+    step = max(1, int(tile * (1.0 - overlap)))
+    def axis(n):
+        if n <= tile:
+            return [0]
+        xs = list(range(0, n - tile, step))
+        xs.append(n - tile)  # last tile flush with the border
+        return xs
+    return [(x, y) for y in axis(H) for x in axis(W)]
+
+def _seam_mask(boxes, origins, tile, H, W):
+    """True for boxes that reach into more than one tile (possible cross-tile duplicates)."""
+    hits = np.zeros(len(boxes), dtype=np.int32)
+    for x0, y0 in origins:
+        x1, y1 = min(W, x0 + tile), min(H, y0 + tile)
+        hits += ((boxes[:, 0] < x1) & (boxes[:, 2] > x0) &
+                 (boxes[:, 1] < y1) & (boxes[:, 3] > y0))
+    return hits > 1
+
+def merge_tile_detections(dets, origins, tile, H, W, ios_thr=0.6):
+    """
+    Shift per-tile detections to frame coordinates and drop cross-tile duplicates.
+    Duplicates are suppressed greedily by score, per class, with intersection
+    over the smaller box (an object cut by a tile edge overlaps its full copy
+    by the cut box's whole area, which plain IoU under-rates). Only boxes that
+    reach into more than one tile take part in the suppression.
+    """
+    boxes, clses, scores, src = [], [], [], []
+    for t, ((b, c, s), (x0, y0)) in enumerate(zip(dets, origins)):
+        if len(b) == 0:
+            continue
+        boxes.append(b + np.array([x0, y0, x0, y0], dtype=b.dtype))
+        clses.append(c); scores.append(s)
+        src.append(np.full(len(b), t))
+    if not boxes:
+        return np.zeros((0, 4), np.float32), np.zeros((0,), int), np.zeros((0,), np.float32)
+    boxes = np.concatenate(boxes); clses = np.concatenate(clses)
+    scores = np.concatenate(scores); src = np.concatenate(src)
+
+    keep = np.ones(len(boxes), dtype=bool)
+    cand = np.flatnonzero(_seam_mask(boxes, origins, tile, H, W))
+    cand = cand[np.argsort(-scores[cand], kind="stable")]
+    area = (boxes[:, 2] - boxes[:, 0]).clip(min=0) * (boxes[:, 3] - boxes[:, 1]).clip(min=0)
+    for k, i in enumerate(cand):
+        if not keep[i]:
+            continue
+        rest = cand[k + 1:]
+        rest = rest[keep[rest] & (clses[rest] == clses[i]) & (src[rest] != src[i])]
+        if len(rest) == 0:
+            continue
+        iw = (np.minimum(boxes[rest, 2], boxes[i, 2]) - np.maximum(boxes[rest, 0], boxes[i, 0])).clip(min=0)
+        ih = (np.minimum(boxes[rest, 3], boxes[i, 3]) - np.maximum(boxes[rest, 1], boxes[i, 1])).clip(min=0)
+        ios = iw * ih / (np.minimum(area[rest], area[i]) + 1e-9)
+        keep[rest[ios > ios_thr]] = False
+    return boxes[keep], clses[keep], scores[keep]
+
+def detect_tiled(detect, img, tile, overlap=0.2, batch=8, ios_thr=0.6):
+    """
+    detect(list of BGR arrays) -> [(boxes, classes, scores), ...] applied to
+    overlapping tiles of one frame, `batch` tiles per call, so peak memory
+    follows tile size and batch rather than frame size.
+    """
+    H, W = img.shape[:2]
+    origins = tile_origins(H, W, tile, overlap)
+    dets = []
+    for s in range(0, len(origins), batch):
+        crops = [np.ascontiguousarray(img[y0:y0 + tile, x0:x0 + tile]) for x0, y0 in origins[s:s + batch]]
+        dets.extend(detect(crops))
+    return merge_tile_detections(dets, origins, tile, H, W, ios_thr)
@@ -0,0 +1,195 @@
+# src/train_throughput.py
+# Training speed: per-epoch images/s, dataloader wait vs step time, peak memory; --autotune trial runs.
+import csv, json, os, shutil, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from profiling import peak_rss_bytes
+
+def memory_bytes():
+    """RSS of this process plus its children (dataloader workers)."""
+    import psutil
+    p = psutil.Process()
+    total = p.memory_info().rss
+    for c in p.children(recursive=True):
+        try:
+            total += c.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+def cuda_peak_bytes():
+    import torch
+    return torch.cuda.max_memory_allocated() if torch.cuda.is_available() else 0
+
+def pin_loader(workers=None, threads=0):
+    """
+    on_pretrain_routine_start callback. Ultralytics forces workers=0 and
+    resets torch threads when training on CPU; this puts the requested
+    values back before the dataloaders are built.
+    """
+    def cb(trainer):
+        if workers is not None:
+            trainer.args.workers = workers
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+    return cb
+
+class ThroughputMonitor:
+    """
+    Ultralytics callbacks timing the train loop. The time between the end of
+    one step and the start of the next is the wait for the dataloader; the
+    rest is the step (forward, backward, optimizer). One row per epoch is
+    logged and appended to <save_dir>/throughput.csv.
+    """
+
+    FIELDS = ["epoch", "images", "steps", "epoch_s", "images_per_s", "data_wait_s", "step_s",
+              "data_wait_frac", "peak_mem_mb", "peak_rss_mb", "cuda_peak_mb", "batch", "workers", "threads"]
+
+    def __init__(self, extra=None):
+        self.extra = extra or {}  # written once to <save_dir>/throughput.json (e.g. the autotune result)
+        self.rows = []
+
+    def register(self, model):
+        for event in ("on_train_start", "on_train_epoch_start", "on_train_batch_start",
+                      "on_train_batch_end", "on_train_epoch_end"):
+            model.add_callback(event, getattr(self, event))
+
+    def on_train_start(self, trainer):
+        if self.extra:
+            os.makedirs(trainer.save_dir, exist_ok=True)
+            with open(os.path.join(trainer.save_dir, "throughput.json"), "w") as f:
+                json.dump(self.extra, f, indent=2)
+
+    def on_train_epoch_start(self, trainer):
+        self.t_epoch = self.t_last = time.perf_counter()
+        self.wait = self.step = 0.0
+        self.steps = 0
+        self.mem = memory_bytes()
+
+    def on_train_batch_start(self, trainer):
+        t = time.perf_counter()
+        self.wait += t - self.t_last
+        self.t_step = t
+
+    def on_train_batch_end(self, trainer):
+        t = time.perf_counter()
+        self.step += t - self.t_step
+        self.t_last = t
+        self.steps += 1
+        if self.steps % 10 == 1:  # psutil over all workers is too slow for every step
+            self.mem = max(self.mem, memory_bytes())
+
+    def on_train_epoch_end(self, trainer):
+        import torch
+        secs = time.perf_counter() - self.t_epoch
+        images = min(self.steps * trainer.batch_size, len(trainer.train_loader.dataset))
+        busy = self.wait + self.step
+        row = {"epoch": trainer.epoch + 1, "images": images, "steps": self.steps, "epoch_s": round(secs, 3),
+               "images_per_s": round(images / secs, 2) if secs else 0.0,
+               "data_wait_s": round(self.wait, 3), "step_s": round(self.step, 3),
+               "data_wait_frac": round(self.wait / busy, 4) if busy else 0.0,
+               "peak_mem_mb": round(max(self.mem, memory_bytes()) / 2**20, 1),
+               "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+               "cuda_peak_mb": round(cuda_peak_bytes() / 2**20, 1),
+               "batch": trainer.batch_size, "workers": trainer.train_loader.num_workers,
+               "threads": torch.get_num_threads()}
+        self.rows.append(row)
+        path = os.path.join(trainer.save_dir, "throughput.csv")
+        new = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=self.FIELDS)
+            if new:
+                w.writeheader()
+            w.writerow(row)
+        bound = "dataloader-bound" if row["data_wait_frac"] > 0.3 else "compute-bound"
+        print(f"⏱️ epoch {row['epoch']}: {row['images_per_s']:.1f} img/s, data wait {row['data_wait_s']:.1f}s vs "
+              f"step {row['step_s']:.1f}s ({row['data_wait_frac']:.0%}, {bound}), peak mem {row['peak_mem_mb']:.0f} MB")
+
+# ---------------- autotune ----------------
+
+class _TrialDone(Exception):
+    pass
+
+def _trial(cfg):
+    """One trial in a fresh process: a few real training steps, timed after warm-up."""
+    model_path, data, imgsz, batch, workers, threads, warmup, steps, shards = cfg
+    import torch
+    from ultralytics import YOLO
+    extra = {}
+    if shards:
+        from shard_dataset import ShardTrainer
+        extra["trainer"] = ShardTrainer
+    times, mem = [], [0]
+    state = {}
+
+    def start(trainer):
+        state["t"] = time.perf_counter()
+
+    def end(trainer):
+        times.append(time.perf_counter() - state.get("t_prev_end", state["t"]))
+        state["t_prev_end"] = time.perf_counter()
+        if len(times) > warmup:
+            mem[0] = max(mem[0], memory_bytes())
+        if len(times) >= warmup + steps:
+            if hasattr(trainer.train_loader, "close"):
+                trainer.train_loader.close()
+            raise _TrialDone
+
+    model = YOLO(model_path)
+    model.add_callback("on_pretrain_routine_start", pin_loader(workers, threads))
+    model.add_callback("on_train_batch_start", start)
+    model.add_callback("on_train_batch_end", end)
+    tmp = tempfile.mkdtemp(prefix="autotune_")
+    try:
+        model.train(data=data, epochs=1, imgsz=imgsz, batch=batch, workers=workers, val=False, plots=False,
+                    save=False, project=tmp, name="trial", exist_ok=True, verbose=False, **extra)
+    except _TrialDone:
+        pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if len(times) < warmup + steps:
+        raise RuntimeError(f"dataset too small for {warmup + steps} steps at batch {batch}")
+    # time from one step's end to the next one's end: dataloader wait + step, as the real loop pays it
+    secs = sum(times[warmup:])
+    return {"batch": batch, "workers": workers, "threads": threads or torch.get_num_threads(),
+            "images_per_s": round(batch * steps / secs, 2), "step_ms": round(secs / steps * 1000.0, 1),
+            "peak_mem_mb": round(max(mem[0], cuda_peak_bytes()) / 2**20, 1)}
+
+def autotune(model_path, data, imgsz, batches, workers, threads, warmup=3, steps=10, max_mem_mb=None,
+             shards=False):
+    """
+    Tries every (batch, workers, threads) for a few steps, each in its own
+    process (clean memory reading; an out-of-memory crash only loses that
+    trial). -> (best config or None, all trial rows).
+    """
+    if max_mem_mb is None:
+        import psutil
+        max_mem_mb = psutil.virtual_memory().available / 2**20 * 0.9
+    rows = []
+    for b in batches:
+        for w in workers:
+            for t in threads:
+                cfg = (model_path, data, imgsz, b, w, t, warmup, steps, shards)
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+                        r = ex.submit(_trial, cfg).result()
+                    r["fits"] = r["peak_mem_mb"] <= max_mem_mb
+                except Exception as e:  # includes a trial process killed by the OOM killer
+                    r = {"batch": b, "workers": w, "threads": t, "images_per_s": 0.0, "fits": False,
+                         "error": f"{type(e).__name__}: {e}"}
+                rows.append(r)
+                note = r.get("error") or f"{r['images_per_s']:.1f} img/s, {r['peak_mem_mb']:.0f} MB" + \
+                    ("" if r["fits"] else f" (over {max_mem_mb:.0f} MB)")
+                print(f"🔁 batch={b:<4d} workers={w:<3d} threads={t:<3d} {note}", file=sys.stderr)
+    ok = [r for r in rows if r["fits"]]
+    best = max(ok, key=lambda r: r["images_per_s"]) if ok else None
+    return best, rows
+
+def default_grid(cores=None):
+    """(batches, workers, threads) tried when no grid is given."""
+    cores = cores or os.cpu_count() or 1
+    workers = sorted({0, max(1, cores // 4), max(1, cores // 2)})
+    threads = sorted({max(1, cores // 2), cores})
+    return [8, 16, 32], workers, threads
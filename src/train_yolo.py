@@ -1,16 +1,28 @@
 import argparse
 from pathlib import Path
-from ultralytics import YOLO
 
 
-def main():
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--data", default="configs/visdrone.yaml")
+    p.add_argument(
+        "--shards",
+        default=None,
+        help="shards.yaml from pack_shards.py: train from memory-mapped, pre-resized shards instead of --data"
+    )
     p.add_argument("--model", default="yolov8n.pt")
     p.add_argument("--epochs", type=int, default=50)
     p.add_argument("--imgsz", type=int, default=640)
     p.add_argument("--batch", type=int, default=16)
     p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = Ultralytics default)")
+    # ⏱️ Pre-flight: short trial runs over batch / workers / threads, fastest setting that fits in memory wins
+    p.add_argument("--autotune", action="store_true", help="Pick --batch/--workers/--threads by timing trial steps")
+    p.add_argument("--tune-batch", default=None, help="Batch sizes to try, e.g. 8,16,32")
+    p.add_argument("--tune-workers", default=None, help="Dataloader workers to try (default: 0, cores/4, cores/2)")
+    p.add_argument("--tune-threads", default=None, help="Torch threads to try (default: cores/2, cores)")
+    p.add_argument("--tune-steps", type=int, default=10, help="Timed steps per trial (after 3 warm-up steps)")
+    p.add_argument("--max-mem-gb", type=float, default=None, help="Memory budget (default: 90%% of available RAM)")
     # 🔥 Early stopping patience: stop if best val metric doesn't improve for N epochs
     p.add_argument("--patience", type=int, default=5)
 
@@ -39,10 +51,45 @@ def main():
         help="Resume training from last checkpoint of this run"
     )
 
-    args = p.parse_args()
+    args = p.parse_args(argv)
+    from ultralytics import YOLO  # after parsing: --help and arg errors stay fast
+
+    from train_throughput import ThroughputMonitor, autotune, default_grid, pin_loader
 
     run_dir = Path(args.project) / args.name
     ckpt_path = run_dir / "weights" / "last.pt"
+    workers_pin = None  # Ultralytics uses 0 workers on CPU unless the autotuned value is pinned
+    tuned = {}
+
+    # Packed shards: same training loop, datasets read from memory-mapped shards
+    extra = {}
+    if args.shards:
+        import json
+        from shard_dataset import ShardTrainer
+        packed = json.load(open(args.shards)).get("imgsz")
+        if packed and packed != args.imgsz:
+            print(f"⚠️ Shards were packed at imgsz={packed}; training at {args.imgsz} re-resizes every image.")
+        extra["trainer"] = ShardTrainer
+
+    if args.autotune and not args.resume:
+        grid = default_grid()
+        lists = [[int(x) for x in v.split(",")] if v else g
+                 for v, g in zip((args.tune_batch, args.tune_workers, args.tune_threads), grid)]
+        print(f"⏱️ Autotune: batch {lists[0]} × workers {lists[1]} × threads {lists[2]}, "
+              f"{args.tune_steps} steps each")
+        best, rows = autotune(args.model, args.shards or args.data, args.imgsz, *lists, steps=args.tune_steps,
+                              max_mem_mb=args.max_mem_gb * 1024 if args.max_mem_gb else None,
+                              shards=bool(args.shards))
+        tuned = {"autotune": {"best": best, "trials": rows}}
+        if best is None:
+            print("⚠️ Autotune: no trial finished within the memory budget; keeping --batch/--workers/--threads")
+        else:
+            args.batch, workers_pin, args.threads = best["batch"], best["workers"], best["threads"]
+            args.workers = workers_pin
+            print(f"✅ Autotune: batch={args.batch} workers={args.workers} threads={args.threads} "
+                  f"({best['images_per_s']:.1f} img/s, {best['peak_mem_mb']:.0f} MB)")
+
+    monitor = ThroughputMonitor(tuned)
 
     if args.resume:
         # ---- Resume from last checkpoint ----
@@ -54,20 +101,25 @@ def main():
 
         print(f"🔁 Resuming training from: {ckpt_path}")
         model = YOLO(str(ckpt_path))
+        model.add_callback("on_pretrain_routine_start", pin_loader(None, args.threads))
+        monitor.register(model)
 
         # When resume=True, Ultralytics reloads previous training settings
         results = model.train(
             resume=True,
-            save_period=args.save_period  # (may or may not be used, but harmless)
+            save_period=args.save_period,  # (may or may not be used, but harmless)
+            **extra
         )
 
     else:
         # ---- Fresh training run ----
         print(f"🚀 Starting new training run: project={args.project}, name={args.name}")
         model = YOLO(args.model)
+        model.add_callback("on_pretrain_routine_start", pin_loader(workers_pin, args.threads))
+        monitor.register(model)
 
         results = model.train(
-            data=args.data,
+            data=args.shards or args.data,
             epochs=args.epochs,
             imgsz=args.imgsz,
             batch=args.batch,
@@ -76,9 +128,14 @@ def main():
             project=args.project,
             name=args.name,
             save_period=args.save_period,  # ✅ important line
+            **extra
         )
 
     print("✅ Training complete.")
+    if monitor.rows:
+        r = monitor.rows[-1]
+        print(f"⏱️ Last epoch: {r['images_per_s']:.1f} img/s, data wait {r['data_wait_frac']:.0%} "
+              f"(per-epoch log: throughput.csv in the run folder)")
     # results.best is usually available in recent Ultralytics versions
     if hasattr(results, "best"):
         print("🏆 Best weights:", results.best)
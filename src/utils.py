@@ -9,3 +9,21 @@ def list_images(folder):
 def safe_copy(src, dst):
     os.makedirs(os.path.dirname(dst), exist_ok=True)
     shutil.copy(src, dst)
+
+
+# EXIF orientations 5..8 rotate by 90 degrees, so decoders that honour EXIF
+# (cv2.imread, Ultralytics) report width and height swapped.
+_EXIF_ORIENTATION = 0x0112
+
+def image_size(path):
+    """(h, w) as cv2.imread would report it, read from the file header only."""
+    from PIL import Image
+    with Image.open(path) as im:
+        w, h = im.size
+        try:
+            orient = im.getexif().get(_EXIF_ORIENTATION, 1)
+        except Exception:
+            orient = 1
+    if orient in (5, 6, 7, 8):
+        w, h = h, w
+    return h, w
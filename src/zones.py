@@ -0,0 +1,155 @@
+# src/zones.py
+# Per-zone CI / PRI / occupancy: polygons rasterized once per frame size, detections looked up by pixel.
+import json, math, os, threading
+
+import numpy as np
+
+from risk import proximity_risk, split_centers
+
+def rasterize(poly, H, W):
+    """
+    bool[H, W]: pixels whose center lies inside the polygon (pixel coords,
+    even-odd rule). Edges are half-open, so zones sharing an edge tile the
+    frame without overlapping. Scanline crossings are accumulated per row
+    with a cumsum instead of testing every pixel against every edge.
+    """
+    acc = np.zeros((H, W + 1), np.int32)
+    for (x1, y1), (x2, y2) in zip(poly, np.roll(poly, -1, axis=0)):
+        if y1 == y2:
+            continue
+        lo, hi = min(y1, y2), max(y1, y2)
+        r = np.arange(max(0, math.ceil(lo - 0.5)), min(H, math.ceil(hi - 0.5)))
+        if not len(r):
+            continue
+        xc = x1 + (r + 0.5 - y1) * (x2 - x1) / (y2 - y1)
+        # this crossing lies right of the centers of pixels [0, k) in row r
+        k = np.clip(np.ceil(xc - 0.5), 0, W).astype(np.int64)
+        acc[r, 0] += 1
+        np.add.at(acc, (r, k), -1)
+    return (np.cumsum(acc[:, :W], axis=1) & 1).astype(bool)
+
+class ZoneMap:
+    """
+    Named polygons (entrances, roads, plazas, ...) from a JSON config:
+
+        {"normalized": true,
+         "zones": [{"name": "entrance_n", "polygon": [[0.1, 0.0], [0.3, 0.0], [0.3, 0.2], [0.1, 0.2]]}, ...]}
+
+    Coordinates are fractions of the frame size with "normalized" (the
+    default), pixels otherwise. Zones may overlap.
+
+    For each frame size the polygons are rasterized once into a region label
+    map: every pixel gets the id of the distinct combination of zones
+    covering it, and a (regions x zones) membership matrix says which zones
+    that is. A detection is then one array lookup at its center, and
+    per-zone sums are bincounts over regions times the membership matrix,
+    so the per-frame cost hardly grows with the number of zones.
+    """
+
+    def __init__(self, zones, normalized=True):
+        if not zones:
+            raise ValueError("zone config has no zones")
+        self.names = [str(z["name"]) for z in zones]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("zone names must be unique")
+        self.polygons = [np.asarray(z["polygon"], np.float64).reshape(-1, 2) for z in zones]
+        for n, p in zip(self.names, self.polygons):
+            if len(p) < 3:
+                raise ValueError(f"zone {n!r}: a polygon needs at least 3 points")
+        self.normalized = normalized
+        self._cache = {}  # (H, W) -> (labels, membership, zone_px)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            cfg = json.load(f)
+        return cls(cfg["zones"], cfg.get("normalized", True))
+
+    def index(self, H, W):
+        """(labels[H, W] region ids, membership[regions, zones] int64, pixels per zone), cached per size."""
+        key = (int(H), int(W))
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        scale = np.array([W, H], np.float64) if self.normalized else np.ones(2)
+        labels = np.zeros(key, np.int64)
+        member = np.zeros((1, 0), np.int64)  # one region, in no zone yet
+        for poly in self.polygons:
+            mask = rasterize(poly * scale, *key)
+            # split every region by this zone and renumber the combinations that occur
+            keys, labels = np.unique(labels * 2 + mask, return_inverse=True)
+            labels = labels.reshape(key)
+            member = np.hstack([member[keys // 2], (keys % 2)[:, None]])
+        labels = labels.astype(np.uint8 if len(member) <= 256 else np.int32)
+        zone_px = np.bincount(labels.ravel(), minlength=len(member)) @ member
+        out = (labels, member, zone_px)
+        with self._lock:
+            self._cache[key] = out
+        return out
+
+    def regions(self, xy, H, W):
+        """Region id under each (x, y) point; points are clipped into the frame."""
+        labels = self.index(H, W)[0]
+        x = np.clip(np.asarray(xy[:, 0], np.float64), 0, W - 1).astype(np.int64)
+        y = np.clip(np.asarray(xy[:, 1], np.float64), 0, H - 1).astype(np.int64)
+        return labels[y, x].astype(np.int64)
+
+    def frame_rows(self, boxes, clses, H, W, names, ci_weights, vehicle_set, thr):
+        """
+        One dict per zone with the frame_metrics() columns restricted to that
+        zone. A box belongs to every zone containing its center; a
+        pedestrian's PRI term still uses its nearest vehicle anywhere in the
+        frame. occupancy_frac is box area over zone area.
+        """
+        labels, member, zone_px = self.index(H, W)
+        R = len(member)
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        clses = np.asarray(clses, np.int64)
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2.0
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2.0
+        reg = self.regions(np.stack([cx, cy], axis=1), H, W)
+
+        n_cls = max(len(names), int(clses.max()) + 1 if len(clses) else 0)
+        per_cls = np.bincount(reg * n_cls + clses, minlength=R * n_cls).reshape(R, n_cls)
+        zone_cls = member.T @ per_cls  # (zones, classes)
+        # unknown ids count as "others", then unknown names weigh 1.0 (as in frame_metrics)
+        w = np.array([ci_weights.get(names.get(k, "others"), 1.0) for k in range(n_cls)], np.float64)
+        ci = np.bincount(reg, weights=w[clses], minlength=R) @ member
+        areas = ((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])).clip(min=0)
+        occ = (np.bincount(reg, weights=areas, minlength=R) @ member) / (zone_px + 1e-6)
+
+        ped, veh = split_centers(boxes, clses, names, vehicle_set)
+        _, d = proximity_risk(ped, veh, thr)
+        preg = self.regions(ped, H, W) if len(d) else np.zeros(0, np.int64)
+        terms = np.maximum(0.0, (thr - d.astype(np.float64)) / thr)  # closer => higher risk
+        pri = np.bincount(preg, weights=terms, minlength=R) @ member
+        n_ped = np.bincount(preg, minlength=R) @ member
+        d_sum = np.bincount(preg, weights=d.astype(np.float64), minlength=R) @ member
+        avg = np.divide(d_sum, n_ped, out=np.zeros(len(self.names)), where=n_ped > 0)
+
+        rows = []
+        for z, name in enumerate(self.names):
+            row = {"zone": name,
+                   "zone_area_frac": round(float(zone_px[z] / (W * H)), 4),
+                   "congestion_index": round(float(ci[z]), 3),
+                   "proximity_risk_index": round(float(pri[z]), 3),
+                   "occupancy_frac": round(float(occ[z]), 4),
+                   "total_detections": int(zone_cls[z].sum())}
+            for k in np.flatnonzero(zone_cls[z]):
+                row[f"count_{names.get(int(k), str(int(k)))}"] = int(zone_cls[z, k])
+            row["avg_min_ped_vehicle_px"] = round(float(avg[z]), 2)
+            rows.append(row)
+        return rows
+
+def load_zones(spec):
+    """ZoneMap from a config path; None and ZoneMap instances pass through."""
+    if spec is None or isinstance(spec, ZoneMap):
+        return spec
+    return ZoneMap.load(spec)
+
+def zone_csv_path(metrics_csv):
+    """<dir>/metrics.csv -> <dir>/zone_metrics.csv (shard CSVs likewise)."""
+    d, b = os.path.split(metrics_csv)
+    return os.path.join(d, f"zone_{b}")